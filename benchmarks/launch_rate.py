@@ -0,0 +1,62 @@
+"""Compare local task launch rates for the subprocess and posix_spawn launchers.
+
+Usage:
+    python3 benchmarks/launch_rate.py [-n TASKS] [--ballast MB]
+
+Launches TASKS short-lived processes (``/bin/true``) with each launcher, both
+directly (as in :py:class:`scalems.local.ImmediateExecutionContext`) and through
+:py:class:`scalems.local.AsyncWorkflowContext`, and reports launches per second.
+*ballast* allocates (and touches) memory in the parent process, since the cost
+of creating processes by forking grows with the size of the parent.
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+import scalems
+import scalems.local
+from scalems.local import operations
+
+
+def direct(tasks: int, spawn: bool, output_dir: str) -> float:
+    start = time.perf_counter()
+    for i in range(tasks):
+        task_description = {'args': ['/bin/true', str(i)], 'kwargs': {'stdin': None, 'env': None},
+                            'stdout': '{}/{}.stdout'.format(output_dir, i),
+                            'stderr': '{}/{}.stderr'.format(output_dir, i)}
+        assert operations.local_exec(task_description, spawn=spawn).exitcode == 0
+    return tasks / (time.perf_counter() - start)
+
+
+def workflow(tasks: int, spawn: bool, output_dir: str) -> float:
+    async def run():
+        context = scalems.local.AsyncWorkflowContext(output_dir=output_dir, spawn=spawn)
+        with context:
+            for i in range(tasks):
+                scalems.executable(('/bin/true', str(i)))
+            start = time.perf_counter()
+            await context.run()
+            return tasks / (time.perf_counter() - start)
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--tasks', type=int, default=1000, help='Number of processes per measurement.')
+    parser.add_argument('--ballast', type=int, default=0, help='MB of memory to allocate in the parent process.')
+    args = parser.parse_args()
+    ballast = bytearray(args.ballast << 20)
+    for offset in range(0, len(ballast), 4096):
+        ballast[offset] = 1
+
+    for name, benchmark in (('direct', direct), ('AsyncWorkflowContext', workflow)):
+        for spawn in (False, True):
+            with tempfile.TemporaryDirectory() as output_dir:
+                rate = benchmark(args.tasks, spawn, output_dir)
+            print('{:<22} {:<12} {:10.1f} launches/s'.format(name, 'posix_spawn' if spawn else 'subprocess', rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -29,7 +29,7 @@ Invocation:
 
 import typing
 
-from .subprocess import executable
+from .subprocess import Column, executable
 
 
 ResultType = typing.TypeVar('ResultType')
@@ -56,6 +56,11 @@ def wait(ref: WorkflowObject[ResultType], **kwargs) -> ResultType:
 
     scalems.wait() will produce an error if you have not configured and launched
     an execution manager in the current scope.
+
+    Only the work upstream of *ref* is executed. Blocking calls share an event
+    loop that persists for the lifetime of the active workflow context, so
+    repeated calls to scalems.wait() do not create new event loops. In a
+    coroutine, await the reference instead (e.g. ``await context.future(uid)``).
     """
     from . import context
     return context.wait(ref, **kwargs)
@@ -207,11 +212,27 @@ def while_loop(*, function, condition, max_iteration=10, **kwargs):
         versions of this software. The default value may be changed or
         removed on short notice.
 
+    The returned :py:class:`scalems.dynamic.WhileLoop` is awaitable (or may be
+    called to get an awaitable) to run the loop, producing the handle returned
+    by *function* for the last iteration. Each iteration is added to the work
+    graph and executed only after the previous iteration has been evaluated, and
+    *condition* is called with the result of the iteration. Handles for the
+    completed iterations are available as the ``iterations`` attribute.
+
+    Since task uids are fingerprints of the task input, a stateless *function*
+    would just produce the same task again. Iterations generally depend on the
+    previous iteration through a stateful *function*. Tasks that do not change
+    between iterations are executed only once.
+
+    A loop with iterations recorded in the context's result store (see
+    :py:class:`scalems.local.AsyncWorkflowContext`) resumes after the last
+    completed iteration when the workflow is run again.
     """
-    raise NotImplementedError()
+    from . import dynamic
+    return dynamic.while_loop(function, condition, max_iteration=max_iteration, **kwargs)
 
 
-def desequence(iterable):
+def desequence(iterable, **kwargs):
     """Remove sequencing from an iterable.
 
     Given an input of shape (N, [M, ...]), produce an iterable of resources
@@ -221,8 +242,47 @@ def desequence(iterable):
 
     This allows iterative tools (e.g. `map`) to use unordered or asynchronous
     iteration on resource slices as they become available.
+
+    Currently, *iterable* is a sequence of awaitables or of task uids in the
+    current workflow context, and the result is an asynchronous iterator over
+    their results, in order of completion. See :py:func:`as_completed`.
+
+    Example::
+
+        async for trajectory in scalems.desequence(simulations[:]):
+            analyze(trajectory)
+
     """
-    raise NotImplementedError()
+    from . import dynamic
+    return dynamic.desequence(iterable, **kwargs)
+
+
+def as_completed(iterable, batch_size: int = 1, timeout: float = None, max_pending: int = None, context=None,
+                 **kwargs):
+    """Get an asynchronous iterator over batches of results as they become available.
+
+    *iterable* may contain awaitables or the uids of tasks in the current
+    workflow context. Results are yielded in lists of (up to) *batch_size*
+    elements, in order of completion. A partial batch is yielded if *timeout*
+    seconds pass after its first element becomes available, so that analysis
+    of early results is not held back by slow tasks.
+
+    If *max_pending* is provided, no more than *max_pending* elements of
+    *iterable* are in flight (incomplete or not yet consumed) at a time.
+    Elements are taken from *iterable* as the consumer catches up.
+
+    Task uids are resolved in *context*, if given, instead of the current
+    workflow context.
+
+    Example::
+
+        async for batch in scalems.as_completed(trajectories, batch_size=10, timeout=60):
+            model = model.update(batch)
+
+    """
+    from . import dynamic
+    return dynamic.as_completed(iterable, batch_size=batch_size, timeout=timeout, max_pending=max_pending,
+                                context=context, **kwargs)
 
 
 def resequence(keys, collection):
@@ -276,7 +336,7 @@ def scatter(iterable, axis=1):
     """
 
 
-def reduce(function, iterable):
+def reduce(function, iterable, **kwargs):
     """Repeatedly apply a function.
 
     For an Iterable[T] and a function that maps (T, T) -> T, apply the function
@@ -288,16 +348,34 @@ def reduce(function, iterable):
     *function* obeys the commutative property.
 
     Compare to :py:func:`functools.reduce`
+
+    The reduction is performed as a balanced tree of operations for ordered
+    input, or by pairwise combination of values as they become available for
+    unordered input (such as the output of :py:func:`desequence`), so that
+    reducing N elements takes O(log N) steps and begins before all elements
+    are available.
+
+    *function* may return a value, an awaitable, or the uid of a task in the
+    current workflow context.
+
+    Returns:
+        An awaitable for the reduced value.
+
+    Example::
+
+        trajectory = await scalems.reduce(scalems.extend_sequence, scalems.desequence(trajectories))
+
     """
-    raise NotImplementedError()
+    from . import dynamic
+    return dynamic.reduce(function, iterable, **kwargs)
 
 
 def extend_sequence(sequence_a, sequence_b):
     """Combine sequential data into a new sequence."""
-    raise NotImplementedError()
+    return tuple(sequence_a) + tuple(sequence_b)
 
 
-def map(function, iterable, shape=None):
+def map(function, iterable, shape=None, **kwargs):
     """Generate a collection of operations by iteration.
 
     Apply *function* to each element of *iterable*.
@@ -305,8 +383,27 @@ def map(function, iterable, shape=None):
     If *iterable* is ordered, the generated operation collection is ordered.
 
     If *iterable* is unordered, the generated operation collection is unordered.
+
+    Operations are generated lazily, as the collection is iterated (asynchronously)
+    or awaited. To amortize the overhead of dispatching many cheap operations,
+    elements may be grouped into chunks that are each dispatched as a single task,
+    either with a *chunksize* key word argument or with a *shape* giving the
+    number of chunks. An *executor* (such as a
+    :py:class:`concurrent.futures.ProcessPoolExecutor`) may be provided to apply
+    *function* to chunks outside of the event loop.
+
+    Example::
+
+        async for model in scalems.map(msmtool.msm_analyzer, allframes, chunksize=1000):
+            ...
+
+    Returns:
+        A :py:class:`scalems.dynamic.Map`
+
+    TODO: Generated task collections should be representable in the work graph.
     """
-    raise NotImplementedError()
+    from . import dynamic
+    return dynamic.map(function, iterable, shape=shape, **kwargs)
 
 
 def poll():
@@ -9,7 +9,12 @@ structure to allow for simpler syntax and clean resource de-allocation.
 """
 
 import abc
+import asyncio
+import atexit
+import concurrent.futures
 import contextvars
+import sys
+import threading
 
 
 class AbstractWorkflowContext(abc.ABC):
@@ -63,13 +68,22 @@ class AbstractWorkflowContext(abc.ABC):
     def add_task(self, task_description):
         """Add a task to the workflow.
 
+        Task uids are fingerprints of the task input, so a task with the uid of
+        a task already in the workflow represents the same work (such as a
+        loop-invariant task declared again). It is not added again, and the
+        reference to the existing task is returned.
+
         Returns:
-            Reference to the new task.
+            Reference to the new (or existing) task.
 
         TODO: Resolve operation implementation to dispatch task configuration.
         """
         ...
 
+    def wait(self, ref, **kwargs):
+        """Resolve a workflow reference or awaitable to a local object, blocking until it is available."""
+        raise NotImplementedError('{} does not support wait().'.format(type(self)))
+
 
 class DefaultContext(AbstractWorkflowContext):
     """Manage workflow data and metadata, but defer execution to sub-contexts.
@@ -80,6 +94,12 @@ class DefaultContext(AbstractWorkflowContext):
     def add_task(self, task_description):
         raise NotImplementedError('Trivial work graph holder not yet implemented.')
 
+    def wait(self, ref, **kwargs):
+        # Awaitables can still be resolved without an execution manager.
+        if asyncio.isfuture(ref) or asyncio.iscoroutine(ref):
+            return run_until_complete(self, ref)
+        raise RuntimeError('No execution manager is configured for {}.'.format(repr(ref)))
+
 
 # Root workflow context for the interpreter process.
 _interpreter_context = DefaultContext()
@@ -87,33 +107,193 @@ _interpreter_context = DefaultContext()
 # for the new task.
 parent = contextvars.ContextVar('parent', default=None)
 current = contextvars.ContextVar('current', default=_interpreter_context)
+# Event loop of the coroutine that delegated work to the current thread (such as
+# the chunks of a scalems.dynamic.Map), so that work graph updates can be
+# returned to the event loop thread. See call_in_loop()
+calling_loop = contextvars.ContextVar('calling_loop', default=None)
 
 
 def get_context():
     return current.get()
 
 
-def run(coroutine, **kwargs):
+def run_until_complete(context, awaitable):
+    """Run *awaitable* to completion in the persistent event loop of *context*.
+
+    The event loop is created on first use and kept as the ``event_loop``
+    attribute of *context* until :py:func:`close_event_loop` is called, so that
+    repeated blocking calls do not create and destroy an event loop each time.
+    Tasks that are still pending when the call returns resume with the next call.
+
+    If the event loop of *context* is running in a background thread (see
+    :py:func:`start_event_loop`), *awaitable* is run there.
+
+    Must not be called while an event loop is running in the current thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise RuntimeError('Cannot block while an event loop is running in the current thread. Use `await`.')
+    if getattr(context, 'event_loop_thread', None) is not None:
+        return asyncio.run_coroutine_threadsafe(_await(awaitable), context.event_loop).result()
+    loop = getattr(context, 'event_loop', None)
+    if loop is None:
+        loop = asyncio.new_event_loop()
+        context.event_loop = loop
+        if context is _interpreter_context:
+            atexit.register(close_event_loop, context)
+    # Subprocess support requires the loop to be the current event loop for the thread.
+    asyncio.set_event_loop(loop)
+    return loop.run_until_complete(awaitable)
+
+
+async def _await(awaitable):
+    return await awaitable
+
+
+async def _set_debug(awaitable, debug: bool):
+    asyncio.get_event_loop().set_debug(debug)
+    return await awaitable
+
+
+def start_event_loop(context):
+    """Run a new event loop for *context* in a background thread.
+
+    The loop is kept as the ``event_loop`` attribute of *context*, and the
+    thread as the ``event_loop_thread`` attribute, until :py:func:`close_event_loop`
+    is called. Coroutines and callbacks in the loop see *context* as the current context.
+    """
+    if getattr(context, 'event_loop', None) is not None:
+        raise RuntimeError('{} already has an event loop.'.format(repr(context)))
+    loop = asyncio.new_event_loop()
+    if sys.version_info < (3, 8):
+        # Before Python 3.8, the default child watcher must be attached (from the
+        # main thread) to a loop used for subprocesses in another thread.
+        asyncio.get_child_watcher().attach_loop(loop)
+    started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        current.set(context)
+        loop.call_soon(started.set)
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, name='scalems-event-loop', daemon=True)
+    context.event_loop = loop
+    context.event_loop_thread = thread
+    thread.start()
+    started.wait()
+    return loop
+
+
+def call_in_event_loop(context, function, *args):
+    """Call *function* in the thread running the event loop of *context*, and get the result.
+
+    Allows work graph state to be updated from other threads while the event loop
+    runs in a background thread. Otherwise, *function* is called directly.
+    """
+    thread = getattr(context, 'event_loop_thread', None)
+    if thread is None or thread is threading.current_thread():
+        return function(*args)
+    return call_in_loop(context.event_loop, function, *args)
+
+
+def in_loop_thread(loop) -> bool:
+    """Check whether *loop* is running in the current thread."""
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+def call_in_loop(loop, function, *args):
+    """Call *function* in the thread running event *loop*, and get the result.
+
+    If *loop* is running in the current thread, *function* is called directly.
+    Otherwise, the calling thread blocks until the call completes.
+    """
+    if in_loop_thread(loop):
+        return function(*args)
+    future = concurrent.futures.Future()
+
+    def call():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(function(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    loop.call_soon_threadsafe(call)
+    return future.result()
+
+
+def close_event_loop(context):
+    """Cancel the remaining tasks and close the event loop of *context*, if any.
+
+    A background event loop thread is stopped first.
+    """
+    loop = getattr(context, 'event_loop', None)
+    if loop is None:
+        return
+    context.event_loop = None
+    thread = getattr(context, 'event_loop_thread', None)
+    if thread is not None:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        context.event_loop_thread = None
+    try:
+        pending = asyncio.all_tasks(loop)
+        for task in pending:
+            task.cancel()
+        if pending:
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        loop.run_until_complete(loop.shutdown_asyncgens())
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def wait(ref, **kwargs):
+    """Resolve a workflow reference in the current context.
+
+    See :py:func:`scalems.wait`
+    """
+    return get_context().wait(ref, **kwargs)
+
+
+def run(coroutine, debug: bool = None):
     """Execute the provided coroutine object.
 
     Abstraction for :py:func:`asyncio.run()`
 
-    Note: If we want to go this route, we should integrate with the
-    asyncio event loop policy, or obtain an event loop instance and
-    use it w.r.t. run_in_executor and set_task_factory.
+    Unlike :py:func:`asyncio.run()`, the event loop persists between calls
+    (one event loop for each active workflow context), and workflow references
+    are resolved with the current context's ``wait()`` method, so that only the
+    work upstream of the reference is executed. Contexts that do not implement
+    ``wait()`` run awaitables in the context's event loop.
+
+    If *debug* is given, the debug mode of the event loop is set before the
+    coroutine is executed (and remains set for the life of the loop).
 
     .. todo:: Coordinate with RP plans for event loop contexts and concurrency module executors.
 
     See also https://docs.python.org/3/library/asyncio-dev.html#debug-mode
     """
-    # No automatic dispatching yet. Coroutine must be executable
-    # in the current context.
-    import asyncio
-    from asyncio.coroutines import iscoroutine
+    context = get_context()
+    if debug is not None and (asyncio.iscoroutine(coroutine) or asyncio.isfuture(coroutine)):
+        coroutine = _set_debug(coroutine, debug)
+    if context is not _interpreter_context:
+        if type(context).wait is not AbstractWorkflowContext.wait:
+            return context.wait(coroutine)
+        if asyncio.iscoroutine(coroutine) or asyncio.isfuture(coroutine):
+            return run_until_complete(context, coroutine)
 
     # TODO: Check whether coroutine is already executing and where.
-    if iscoroutine(coroutine):
-        return asyncio.run(coroutine, **kwargs)
+    elif asyncio.iscoroutine(coroutine):
+        return run_until_complete(context, coroutine)
 
     # TODO: Consider generalized coroutines to be dispatched through
     #     custom event loops or executors.
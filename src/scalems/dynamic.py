@@ -0,0 +1,488 @@
+"""Dynamic and data shaping functions.
+
+Implementations for the functions in the :py:mod:`scalems` namespace that
+consume results as they become available, or that generate work while the
+workflow is running.
+"""
+
+import asyncio
+import collections
+import collections.abc
+import concurrent.futures
+import contextvars
+import inspect
+import itertools
+import typing
+
+import scalems.context
+import scalems.subprocess
+
+
+def _as_future(item, context=None):
+    """Get an asyncio Future for an item to be awaited.
+
+    Returns the Future and whether it was created here (and may be cancelled here).
+    """
+    if isinstance(item, str):
+        # Task uid in the current workflow context.
+        if context is None:
+            context = scalems.context.get_context()
+        if not hasattr(context, 'future'):
+            raise ValueError('Context {} cannot provide Futures for task {}.'.format(repr(context), item))
+        return context.future(item), False
+    if isinstance(item, asyncio.Future):
+        return item, False
+    if isinstance(item, concurrent.futures.Future):
+        return asyncio.wrap_future(item), False
+    if inspect.isawaitable(item):
+        return asyncio.ensure_future(item), True
+    raise TypeError('Cannot wait for {}.'.format(repr(item)))
+
+
+async def as_completed(iterable: typing.Iterable, batch_size: int = 1, timeout: float = None,
+                       max_pending: int = None, context=None) -> typing.AsyncIterator[list]:
+    """Iterate over batches of results as they become available.
+
+    *iterable* may contain awaitables (Futures, Tasks, coroutines, or
+    concurrent.futures.Future) or the uids of tasks in the current (or the
+    given) workflow *context*.
+
+    Results are yielded in lists of *batch_size* in order of completion. A
+    smaller batch is yielded when no more results are pending, or when *timeout*
+    seconds have elapsed since the first result of the batch became available.
+
+    If *max_pending* is given, items are taken from *iterable* (and coroutines
+    are scheduled) only while fewer than *max_pending* items are incomplete or
+    not yet yielded. The iterable is consumed lazily, so a slow consumer limits
+    how far ahead the work is started.
+
+    If an awaited item raises an exception, the exception is raised when its
+    batch would have been yielded. When iteration stops early, coroutines
+    scheduled by as_completed are cancelled. Futures provided by the caller or
+    the workflow context are not cancelled.
+    """
+    if batch_size < 1:
+        raise ValueError('batch_size must be a positive integer.')
+    if max_pending is not None and max_pending < 1:
+        raise ValueError('max_pending must be a positive integer.')
+    loop = asyncio.get_event_loop()
+    source = iter(iterable)
+    exhausted = False
+    pending = set()
+    owned = set()
+    ready = collections.deque()
+    # Position of pending items in *iterable*, to order results that complete together.
+    position = {}
+    sequence = itertools.count()
+
+    def fill():
+        nonlocal exhausted
+        while not exhausted and (max_pending is None or len(pending) + len(ready) < max_pending):
+            try:
+                item = next(source)
+            except StopIteration:
+                exhausted = True
+                return
+            future, created = _as_future(item, context)
+            if future not in position:
+                position[future] = next(sequence)
+            pending.add(future)
+            if created:
+                owned.add(future)
+
+    try:
+        while True:
+            fill()
+            if not pending and not ready:
+                return
+            deadline = None
+            while len(ready) < batch_size and pending:
+                wait = None
+                if ready and timeout is not None:
+                    if deadline is None:
+                        deadline = loop.time() + timeout
+                    wait = max(0., deadline - loop.time())
+                done, _ = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Timed out with a partial batch.
+                    break
+                pending.difference_update(done)
+                owned.difference_update(done)
+                ready.extend(sorted(done, key=position.pop))
+                fill()
+            batch = [ready.popleft() for _ in range(min(batch_size, len(ready)))]
+            yield [future.result() for future in batch]
+    finally:
+        for future in owned:
+            future.cancel()
+
+
+async def desequence(iterable: typing.Iterable, **kwargs) -> typing.AsyncIterator:
+    """Iterate over results in order of completion.
+
+    Accepts the same arguments as :py:func:`as_completed`, but yields results
+    individually.
+    """
+    async for batch in as_completed(iterable, **kwargs):
+        for result in batch:
+            yield result
+
+
+def _is_ordered(iterable) -> bool:
+    """Asynchronous iterables and sets are assumed to be unordered."""
+    return not (hasattr(iterable, '__aiter__') or isinstance(iterable, collections.abc.Set))
+
+
+def _leaf(item, context=None):
+    """Get a Future for an input element, which may also be a plain value.
+
+    Strings are only treated as task uids if they match the uid grammar.
+    Returns the Future and whether it was created here.
+    """
+    if isinstance(item, str):
+        if scalems.subprocess.parse_reference(item) == (item.lower(), None):
+            return _as_future(item, context)
+    elif isinstance(item, (asyncio.Future, concurrent.futures.Future)) or inspect.isawaitable(item):
+        return _as_future(item, context)
+    future = asyncio.get_event_loop().create_future()
+    future.set_result(item)
+    return future, False
+
+
+async def _combine(function, a, b, context=None):
+    """Apply *function* and wait for its result.
+
+    *function* may return a plain value, an awaitable, or the uid of a task in
+    the workflow context (in which case, the task result is the combined value).
+    """
+    future, created = _leaf(function(a, b), context)
+    try:
+        return await future
+    finally:
+        if created:
+            future.cancel()
+
+
+async def _reduce_ordered(function, leaves: typing.Sequence[asyncio.Future], context=None):
+    if len(leaves) == 1:
+        return await leaves[0]
+    middle = len(leaves) // 2
+    left, right = await asyncio.gather(_reduce_ordered(function, leaves[:middle], context),
+                                       _reduce_ordered(function, leaves[middle:], context))
+    return await _combine(function, left, right, context)
+
+
+async def _reduce_unordered(function, iterable, owned: set, context=None):
+    pending = set()
+    if hasattr(iterable, '__aiter__'):
+        source = iterable.__aiter__()
+        next_item = asyncio.ensure_future(source.__anext__())
+        owned.add(next_item)
+        pending.add(next_item)
+    else:
+        source = None
+        next_item = None
+        for item in iterable:
+            future, created = _leaf(item, context)
+            pending.add(future)
+            if created:
+                owned.add(future)
+    available = []
+    while True:
+        while len(available) > 1:
+            combination = asyncio.ensure_future(_combine(function, available.pop(), available.pop(), context))
+            owned.add(combination)
+            pending.add(combination)
+        if not pending:
+            break
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for future in done:
+            if future is next_item:
+                try:
+                    item = future.result()
+                except StopAsyncIteration:
+                    continue
+                next_item = asyncio.ensure_future(source.__anext__())
+                owned.add(next_item)
+                future, created = _leaf(item, context)
+                if created:
+                    owned.add(future)
+                pending.update((next_item, future))
+            else:
+                available.append(future.result())
+    if not available:
+        raise TypeError('reduce() of empty iterable.')
+    return available[0]
+
+
+async def reduce(function: typing.Callable, iterable, ordered: bool = None, context=None):
+    """Combine the elements of *iterable* with a binary *function* in a parallel tree.
+
+    Elements may be plain values, awaitables, or uids of tasks in the workflow
+    *context*. *function* is called with pairs of (resolved) values and may
+    return a value, an awaitable, or the uid of a task producing the combined value.
+
+    For an ordered *iterable*, operands are combined in a balanced binary tree
+    that preserves their order (requiring only associativity). Each pair is
+    combined as soon as both operands are available.
+
+    An unordered *iterable* (an asynchronous iterable, such as from
+    :py:func:`desequence`, or a set) is reduced by combining any two available
+    values, as they become available (requiring commutativity, as well).
+    *ordered* overrides the detection of ordered input.
+
+    In either case, the depth of the reduction is O(log N) for N elements
+    that become available at the same time.
+
+    If the reduction fails, coroutines scheduled by reduce() are cancelled.
+    """
+    if ordered is None:
+        ordered = _is_ordered(iterable)
+    # Futures created here, to be cancelled if the reduction does not complete.
+    owned = set()
+    try:
+        if not ordered:
+            return await _reduce_unordered(function, iterable, owned, context)
+        if hasattr(iterable, '__aiter__'):
+            raise ValueError('Asynchronous iterables are unordered.')
+        leaves = []
+        for item in iterable:
+            future, created = _leaf(item, context)
+            leaves.append(future)
+            if created:
+                owned.add(future)
+        if not leaves:
+            raise TypeError('reduce() of empty iterable.')
+        return await _reduce_ordered(function, leaves, context)
+    finally:
+        for future in owned:
+            future.cancel()
+
+
+def _apply_chunk(function: typing.Callable, values: typing.Sequence) -> list:
+    """Apply *function* to each element of a chunk in a single dispatched call."""
+    return [function(value) for value in values]
+
+
+class Map:
+    """Collection of results of applying a function to the elements of an iterable.
+
+    Chunks of *chunksize* elements are dispatched as single tasks in a
+    :py:class:`concurrent.futures.Executor` (by default, the default executor
+    of the event loop), so that *function* does not block the event loop.
+    Elements of *iterable* are resolved (as for :py:func:`reduce`) before
+    *function* is applied, and the values returned by *function* may be plain
+    values, awaitables, or uids of tasks in the workflow *context*.
+
+    The iterable is consumed lazily as the Map is iterated. If *max_pending* is
+    given, no more than *max_pending* chunks are dispatched but not yet consumed.
+
+    Asynchronous iteration yields results in the order of *iterable* if it is
+    ordered, or as chunks complete if *iterable* is unordered. Awaiting the Map
+    produces a list of all results.
+    """
+    def __init__(self, function: typing.Callable, iterable, chunksize: int = 1, ordered: bool = None,
+                 executor: concurrent.futures.Executor = None, max_pending: int = None, context=None):
+        if chunksize < 1:
+            raise ValueError('chunksize must be a positive integer.')
+        if max_pending is not None and max_pending < 1:
+            raise ValueError('max_pending must be a positive integer.')
+        self._function = function
+        self._iterable = iterable
+        self._chunksize = chunksize
+        self._ordered = _is_ordered(iterable) if ordered is None else ordered
+        self._executor = executor
+        self._max_pending = max_pending
+        self._context = context
+
+    @property
+    def ordered(self) -> bool:
+        return self._ordered
+
+    async def _chunks(self) -> typing.AsyncIterator[list]:
+        if hasattr(self._iterable, '__aiter__'):
+            chunk = []
+            async for item in self._iterable:
+                chunk.append(item)
+                if len(chunk) == self._chunksize:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+        else:
+            source = iter(self._iterable)
+            while True:
+                chunk = list(itertools.islice(source, self._chunksize))
+                if not chunk:
+                    return
+                yield chunk
+
+    async def _resolve(self, items) -> list:
+        futures = []
+        owned = []
+        try:
+            for item in items:
+                future, created = _leaf(item, self._context)
+                futures.append(future)
+                if created:
+                    owned.append(future)
+            return list(await asyncio.gather(*futures))
+        finally:
+            for future in owned:
+                future.cancel()
+
+    async def _apply(self, chunk: list) -> list:
+        values = await self._resolve(chunk)
+        loop = asyncio.get_event_loop()
+        if self._executor is None:
+            # Run in the default executor, in the context of the caller (so that the function
+            # sees the current workflow context, and tasks that it adds are returned to this loop).
+            context = contextvars.copy_context()
+            context.run(scalems.context.calling_loop.set, loop)
+            results = await loop.run_in_executor(None, context.run, _apply_chunk, self._function, values)
+        else:
+            results = await loop.run_in_executor(self._executor, _apply_chunk, self._function, values)
+        return await self._resolve(results)
+
+    async def __aiter__(self) -> typing.AsyncIterator:
+        chunks = self._chunks()
+        fetch = None
+        exhausted = False
+        # Dispatched chunks, by position in the iterable.
+        pending = {}
+        completed = {}
+        count = 0
+        position = 0
+        try:
+            while True:
+                if self._ordered:
+                    while position in completed:
+                        for result in completed.pop(position):
+                            yield result
+                        position += 1
+                else:
+                    for index in list(completed):
+                        for result in completed.pop(index):
+                            yield result
+                if fetch is None and not exhausted and (
+                        self._max_pending is None or len(pending) + len(completed) < self._max_pending):
+                    fetch = asyncio.ensure_future(chunks.__anext__())
+                waiting = set(pending)
+                if fetch is not None:
+                    waiting.add(fetch)
+                if not waiting:
+                    return
+                done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    if future is fetch:
+                        fetch = None
+                        try:
+                            chunk = future.result()
+                        except StopAsyncIteration:
+                            exhausted = True
+                            continue
+                        pending[asyncio.ensure_future(self._apply(chunk))] = count
+                        count += 1
+                    else:
+                        completed[pending.pop(future)] = future.result()
+        finally:
+            if fetch is not None:
+                fetch.cancel()
+            for future in pending:
+                future.cancel()
+
+    async def _collect(self) -> list:
+        return [result async for result in self]
+
+    def __await__(self):
+        return self._collect().__await__()
+
+
+def map(function: typing.Callable, iterable, shape: tuple = None, chunksize: int = None, **kwargs) -> Map:
+    """Get a :py:class:`Map` of *function* over *iterable*.
+
+    Exactly one of *shape* or *chunksize* may be given. *shape* gives the number
+    of chunks (tasks) into which a sized *iterable* is divided, as a 1-tuple.
+    Additional key word arguments are passed to :py:class:`Map`.
+    """
+    if shape is not None:
+        if chunksize is not None:
+            raise TypeError('Provide either shape or chunksize, not both.')
+        if len(shape) != 1 or shape[0] < 1:
+            raise ValueError('Only one-dimensional shapes are supported, but got {}.'.format(repr(shape)))
+        if not hasattr(iterable, '__len__'):
+            raise ValueError('shape requires an iterable with a known length.')
+        chunksize = max(1, -(-len(iterable) // shape[0]))
+    if chunksize is None:
+        chunksize = 1
+    return Map(function, iterable, chunksize=chunksize, **kwargs)
+
+
+class WhileLoop:
+    """Chain of operations, extended one iteration at a time until *condition* is satisfied.
+
+    Each iteration calls *function* (with *kwargs*) to add the operation for the
+    iteration to the workflow *context*, waits for its result, and evaluates
+    *condition* with the result. *function* may return the uid of a task (only
+    the task and the tasks upstream of it are executed), an awaitable, or a
+    value. *condition* may return a bool, an awaitable, or the uid of a task
+    with a boolean result.
+
+    The loop ends when *condition* evaluates True or after *max_iteration*
+    iterations. *function* is called at least once.
+
+    Since task uids are fingerprints of task input, work that does not change
+    between iterations is only performed once, and iterations with a result in
+    the context's store are not executed again, so a loop declared again after
+    an interruption resumes from the last completed iteration. If a running loop
+    is cancelled, awaiting it again resumes the interrupted iteration.
+    """
+    def __init__(self, function: typing.Callable, condition: typing.Callable, max_iteration: int = 10,
+                 context=None, kwargs: dict = None):
+        if max_iteration < 1:
+            raise ValueError('max_iteration must be a positive integer.')
+        self._function = function
+        self._condition = condition
+        self._max_iteration = max_iteration
+        self._context = context
+        self._kwargs = {} if kwargs is None else kwargs
+        # Handle for the incomplete iteration, if any.
+        self._current = None
+        self.iterations = []  # Handles (such as task uids) of completed iterations.
+        self.satisfied = False
+
+    async def _resolve(self, item):
+        future, created = _leaf(item, self._context)
+        try:
+            return await future
+        finally:
+            if created:
+                future.cancel()
+
+    @property
+    def done(self) -> bool:
+        return self.satisfied or len(self.iterations) >= self._max_iteration
+
+    async def run(self):
+        """Run the remaining iterations and get the handle for the last iteration."""
+        while not self.done:
+            if self._current is None:
+                self._current = self._function(**self._kwargs)
+            result = await self._resolve(self._current)
+            satisfied = await self._resolve(self._condition(result))
+            self.iterations.append(self._current)
+            self._current = None
+            self.satisfied = bool(satisfied)
+        return self.iterations[-1]
+
+    def __call__(self):
+        return self.run()
+
+    def __await__(self):
+        return self.run().__await__()
+
+
+def while_loop(function: typing.Callable, condition: typing.Callable, max_iteration: int = 10,
+               context=None, **kwargs) -> WhileLoop:
+    """Get a :py:class:`WhileLoop`, passing *kwargs* to *function*."""
+    return WhileLoop(function, condition, max_iteration=max_iteration, context=context, kwargs=kwargs)
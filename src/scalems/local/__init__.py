@@ -9,43 +9,136 @@ Example:
 
 import asyncio
 import concurrent.futures
+import functools
+import os
+import threading
 import warnings
+from pathlib import Path
 from typing import Any, Callable
 
 import scalems.context
+import scalems.pyfunction
+from scalems.store import ResultStore
 from . import operations
+from .scheduler import AdmissionQueue, CoreSlots, available_cpus
+
+
+def _check_spawn(spawn: bool) -> bool:
+    if spawn and not hasattr(os, 'posix_spawnp'):
+        raise ValueError('posix_spawn is not available on this platform.')
+    return bool(spawn)
+
+
+def _start_workers(context):
+    """Create a worker pool for Python function tasks, if the context does not have one."""
+    if context.worker_pool is None:
+        context.worker_pool = scalems.pyfunction.WorkerPool()
+        context._own_worker_pool = True
+
+
+def _stop_workers(context):
+    if context._own_worker_pool:
+        context.worker_pool.shutdown()
+        context.worker_pool = None
+        context._own_worker_pool = False
+
+
+def _gather(futures) -> concurrent.futures.Future:
+    """Get a Future for the tuple of results of *futures*."""
+    gathered = concurrent.futures.Future()
+    remaining = set(futures)
+    lock = threading.Lock()
+
+    def done(future):
+        with lock:
+            remaining.discard(future)
+            if remaining:
+                return
+        try:
+            gathered.set_result(tuple(future.result() for future in futures))
+        except Exception as e:
+            gathered.set_exception(e)
+
+    if not futures:
+        gathered.set_result(())
+    for future in futures:
+        future.add_done_callback(done)
+    return gathered
 
 
 class ImmediateExecutionContext(scalems.context.AbstractWorkflowContext):
     """Workflow context for immediately executed commands.
 
-    Commands are executed immediately upon addition to the work flow. Data flow
-    must be resolvable at command instantiation.
+    Commands are submitted for execution immediately upon addition to the work
+    flow, in a pool of (at most) *max_workers* threads (default: the number of
+    available CPUs), so independent commands may run concurrently. Use
+    ``run(uid)`` to wait for a command and get its result. Commands that
+    reference the outputs of other commands wait for those commands to complete.
+    Remaining commands are completed when the context is exited. If a command
+    whose result was not retrieved raised an exception, the (first) exception
+    is then raised (as the cause of a RuntimeError).
+
+    Intended for debugging. With ``max_workers=1``, commands are executed one at
+    a time, in the order in which they are added.
+
+    Standard output and standard error of each task are written to
+    ``<uid>.stdout`` and ``<uid>.stderr`` in *output_dir* (default: the current
+    working directory).
 
-    Intended for debugging.
+    If *spawn* is True, processes are launched with
+    :py:func:`scalems.local.operations.posix_spawn`.
+
+    Python function tasks (:py:class:`scalems.pyfunction.PyFunction`) are called
+    in the worker processes of *worker_pool* (default: a
+    :py:class:`scalems.pyfunction.WorkerPool` created when the first such task
+    is added, and shut down when the context is exited).
     """
 
-    def __init__(self):
+    def __init__(self, output_dir=None, max_workers: int = None, spawn: bool = False,
+                 worker_pool: scalems.pyfunction.WorkerPool = None):
         # Details for scalems.subprocess module compatibility.
         import subprocess
         self.PIPE = getattr(subprocess, 'PIPE')
         self.STDOUT = getattr(subprocess, 'STDOUT')
         self.DEVNULL = getattr(subprocess, 'DEVNULL')
         self.subprocess = subprocess
+        self.output_dir = Path.cwd() if output_dir is None else Path(output_dir)
+        if max_workers is None:
+            max_workers = len(available_cpus())
+        self.max_workers = max_workers
+        self.spawn = _check_spawn(spawn)
+        self.environments = operations.TaskEnvironments()
+        self.worker_pool = worker_pool
+        self._own_worker_pool = False
+        self.executor = None
         # Basic Context implementation details
         self.task_map = dict()  # Map UIDs to task Futures.
+        self._ensembles = dict()  # Map UIDs to executed ensembles.
+        self._joined = set()  # UIDs of tasks whose results have been retrieved.
         self.contextvar_tokens = []
+        self.event_loop = None
 
     def __enter__(self):
         # TODO: Use generated or base class behavior for managing the global context state.
         # TODO: Consider using the asyncio event loop for ImmediateExecution (and all contexts).
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
         self.contextvar_tokens.append(scalems.context.parent.set(scalems.context.current.get()))
         self.contextvar_tokens.append(scalems.context.current.set(self))
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        # Complete the submitted tasks.
+        self.executor.shutdown(wait=True)
+        self.executor = None
+        _stop_workers(self)
+        scalems.context.close_event_loop(self)
         for token in self.contextvar_tokens:
             token.var.reset(token)
+        # Don't hide task failures that nobody has seen, unless the block is already raising.
+        if exc_type is None:
+            for uid, future in self.task_map.items():
+                if uid not in self._joined and future.exception() is not None:
+                    raise RuntimeError('Task {} failed.'.format(uid)) from future.exception()
         return super().__exit__(exc_type, exc_val, exc_tb)
 
     # def add_task(self, operation: str, bound_input):
@@ -58,25 +151,87 @@ class ImmediateExecutionContext(scalems.context.AbstractWorkflowContext):
         # #  to resources owned by other Contexts.
         # if not isinstance(bound_input, scalems.subprocess.SubprocessInput):
         #     raise ValueError('Only scalems.subprocess.SubprocessInput objects supported as input.')
-        if not isinstance(task_description, scalems.subprocess.Subprocess):
+        if isinstance(task_description, scalems.subprocess.SubprocessEnsemble):
+            return self._add_ensemble(task_description)
+        if not isinstance(task_description, (scalems.subprocess.Subprocess, scalems.pyfunction.PyFunction)):
             raise NotImplementedError('Operation not supported.')
         uid = task_description.uid()
         if uid in self.task_map:
-            # TODO: Consider decreasing error level to `warning`.
-            raise ValueError('Task already present in workflow.')
+            # The existing task represents the same work. See AbstractWorkflowContext.add_task
+            return uid
+        if isinstance(task_description, scalems.pyfunction.PyFunction):
+            _start_workers(self)
+        # Referenced tasks must already be present. Since tasks are started in
+        # the order in which they are added, a task waiting for its inputs does
+        # not prevent the referenced tasks from starting.
+        for dependency in task_description.dependencies():
+            if dependency not in self.task_map:
+                raise ValueError('Task input references {}, which is not present in workflow.'.format(dependency))
+        if self.executor is None:
+            raise RuntimeError('Tasks may only be added while the context is active.')
         # TODO: use generic reference to implementation.
-        self.task_map[uid] = operations.executable(context=self, task=task_description)
+        self.task_map[uid] = self.executor.submit(operations.executable, context=self, task=task_description)
         # TODO: The return value should be a full proxy to a command instance.
         return uid
 
+    def _add_ensemble(self, ensemble):
+        """Submit the members of an ensemble, in order.
+
+        The ensemble result is the tuple of member results.
+        """
+        uid = ensemble.uid()
+        if uid in self.task_map:
+            return scalems.subprocess.EnsembleReference(uid, self, ensemble.shape)
+        futures = []
+        for member in ensemble.members():
+            member_uid = member.uid()
+            if member_uid not in self.task_map:
+                self.add_task(member)
+            futures.append(self.task_map[member_uid])
+        self.task_map[uid] = _gather(futures)
+        self._ensembles[uid] = ensemble
+        return scalems.subprocess.EnsembleReference(uid, self, ensemble.shape)
+
+    def member(self, uid: str, index: int) -> str:
+        """Get the uid of a member of an ensemble."""
+        return self._ensembles[uid].member(index).uid()
+
+    def reference(self, uid: str, label: str = None):
+        """Map a subscripted reference to an ensemble onto the referenced member.
+
+        See :py:meth:`AsyncWorkflowContext.reference`
+        """
+        if label is not None and uid in self._ensembles:
+            unsubscripted, index = scalems.subprocess.split_subscript(label)
+            if index is not None:
+                return self.member(uid, index), unsubscripted
+        return uid, label
+
+    def result(self, uid: str):
+        """Wait for a task to complete, and get its result."""
+        future = self.task_map[uid]
+        self._joined.add(uid)
+        if uid in self._ensembles:
+            self._joined.update(member.uid() for member in self._ensembles[uid].members())
+        return future.result()
+
     def run(self, task):
-        # If task belongs to this context, it has already run: no-op.
-        return self.task_map[task]
+        # If task belongs to this context, it has already been submitted. Wait for it.
+        return self.result(task)
 
-    def wait(self, awaitable):
-        # Warning: this is not the right way to confirm the object does not need await...
-        assert not asyncio.iscoroutine(awaitable)
-        raise NotImplementedError()
+    def wait(self, ref):
+        """Get the local value of a workflow reference or awaitable.
+
+        References are resolved when the referenced task completes.
+        Awaitables are run in a persistent event loop for the context.
+        """
+        if not isinstance(ref, str):
+            return scalems.context.run_until_complete(self, ref)
+        reference = scalems.subprocess.parse_reference(ref)
+        if reference is None:
+            raise ValueError('{} is not a workflow reference.'.format(ref))
+        uid, label = self.reference(*reference)
+        return scalems.subprocess.resolve_reference(self.result(uid), label)
 
 
 class AsyncWorkflowContext(scalems.context.AbstractWorkflowContext):
@@ -84,18 +239,87 @@ class AsyncWorkflowContext(scalems.context.AbstractWorkflowContext):
 
     Uses the asyncio module to allow commands to be staged as asyncio coroutines.
 
-    There is no implicit OS level multithreading or multiprocessing.
+    There is no implicit OS level multithreading or multiprocessing, but
+    subprocesses are launched concurrently. At most *max_concurrent* subprocesses
+    (default: the number of available CPUs) run at a time. Additional tasks wait
+    for admission in submission order (*admission='fifo'*) or in order of
+    decreasing ``priority`` in the task *resources* (*admission='priority'*).
+
+    Admitted tasks are then packed onto the *cpus* managed by the context
+    (default: all CPUs available to the current process). A task occupies
+    *procs_per_task* x *threads_per_proc* cores (per the task *resources*),
+    its process is pinned to its allocated cores, and OMP_NUM_THREADS is set to
+    *threads_per_proc*.
+
+    Tasks whose *inputs* reference the outputs of other tasks (e.g. ``'{uid}.outfile'``)
+    are launched as soon as the last of the referenced tasks completes
+    successfully. If a referenced task fails, the dependent tasks are not launched.
+
+    An ensemble (:py:class:`scalems.subprocess.SubprocessEnsemble`) is held as a
+    single node until it is dispatched, when its members are added to the work
+    graph. The ensemble result is the tuple of member results, once all members
+    have completed successfully.
+
+    Individual ensemble members are added to the work graph (without the rest of
+    the ensemble) by indexing the EnsembleReference returned for the ensemble, or
+    by a subscripted reference in task *inputs* (e.g. ``'{uid}.file.outfile[3]'``).
+    When the workflow is run for particular targets, only the members (and other
+    tasks) upstream of the targets are executed.
+
+    If a *store* (a :py:class:`scalems.store.ResultStore` or a directory path) is
+    provided, successful results are recorded there, and tasks with a stored
+    result are not executed again.
+
+    Adding a task that is already in the work graph (i.e. with the same uid)
+    returns a reference to the existing task, which is executed only once.
+
+    Standard output and standard error of each task are written to
+    ``<uid>.stdout`` and ``<uid>.stderr`` in *output_dir* (default: the current
+    working directory).
+
+    If *spawn* is True, processes are launched with
+    :py:func:`scalems.local.operations.posix_spawn` and awaited without the
+    asyncio subprocess machinery, reducing the per-task launch overhead for
+    workflows with many short tasks.
+
+    Python function tasks (:py:class:`scalems.pyfunction.PyFunction`) are called
+    in the worker processes of *worker_pool* (default: a
+    :py:class:`scalems.pyfunction.WorkerPool` created when the first such task
+    is added, and shut down when the context is exited), without admission
+    control or core allocation. Their results are not stored.
     """
-    def __init__(self):
+    def __init__(self, max_concurrent: int = None, admission: str = 'fifo', cpus=None, store=None,
+                 output_dir=None, spawn: bool = False, worker_pool: scalems.pyfunction.WorkerPool = None):
         from asyncio import subprocess
         self.PIPE = getattr(subprocess, 'PIPE')
         self.STDOUT = getattr(subprocess, 'STDOUT')
         self.DEVNULL = getattr(subprocess, 'DEVNULL')
         self.subprocess = subprocess
+        if max_concurrent is None:
+            max_concurrent = len(available_cpus())
+        self.admission = AdmissionQueue(max_concurrent, policy=admission)
+        self.cores = CoreSlots(cpus)
+        if store is not None and not isinstance(store, ResultStore):
+            store = ResultStore(store)
+        self.store = store
+        self.output_dir = Path.cwd() if output_dir is None else Path(output_dir)
+        self.spawn = _check_spawn(spawn)
+        self.environments = operations.TaskEnvironments()
+        self.worker_pool = worker_pool
+        self._own_worker_pool = False
         # Basic Context implementation details
-        self.task_map = dict()  # Map UIDs to task Futures.
+        self.task_map = dict()  # Map UIDs to task descriptions.
         self.contextvar_tokens = []
         self.event_loop = None
+        self.event_loop_thread = None
+        # Work graph state.
+        self._dependents = dict()  # Map UIDs to the UIDs of tasks that reference them.
+        self._upstream = dict()  # Map UIDs to the UIDs of the tasks that they reference.
+        self._waiting = dict()  # Map UIDs to the set of incomplete dependencies.
+        self._futures = dict()  # Map UIDs to result Futures for scheduled tasks.
+        self._launched = dict()  # Map UIDs to asyncio.Tasks for launched tasks.
+        self._stored = dict()  # Map UIDs to results retrieved from the store.
+        self._dispatching = False
 
     def __enter__(self):
         # TODO: Use generated or base class behavior for managing the global context state.
@@ -108,18 +332,11 @@ class AsyncWorkflowContext(scalems.context.AbstractWorkflowContext):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        loop = self.event_loop
-        # if loop is None:
-        #     raise RuntimeError('We should not be able to reach this point...')
-        # if loop.is_running():
-        #     # Clean up unawaited tasks.
-        #     loop.run_until_complete(loop.shutdown_asyncgens())
-        #     # Do we need to check the work graph directly?
-        #     # We need to make sure the loop is not running before calling close()
-        #     loop.stop()
-        # Do we want to close the event loop here, as part of scalems.run(), or somewhere else?
-        # loop.close()
-        self.event_loop = None
+        # Close the event loop created for blocking calls to wait(), if any.
+        # (An event loop provided by the caller, such as when the context is used
+        # in a coroutine, is left alone.)
+        scalems.context.close_event_loop(self)
+        _stop_workers(self)
         # Restore context module state since we are not using contextvars.Context.run() or equivalent.
         for token in self.contextvar_tokens:
             token.var.reset(token)
@@ -135,41 +352,333 @@ class AsyncWorkflowContext(scalems.context.AbstractWorkflowContext):
         # #  to resources owned by other Contexts.
         # if not isinstance(bound_input, scalems.subprocess.SubprocessInput):
         #     raise ValueError('Only scalems.subprocess.SubprocessInput objects supported as input.')
-        if not isinstance(task_description, scalems.subprocess.Subprocess):
+        if self.event_loop_thread not in (None, threading.current_thread()):
+            # The work graph is only updated in the event loop thread.
+            return scalems.context.call_in_event_loop(self, self.add_task, task_description)
+        loop = scalems.context.calling_loop.get()
+        if loop is not None and not scalems.context.in_loop_thread(loop):
+            # Called from work delegated to another thread by a coroutine in *loop*.
+            return scalems.context.call_in_loop(loop, self.add_task, task_description)
+        ensemble = isinstance(task_description, scalems.subprocess.SubprocessEnsemble)
+        function = isinstance(task_description, scalems.pyfunction.PyFunction)
+        if not (ensemble or function or isinstance(task_description, scalems.subprocess.Subprocess)):
             raise NotImplementedError('Operation not supported.')
         uid = task_description.uid()
         if uid in self.task_map:
-            # TODO: Consider decreasing error level to `warning`.
-            raise ValueError('Task already present in workflow.')
+            # The existing node represents the same work. See AbstractWorkflowContext.add_task
+            if ensemble:
+                return scalems.subprocess.EnsembleReference(uid, self, task_description.shape)
+            return uid
         # TODO: use generic reference to implementation.
         # TODO: DO NOT hold a reference to the client-provided object; CREATE a task in the current context.
-        #       Make sure there are no artifacts of shallow copies that may result in a user modifying nested objects unexpectedly.
-        awaitable = operations.executable(context=self, task=task_description)
-        self.task_map[uid] = awaitable
-        # TODO: Create (asyncio) task. Note that the event loop may already be running.
+        #       (Task input is immutable, so nested input objects cannot be modified unexpectedly.)
+        # Ensemble members are checked when they are added at dispatch.
+        if function:
+            _start_workers(self)
+        elif not ensemble and operations.task_width(task_description.input_collection()) > len(self.cores.cpus):
+            raise ValueError('Task requires more cores than are available to the context.')
+        # Requiring dependencies to be added first keeps the work graph acyclic.
+        dependencies = self._references(task_description)
+        for dependency in dependencies:
+            if dependency not in self.task_map:
+                raise ValueError('Task input references {}, which is not present in workflow.'.format(dependency))
+        self.task_map[uid] = task_description
+        self._upstream[uid] = dependencies
+        for dependency in dependencies:
+            self._dependents.setdefault(dependency, []).append(uid)
+        if self.store is not None and not (ensemble or function):
+            result = self.store.get(uid)
+            if result is not None:
+                self._stored[uid] = result
+        if self._dispatching:
+            self._schedule(uid)
+        if ensemble:
+            return scalems.subprocess.EnsembleReference(uid, self, task_description.shape)
         return uid
 
+    def start_dispatching(self):
+        """Execute tasks in a background thread, as they are added to the work graph.
+
+        Starts an event loop for the context in a new thread, in which tasks are
+        launched as soon as they are ready, while the caller continues to add tasks.
+        Use ``context.wait(context.run())`` to wait for all tasks to complete.
+        The thread is stopped when the context is exited.
+        """
+        scalems.context.start_event_loop(self)
+        scalems.context.call_in_event_loop(self, self._start_dispatching)
+
+    def _start_dispatching(self):
+        self._dispatching = True
+        for uid in list(self.task_map):
+            if uid not in self._futures:
+                self._schedule(uid)
+
+    def member(self, uid: str, index: int) -> str:
+        """Get the uid of a member of an ensemble, adding the member (only) to the work graph."""
+        ensemble = self.task_map[uid]
+        if not isinstance(ensemble, scalems.subprocess.SubprocessEnsemble):
+            raise ValueError('{} is not an ensemble.'.format(uid))
+        member = ensemble.member(index)
+        member_uid = member.uid()
+        if member_uid not in self.task_map:
+            self.add_task(member)
+        return member_uid
+
+    def reference(self, uid: str, label: str = None):
+        """Map a subscripted reference to an ensemble onto the referenced member.
+
+        Returns the uid and the (unsubscripted) label of the referenced task output.
+        For example, ``(ensemble_uid, 'file.outfile[3]')`` is mapped to
+        ``(member_uid, 'file.outfile')``.
+        """
+        if label is not None and isinstance(self.task_map.get(uid, None), scalems.subprocess.SubprocessEnsemble):
+            unsubscripted, index = scalems.subprocess.split_subscript(label)
+            if index is not None:
+                return self.member(uid, index), unsubscripted
+        return uid, label
+
+    def _references(self, task) -> tuple:
+        """Get the uids of the work graph nodes referenced by the inputs of a task.
+
+        Ensembles depend on whole referenced nodes. Their members are resolved
+        to finer grained references when the ensemble is expanded.
+        """
+        if isinstance(task, scalems.subprocess.SubprocessEnsemble):
+            return task.dependencies()
+        if isinstance(task, scalems.pyfunction.PyFunction):
+            values = task.input_collection().references()
+        else:
+            values = task.input_collection().inputs.values()
+        dependencies = []
+        for value in values:
+            reference = scalems.subprocess.parse_reference(value)
+            if reference is not None:
+                uid, _ = self.reference(*reference)
+                if uid not in dependencies:
+                    dependencies.append(uid)
+        return tuple(dependencies)
+
+    def _required(self, targets) -> set:
+        """Get the uids of the targets and of the work graph nodes upstream of them.
+
+        Ensembles are expanded, so that only the members upstream of the targets are included.
+        """
+        required = set()
+        stack = list(targets)
+        while stack:
+            uid = stack.pop()
+            if uid in required:
+                continue
+            if uid not in self.task_map:
+                raise ValueError('Task {} is not present in workflow.'.format(uid))
+            required.add(uid)
+            node = self.task_map[uid]
+            if isinstance(node, scalems.subprocess.SubprocessEnsemble):
+                stack.extend(self.member(uid, index) for index in range(len(node)))
+            else:
+                stack.extend(self._upstream[uid])
+        return required
+
+    def result(self, uid: str):
+        """Get the result of a completed task."""
+        future = self._futures.get(uid, None)
+        if future is None or not future.done():
+            raise RuntimeError('Task {} is not complete.'.format(uid))
+        return future.result()
+
+    def future(self, uid: str) -> asyncio.Future:
+        """Get the result Future of a task.
+
+        The task (and any tasks upstream of it) is dispatched, if it is not already.
+        Requires a running event loop.
+        """
+        if uid not in self.task_map:
+            raise ValueError('Task {} is not present in workflow.'.format(uid))
+        if uid not in self._futures:
+            self._schedule(uid)
+        return self._futures[uid]
+
+    @staticmethod
+    def _failed(future) -> bool:
+        if future.cancelled() or future.exception() is not None:
+            return True
+        result = future.result()
+        return isinstance(result, scalems.subprocess.SubprocessResult) and result.exitcode != 0
+
+    def _schedule(self, uid):
+        """Create the result Future for a task (and for the unscheduled tasks upstream of it).
+
+        Dependencies are always scheduled before their dependents. The upstream
+        graph is traversed iteratively, so long chains of tasks do not exhaust
+        the Python stack.
+        """
+        # Each entry is (uid, whether the dependencies of uid have already been pushed).
+        stack = [(uid, False)]
+        while stack:
+            node, visited = stack.pop()
+            if node in self._futures:
+                continue
+            if not visited and node not in self._stored:
+                unscheduled = [dependency for dependency in self._upstream.get(node, ())
+                               if dependency not in self._futures]
+                if unscheduled:
+                    stack.append((node, True))
+                    stack.extend((dependency, False) for dependency in reversed(unscheduled))
+                    continue
+            self._schedule_ready(node)
+
+    def _schedule_ready(self, uid):
+        """Create the result Future for a task whose dependencies are scheduled, and launch it if it is ready."""
+        future = asyncio.get_event_loop().create_future()
+        self._futures[uid] = future
+        future.add_done_callback(functools.partial(self._release_dependents, uid))
+        if uid in self._stored:
+            future.set_result(self._stored.pop(uid))
+            return
+        if isinstance(self.task_map[uid], scalems.subprocess.SubprocessEnsemble):
+            self._expand(uid)
+            return
+        dependencies = self._upstream[uid]
+        failed = [dependency for dependency in dependencies
+                  if self._futures[dependency].done() and self._failed(self._futures[dependency])]
+        if failed:
+            future.set_exception(RuntimeError('Dependency {} failed.'.format(failed[0])))
+            return
+        waiting = set(dependency for dependency in dependencies if not self._futures[dependency].done())
+        if waiting:
+            self._waiting[uid] = waiting
+        else:
+            self._launch(uid)
+
+    def _expand(self, uid):
+        """Add the members of an ensemble to the work graph and gather their results."""
+        members = []
+        try:
+            for member in self.task_map[uid].members():
+                member_uid = member.uid()
+                if member_uid not in self.task_map:
+                    self.add_task(member)
+                if member_uid not in self._futures:
+                    self._schedule(member_uid)
+                members.append(self._futures[member_uid])
+        except ValueError as e:
+            self._futures[uid].set_exception(e)
+            return
+        self._launched[uid] = asyncio.ensure_future(self._gather(uid, members))
+        self._launched[uid].add_done_callback(lambda _: self._launched.pop(uid))
+
+    async def _gather(self, uid, members):
+        if members:
+            await asyncio.wait(members)
+        future = self._futures[uid]
+        if future.done():
+            return
+        ensemble = self.task_map[uid]
+        for index, member in enumerate(members):
+            if self._failed(member):
+                future.set_exception(RuntimeError('Ensemble member {} failed.'.format(ensemble.member(index).uid())))
+                return
+        future.set_result(tuple(member.result() for member in members))
+
+    def _launch(self, uid):
+        task = asyncio.ensure_future(operations.executable(context=self, task=self.task_map[uid]))
+        self._launched[uid] = task
+        task.add_done_callback(functools.partial(self._finish, uid))
+
+    def _finish(self, uid, task):
+        """Transfer the outcome of a launched task to its result Future."""
+        del self._launched[uid]
+        future = self._futures[uid]
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            result = task.result()
+            if self.store is not None and isinstance(result, scalems.subprocess.SubprocessResult):
+                self.store.put(uid, result)
+            future.set_result(result)
+
+    def _release_dependents(self, uid, future):
+        """Launch (or fail) the scheduled dependents of a completed task."""
+        failed = self._failed(future)
+        for dependent in self._dependents.get(uid, ()):
+            if dependent not in self._waiting:
+                continue
+            if failed:
+                del self._waiting[dependent]
+                self._futures[dependent].set_exception(RuntimeError('Dependency {} failed.'.format(uid)))
+            else:
+                waiting = self._waiting[dependent]
+                waiting.discard(uid)
+                if not waiting:
+                    del self._waiting[dependent]
+                    self._launch(dependent)
+
     async def run(self, task=None):
         """Run the configured workflow.
 
-        TODO:
-            Consider whether to use an awaitable argument as a hint to narrow the scope
-            of the work graph to execute, or whether to just run everything.
+        If *task* (a uid or an iterable of uids) is provided, only the targets
+        and the tasks upstream of them are executed. Otherwise, all tasks in the
+        workflow are executed.
+
+        Tasks added while the workflow is running are executed, as well.
+
+        Returns:
+            (done, pending) sets of result Futures for the executed tasks.
 
         TODO: Move this function implementation to the executor instance / Session implementation.
         """
-        if task is not None:
-            raise NotImplementedError('Semantics for run(task) are not yet defined.')
+        if task is None:
+            required = None
+        else:
+            targets = (task,) if isinstance(task, str) else tuple(task)
+            required = self._required(targets)
         # Bypass the need for asyncio.run()
         # if self.event_loop is None:
         #     raise RuntimeError('No event loop!')
         # loop = self.event_loop
-        return await asyncio.wait(self.task_map.values())
+        self._dispatching = True
+        try:
+            # Dispatching an ensemble adds tasks to the task_map.
+            for uid in list(self.task_map):
+                if uid not in self._futures and (required is None or uid in required):
+                    self._schedule(uid)
+            # Tasks may be added while the workflow is running.
+            pending = [future for future in self._futures.values() if not future.done()]
+            while pending:
+                await asyncio.wait(pending)
+                pending = [future for future in self._futures.values() if not future.done()]
+        finally:
+            self._dispatching = False
+        if required is None:
+            return set(self._futures.values()), set()
+        return set(self._futures[uid] for uid in required), set()
+
+    def wait(self, ref, timeout: float = None):
+        """Block until *ref* is resolved, and get its local value.
+
+        *ref* may be a task reference (a uid, optionally with a result label,
+        such as ``'{uid}.file.outfile'``) or another awaitable. Only the
+        referenced task and the tasks upstream of it are executed.
+
+        Blocking calls use an event loop that is created on first use and kept
+        until the context is exited. Tasks dispatched for one call continue
+        with the next call. In a coroutine, use ``await context.future(uid)`` instead.
+        """
+        return scalems.context.run_until_complete(self, self._resolve(ref, timeout))
 
-    def wait(self, awaitable, **kwargs):
-        # TODO: We have to confirm that an event loop is running and properly handle awaitables.
-        assert asyncio.iscoroutine(awaitable)
-        raise NotImplementedError()
+    async def _resolve(self, ref, timeout=None):
+        label = None
+        if isinstance(ref, str):
+            reference = scalems.subprocess.parse_reference(ref)
+            if reference is None:
+                raise ValueError('{} is not a workflow reference.'.format(ref))
+            uid, label = self.reference(*reference)
+            # Don't cancel the task result if the wait times out.
+            ref = asyncio.shield(self.future(uid))
+        result = await asyncio.wait_for(ref, timeout)
+        return scalems.subprocess.resolve_reference(result, label)
 
 
 # class LocalExecutor(concurrent.futures.Executor):
@@ -22,8 +22,11 @@ import scalems.local
 # Strip the current __main__ file from argv
 sys.argv[:] = sys.argv[1:]
 # Execute the script in the current process.
-# TODO: Use Async context by default.
+# Tasks are dispatched in the background while the script is still adding work,
+# and the remaining work is completed when the script finishes.
 # TODO: More robust dispatching.
 # TODO: Can we support mixing invocation with pytest?
-with scalems.local.ImmediateExecutionContext():
+with scalems.local.AsyncWorkflowContext() as context:
+    context.start_dispatching()
     runpy.run_path(sys.argv[0])
+    context.wait(context.run())
@@ -2,48 +2,335 @@
 Specialize implementations of ScaleMS operations.
 
 """
+import concurrent.futures
+import contextlib
+import os
+import threading
+from pathlib import Path
+
+import scalems.pyfunction
 import scalems.subprocess
 
 
-def local_exec(task_description: dict):
+def local_exec(task_description: dict, spawn: bool = False):
     argv = task_description['args']
     assert isinstance(argv, (list, tuple))
     assert len(argv) > 0
-    import subprocess
-    # TODO: Consider whether we want to support buffered I/O streams (pipes).
-    return subprocess.run(argv)
+    if spawn:
+        _, status = os.waitpid(posix_spawn(task_description), 0)
+        returncode = exitcode(status)
+    else:
+        import subprocess
+        # TODO: Consider whether we want to support buffered I/O streams (pipes).
+        with open_output(task_description) as kwargs:
+            cpus = task_description.get('cpus', None)
+            if cpus is None or not hasattr(os, 'sched_setaffinity'):
+                returncode = subprocess.run(argv, **kwargs).returncode
+            else:
+                process = pinned_call(cpus, subprocess.Popen, argv, **kwargs).result()
+                returncode = process.wait()
+    return scalems.subprocess.SubprocessResult(exitcode=returncode,
+                                               stdout=task_description.get('stdout', None),
+                                               stderr=task_description.get('stderr', None),
+                                               file=task_description.get('file', {}))
+
+
+def posix_spawn(task_description: dict) -> int:
+    """Launch a subprocess with :py:func:`os.posix_spawnp` and get its process id.
+
+    A lower overhead alternative to the :py:mod:`subprocess` module for short
+    tasks: the child process is created without copying the page tables of the
+    parent (where the C library supports it), and opens its own standard output
+    and standard error files.
+
+    The child inherits the CPU affinity of the launching thread, so a process
+    with task *cpus* is launched from a dedicated launcher thread, which is
+    pinned to the task *cpus* while the process is launched. (Threads created
+    by a pinned thread would inherit its affinity, so the calling thread is not
+    pinned itself.)
+    """
+    args, kwargs = _spawn_args(task_description)
+    cpus = task_description.get('cpus', None)
+    if cpus is None or not hasattr(os, 'sched_setaffinity'):
+        return os.posix_spawnp(*args, **kwargs)
+    return pinned_call(cpus, os.posix_spawnp, *args, **kwargs).result()
+
+
+def _spawn_args(task_description: dict):
+    """Get the (args, kwargs) of the :py:func:`os.posix_spawnp` call for a task."""
+    kwargs = task_description['kwargs']
+    if kwargs.get('stdin', None) is not None:
+        raise NotImplementedError('Standard input is not supported for posix_spawn launches.')
+    env = kwargs['env']
+    if env is None:
+        env = os.environ
+    file_actions = []
+    for fd, stream in ((1, 'stdout'), (2, 'stderr')):
+        path = task_description.get(stream, None)
+        if path is not None:
+            file_actions.append((os.POSIX_SPAWN_OPEN, fd, os.fspath(path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                                 0o666))
+    argv = task_description['args']
+    return (argv[0], argv, env), {'file_actions': file_actions}
+
+
+_launcher_executor = None
+_launcher_lock = threading.Lock()
+
+
+def _launcher() -> concurrent.futures.ThreadPoolExecutor:
+    """Get the single thread executor in which pinned processes are launched."""
+    global _launcher_executor
+    with _launcher_lock:
+        if _launcher_executor is None:
+            _launcher_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1,
+                                                                       thread_name_prefix='scalems-launcher')
+        return _launcher_executor
+
+
+def pinned_call(cpus, function, *args, **kwargs) -> concurrent.futures.Future:
+    """Call a process launching *function* in the launcher thread, pinned to *cpus*.
+
+    A child process inherits the CPU affinity of the thread that creates it.
+    The launcher thread does nothing but launch processes, so its temporary
+    affinity cannot be inherited by other threads (as it could be if the
+    calling thread were pinned), and the process can be created without a
+    *preexec_fn* (which is not safe in the presence of threads, and which
+    prevents the :py:mod:`subprocess` module from using vfork or posix_spawn).
+    """
+    return _launcher().submit(_pinned, cpus, function, *args, **kwargs)
+
+
+def _pinned(cpus, function, *args, **kwargs):
+    # Note that (on Linux) the affinity of the calling (launcher) thread, only, is changed.
+    affinity = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, cpus)
+    try:
+        return function(*args, **kwargs)
+    finally:
+        os.sched_setaffinity(0, affinity)
+
+
+def exitcode(status: int) -> int:
+    """Convert a process status from :py:func:`os.waitpid` to a return code, as in the subprocess module."""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+async def wait_process(pid: int) -> int:
+    """Wait for a process launched with :py:func:`posix_spawn` and get its return code.
+
+    Where supported, the event loop watches a pidfd for the process. Otherwise,
+    a thread waits for the process.
+    """
+    import asyncio
+    loop = asyncio.get_event_loop()
+    try:
+        fd = os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        _, status = await loop.run_in_executor(None, os.waitpid, pid, 0)
+        return exitcode(status)
+    try:
+        exited = loop.create_future()
+        loop.add_reader(fd, lambda: exited.done() or exited.set_result(None))
+        try:
+            await exited
+        finally:
+            loop.remove_reader(fd)
+    finally:
+        os.close(fd)
+    _, status = os.waitpid(pid, 0)
+    return exitcode(status)
+
+
+def output_paths(context, uid: str) -> dict:
+    """Get the paths of the files capturing standard output and standard error for a task."""
+    directory = Path(context.output_dir)
+    return {'stdout': directory / (uid + '.stdout'), 'stderr': directory / (uid + '.stderr')}
+
+
+@contextlib.contextmanager
+def open_output(task_description: dict):
+    """Open the standard output and standard error files of a subprocess.
+
+    Yields the subprocess keyword arguments with the open files. The child
+    process writes directly to the files, so output does not pass through
+    (or accumulate in) the parent process. The files are closed in the parent
+    on exit from the context manager.
+    """
+    kwargs = dict(task_description['kwargs'])
+    with contextlib.ExitStack() as stack:
+        for stream in ('stdout', 'stderr'):
+            path = task_description.get(stream, None)
+            if path is not None:
+                kwargs[stream] = stack.enter_context(open(path, 'wb'))
+        yield kwargs
+
+
+def task_width(task_input: scalems.subprocess.SubprocessInput) -> int:
+    """Get the number of cores required by a task.
+
+    .. todo:: Allocate *gpus_per_task*.
+    """
+    resources = task_input.resources
+    return int(resources.get('procs_per_task', 1)) * int(resources.get('threads_per_proc', 1))
 
 
-def make_subprocess_args(context, task_input: scalems.subprocess.SubprocessInput):
+def make_environment(task_input: scalems.subprocess.SubprocessInput, cpus=None, base=None):
+    """Get the process environment for a task, or None to inherit the current environment.
+
+    Variables with a value of None in the task *environment* are removed. If the
+    task has a CPU allocation, OMP_NUM_THREADS is set to *threads_per_proc*
+    unless the task environment sets it explicitly.
+
+    The task variables are applied to a copy of *base* (default: :py:data:`os.environ`).
+    """
+    if not task_input.environment and cpus is None:
+        return None
+    env = dict(os.environ if base is None else base)
+    if cpus is not None:
+        env['OMP_NUM_THREADS'] = str(task_input.resources.get('threads_per_proc', 1))
+    for key, value in task_input.environment.items():
+        if value is None:
+            env.pop(key, None)
+        else:
+            env[key] = str(value)
+    return env
+
+
+class TaskEnvironments:
+    """Process environments for the tasks of a workflow context.
+
+    The variables of each task are applied to a copy of the base environment,
+    which is copied from :py:data:`os.environ` when a task is launched. Tasks
+    with the same variables (such as the members of an ensemble, or many tasks
+    without task variables) share a copy, until :py:data:`os.environ` changes.
+    Up to *maxsize* copies are kept.
+    """
+    def __init__(self, maxsize: int = 64):
+        self.base = dict()
+        self.maxsize = maxsize
+        self._environments = dict()
+        self._lock = threading.Lock()
+
+    def get(self, task_input: scalems.subprocess.SubprocessInput, cpus=None):
+        """Get the process environment for a task. See :py:func:`make_environment`."""
+        if not task_input.environment and cpus is None:
+            return None
+        key = (tuple((name, None if value is None else str(value)) for name, value in task_input.environment.items()),
+               None if cpus is None else task_input.resources.get('threads_per_proc', 1))
+        base = dict(os.environ)
+        with self._lock:
+            if base != self.base:
+                # The copies were made from a previous environment.
+                self.base = base
+                self._environments.clear()
+            env = self._environments.get(key, None)
+        if env is None:
+            env = make_environment(task_input, cpus=cpus, base=base)
+            with self._lock:
+                if len(self._environments) >= self.maxsize:
+                    # Discard the oldest.
+                    del self._environments[next(iter(self._environments))]
+                self._environments[key] = env
+        return env
+
+
+def resolve_inputs(context, task_input: scalems.subprocess.SubprocessInput) -> dict:
+    """Map the references in the task *inputs* to the results of completed tasks in *context*.
+
+    Subscripted references to ensemble outputs are resolved with the result of the ensemble member.
+    Raises RuntimeError if a referenced task failed.
+    """
+    return resolve_references(context, task_input.inputs.values())
+
+
+def resolve_references(context, values) -> dict:
+    """Map the references among *values* to the results of completed tasks in *context*.
+
+    See :py:func:`resolve_inputs`
+    """
+    resolved = {}
+    for value in values:
+        reference = scalems.subprocess.parse_reference(value)
+        if reference is not None:
+            uid, label = context.reference(*reference)
+            result = context.result(uid)
+            if isinstance(result, scalems.subprocess.SubprocessResult) and result.exitcode != 0:
+                raise RuntimeError('Dependency {} failed.'.format(uid))
+            resolved[value] = scalems.subprocess.resolve_reference(result, label)
+    return resolved
+
+
+def make_subprocess_args(context, task_input: scalems.subprocess.SubprocessInput, cpus=None, resolved=None,
+                         stdout=None, stderr=None):
     """InputResource factory for *subprocess* based implementations.
+
+    Standard output and standard error are written to the *stdout* and *stderr*
+    paths, if provided.
+
+    If *cpus* is provided, the process is pinned to the allocated CPU ids
+    (where supported by the operating system) when it is launched (see :py:func:`pinned_call`).
+
+    *resolved* maps input references to their values. Elements of *argv* that
+    are references from *inputs* are replaced with the resolved values.
     """
     # subprocess.Popen and asyncio.create_subprocess_exec have approximately compatible arguments.
     # from scalems.context.local import AbstractLocalContext
     # if not isinstance(context, AbstractLocalContext):
     #     raise ValueError('This resource factory is for subprocess-based execution per scalems.context.local')
     # TODO: await the arguments.
-    args = list([arg for arg in task_input.argv])
+    if resolved is None:
+        resolved = {}
+    args = list([str(resolved[arg]) if arg in resolved else arg for arg in task_input.argv])
 
     # TODO: stream based input with PIPE.
     kwargs = {
         'stdin': None,
         'stdout': None,
         'stderr': None,
-        'env': None
+        'env': context.environments.get(task_input, cpus=cpus)
     }
-    return {'args': args, 'kwargs': kwargs}
+    files = {label: Path(path) for label, path in task_input.outputs.items()}
+    return {'args': args, 'kwargs': kwargs, 'file': files, 'stdout': stdout, 'stderr': stderr, 'cpus': cpus}
 
 
-async def get_coroutine(task_description: dict):
-    """Create and execute a subprocess task in the context."""
+async def get_coroutine(task_description: dict, spawn: bool = False):
+    """Create and execute a subprocess task in the context.
+
+    If *spawn* is True, the process is launched with :py:func:`posix_spawn`.
+    """
     import asyncio
     argv = task_description['args']
     assert isinstance(argv, (list, tuple))
     assert len(argv) > 0
-    # Get callable.
-    process = await asyncio.create_subprocess_exec(*argv)
-    returncode = await process.wait()
-    result = scalems.subprocess.SubprocessResult(exitcode=returncode, stdout=None, stderr=None, file={})
+    cpus = task_description.get('cpus', None)
+    if spawn:
+        if cpus is None or not hasattr(os, 'sched_setaffinity'):
+            pid = posix_spawn(task_description)
+        else:
+            # Wait for the launcher thread without blocking the event loop.
+            args, kwargs = _spawn_args(task_description)
+            pid = await asyncio.wrap_future(pinned_call(cpus, os.posix_spawnp, *args, **kwargs))
+        returncode = await wait_process(pid)
+    else:
+        with open_output(task_description) as kwargs:
+            if cpus is None or not hasattr(os, 'sched_setaffinity'):
+                process = await asyncio.create_subprocess_exec(*argv, **kwargs)
+            else:
+                import subprocess
+                process = await asyncio.wrap_future(pinned_call(cpus, subprocess.Popen, argv, **kwargs))
+        if isinstance(process, asyncio.subprocess.Process):
+            returncode = await process.wait()
+        else:
+            returncode = await wait_process(process.pid)
+            # The process has been reaped.
+            process.returncode = returncode
+    result = scalems.subprocess.SubprocessResult(exitcode=returncode,
+                                                 stdout=task_description.get('stdout', None),
+                                                 stderr=task_description.get('stderr', None),
+                                                 file=task_description.get('file', {}))
     # TODO: We should yield in here, somehow, to allow cancellation of the subprocess.
     # Suggest splitting runner into separate launch/resolve phases or representing this
     # long-running function as a stateful object. Note: this is properly a run-time Task.
@@ -57,15 +344,64 @@ async def get_coroutine(task_description: dict):
     return result
 
 
-def executable(context, task: scalems.subprocess.Subprocess):
-    # Make inputs.
-    # Translate SubprocessInput to the Python subprocess function signature.
-    subprocess_input = make_subprocess_args(context=context, task_input=task.input_collection())
+async def launch(context, task: scalems.subprocess.Subprocess):
+    """Launch a subprocess task when local resources allow.
+
+    The task waits for admission and for a CPU allocation of its width
+    (*procs_per_task* x *threads_per_proc*) before the process is created.
+    Tasks referenced by the task inputs must already be complete.
+    """
+    task_input = task.input_collection()
+    resolved = resolve_inputs(context, task_input)
+    priority = task_input.resources.get('priority', 0)
+    # Admission decides the launch order, so a task does not hold cores while it waits for admission.
+    # Cores are also allocated in order of priority, in case admitted tasks must wait for cores.
+    core_priority = priority if context.admission.policy == 'priority' else 0
+    async with context.admission.slot(priority):
+        async with context.cores.allocation(task_width(task_input), priority=core_priority) as cpus:
+            subprocess_input = make_subprocess_args(context=context, task_input=task_input, cpus=cpus,
+                                                    resolved=resolved, **output_paths(context, task.uid()))
+            return await get_coroutine(subprocess_input, spawn=context.spawn)
+
+
+def resolve_arguments(context, task_input: scalems.pyfunction.PyFunctionInput):
+    """Get the (args, kwargs) for a function call, with references replaced by the referenced results."""
+    resolved = resolve_references(context, task_input.references())
+
+    def value(arg):
+        return resolved[arg] if isinstance(arg, str) and arg in resolved else arg
+
+    return (tuple(value(arg) for arg in task_input.call_args),
+            {key: value(arg) for key, arg in task_input.call_kwargs.items()})
+
+
+async def call_function(context, task: scalems.pyfunction.PyFunction):
+    """Call a Python function task in the worker pool of the context."""
+    import asyncio
+    args, kwargs = resolve_arguments(context, task.input_collection())
+    return await asyncio.wrap_future(context.worker_pool.submit(task.input_collection().function, args, kwargs))
+
+
+def executable(context, task):
+    if isinstance(task, scalems.pyfunction.PyFunction):
+        if isinstance(context, scalems.local.ImmediateExecutionContext):
+            # Waits for referenced tasks to complete.
+            args, kwargs = resolve_arguments(context, task.input_collection())
+            return context.worker_pool.submit(task.input_collection().function, args, kwargs).result()
+        elif isinstance(context, scalems.local.AsyncWorkflowContext):
+            return call_function(context, task)
+        raise RuntimeError('Cannot dispatch for context {}'.format(repr(context)))
     # Run subprocess.
     if isinstance(context, scalems.local.ImmediateExecutionContext):
-        handle = local_exec(subprocess_input)
+        # Make inputs. (Waits for referenced tasks to complete.)
+        task_input = task.input_collection()
+        resolved = resolve_inputs(context, task_input)
+        # Translate SubprocessInput to the Python subprocess function signature.
+        subprocess_input = make_subprocess_args(context=context, task_input=task_input, resolved=resolved,
+                                                **output_paths(context, task.uid()))
+        handle = local_exec(subprocess_input, spawn=context.spawn)
     elif isinstance(context, scalems.local.AsyncWorkflowContext):
-        handle = get_coroutine(subprocess_input)
+        handle = launch(context, task)
     else:
         raise RuntimeError('Cannot dispatch for context {}'.format(repr(context)))
     # Return SubprocessResult object.
@@ -0,0 +1,202 @@
+"""Local resource management for task dispatching.
+
+Tasks dispatched by the local workflow contexts are launched as OS processes
+on the local node. Helpers in this module regulate when and where tasks are
+launched so that large work loads do not oversubscribe the node.
+"""
+
+import asyncio
+import contextlib
+import heapq
+import itertools
+import os
+
+
+def available_cpus() -> tuple:
+    """Get the CPU (core) ids available to the current process."""
+    if hasattr(os, 'sched_getaffinity'):
+        return tuple(sorted(os.sched_getaffinity(0)))
+    return tuple(range(os.cpu_count() or 1))
+
+
+class AdmissionQueue:
+    """Limit the number of concurrently admitted tasks.
+
+    Callers *acquire* one of *capacity* slots before launching work and *release*
+    it when the work is finished. While all slots are in use, callers wait
+    in FIFO order or, for the ``'priority'`` policy, in order of decreasing
+    priority (with FIFO order among equal priorities).
+
+    Not thread-safe. Use from within the thread running the event loop.
+    """
+    policies = ('fifo', 'priority')
+
+    def __init__(self, capacity: int, policy: str = 'fifo'):
+        if capacity < 1:
+            raise ValueError('Capacity must be a positive integer.')
+        if policy not in self.policies:
+            raise ValueError('Admission policy must be one of {}.'.format(', '.join(self.policies)))
+        self.capacity = capacity
+        self.policy = policy
+        self._active = 0
+        # Heap of (sort key, sequence number, asyncio.Future)
+        self._waiters = []
+        self._sequence = itertools.count()
+
+    @property
+    def active(self) -> int:
+        """Number of currently admitted callers."""
+        return self._active
+
+    @property
+    def waiting(self) -> int:
+        """Number of callers waiting for admission."""
+        return sum(1 for _, _, waiter in self._waiters if not waiter.done())
+
+    async def acquire(self, priority: int = 0):
+        """Wait until a slot is available and take it."""
+        if self._active < self.capacity and not self._waiters:
+            self._active += 1
+            return
+        key = -priority if self.policy == 'priority' else 0
+        waiter = asyncio.get_event_loop().create_future()
+        heapq.heappush(self._waiters, (key, next(self._sequence), waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # A slot may have been granted after cancellation was requested.
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        """Return a slot and admit the next waiter, if any."""
+        if self._active < 1:
+            raise RuntimeError('release() called more times than acquire().')
+        self._active -= 1
+        while self._waiters and self._active < self.capacity:
+            _, _, waiter = heapq.heappop(self._waiters)
+            # Cancelled waiters are discarded lazily.
+            if not waiter.done():
+                self._active += 1
+                waiter.set_result(None)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: int = 0):
+        """Hold a slot for the duration of an ``async with`` block."""
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class CoreSlots:
+    """Allocate the CPU cores of the local node to tasks of mixed width.
+
+    Each allocation reserves a set of *ncores* CPU ids until it is released.
+    Contiguous blocks of CPU ids are preferred. Waiting requests are granted
+    in order of decreasing priority (and arrival order among equal priorities),
+    but a narrow request may be granted ahead of a wider request that does not
+    yet fit (first-fit backfilling), so that the node stays fully packed.
+
+    To prevent starvation of wide requests, a waiting request may be passed over
+    by at most *max_backfill* later requests (default: the number of CPUs).
+    After that, no later request is granted until it has been granted.
+
+    *cpus* must be available to the current process (see :py:func:`available_cpus`).
+
+    Not thread-safe. Use from within the thread running the event loop.
+    """
+    def __init__(self, cpus=None, max_backfill: int = None):
+        if cpus is None:
+            cpus = available_cpus()
+        self.cpus = tuple(sorted(set(cpus)))
+        if len(self.cpus) < 1:
+            raise ValueError('At least one CPU is required.')
+        unavailable = set(self.cpus).difference(available_cpus())
+        if unavailable:
+            raise ValueError('CPUs {} are not available to this process.'.format(sorted(unavailable)))
+        if max_backfill is None:
+            max_backfill = len(self.cpus)
+        self.max_backfill = max_backfill
+        self._free = list(self.cpus)
+        # List of [ncores, asyncio.Future, times passed over, sort key] in grant order.
+        self._waiters = []
+        self._sequence = itertools.count()
+
+    @property
+    def free(self) -> int:
+        """Number of unallocated cores."""
+        return len(self._free)
+
+    def _take(self, ncores: int) -> tuple:
+        free = self._free
+        index = 0
+        # Look for a contiguous block of CPU ids.
+        for start in range(len(free) - ncores + 1):
+            if free[start + ncores - 1] - free[start] == ncores - 1:
+                index = start
+                break
+        allocation = tuple(free[index:index + ncores])
+        del free[index:index + ncores]
+        return allocation
+
+    async def acquire(self, ncores: int = 1, priority: int = 0) -> tuple:
+        """Wait until *ncores* cores are free and reserve them.
+
+        Returns:
+            Tuple of the allocated CPU ids.
+        """
+        if ncores < 1 or ncores > len(self.cpus):
+            raise ValueError('Cannot allocate {} cores from {} available.'.format(ncores, len(self.cpus)))
+        if not self._waiters and ncores <= len(self._free):
+            return self._take(ncores)
+        waiter = asyncio.get_event_loop().create_future()
+        entry = [ncores, waiter, 0, (-priority, next(self._sequence))]
+        index = len(self._waiters)
+        while index > 0 and self._waiters[index - 1][3] > entry[3]:
+            index -= 1
+        self._waiters.insert(index, entry)
+        # The request may fit alongside a request that is still waiting.
+        self.release(())
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(waiter.result())
+            else:
+                self._waiters = [entry for entry in self._waiters if entry[1] is not waiter]
+                # Requests held back by the cancelled request may now fit.
+                self.release(())
+            raise
+
+    def release(self, cpus):
+        """Return allocated cores and grant waiting requests that now fit."""
+        self._free.extend(cpus)
+        self._free.sort()
+        waiters = []
+        reserved = False
+        for entry in self._waiters:
+            ncores, waiter, _, _ = entry
+            if waiter.done():
+                continue
+            if not reserved and ncores <= len(self._free):
+                waiter.set_result(self._take(ncores))
+                for earlier in waiters:
+                    earlier[2] += 1
+            else:
+                waiters.append(entry)
+                if entry[2] >= self.max_backfill:
+                    # Reserve the free cores for this request.
+                    reserved = True
+        self._waiters = waiters
+
+    @contextlib.asynccontextmanager
+    async def allocation(self, ncores: int = 1, priority: int = 0):
+        """Hold *ncores* cores for the duration of an ``async with`` block."""
+        cpus = await self.acquire(ncores, priority)
+        try:
+            yield cpus
+        finally:
+            self.release(cpus)
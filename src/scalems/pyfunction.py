@@ -0,0 +1,213 @@
+"""Python function tasks.
+
+A PyFunction task calls an importable Python function with static arguments
+and/or references to the results of other tasks. Local workflow contexts call
+the function in a persistent pool of worker processes (:py:class:`WorkerPool`),
+so that interpreter start-up and expensive imports (such as of an analysis
+package) happen once per worker process, not once per task.
+
+Example::
+
+    pool = scalems.pyfunction.WorkerPool(max_workers=4, preload=('pyemma',))
+    with scalems.local.AsyncWorkflowContext(worker_pool=pool) as context:
+        model = scalems.pyfunction.function_call(msmtool.build_model, trajectory_uid)
+        ...
+    pool.shutdown()
+"""
+
+import concurrent.futures
+import hashlib
+import importlib
+import os
+import typing
+
+from .context import get_context
+from .subprocess import FrozenMapping, _canonical, _encode, _freeze, parse_reference
+
+
+class PyFunctionResourceType:
+    """Describe the type of resource provided by a PyFunction command."""
+    @classmethod
+    def as_strings(cls):
+        return ('scalems', 'pyfunction')
+
+    @classmethod
+    def identifier(cls):
+        return '.'.join(cls.as_strings())
+
+
+def function_name(function: typing.Callable) -> str:
+    """Get the importable name (``module:qualname``) of a function.
+
+    Worker processes find the function by name, so lambdas and nested
+    functions cannot be used.
+    """
+    module = getattr(function, '__module__', None)
+    qualname = getattr(function, '__qualname__', None)
+    if module is None or qualname is None or '<' in qualname:
+        raise ValueError('{} is not an importable module-level function.'.format(repr(function)))
+    return '{}:{}'.format(module, qualname)
+
+
+class PyFunctionInput:
+    """Immutable input for a PyFunction.
+
+    Arguments that are :token:`reference` strings (such as the uid of another
+    task) are replaced by the referenced results before the function is called.
+
+    *args* and *kwargs* are frozen copies of the arguments, which identify the
+    task (see :py:func:`fingerprint`). The function is called with the arguments
+    as given (*call_args* and *call_kwargs*), so that it receives lists and
+    dicts rather than their frozen equivalents. Arguments should not be modified
+    after the input is created.
+    """
+    __slots__ = ('function', 'args', 'kwargs', 'call_args', 'call_kwargs', '_digest')
+    _fields = ('function', 'args', 'kwargs')
+
+    def __init__(self, function: typing.Callable, args: typing.Sequence = (), kwargs: typing.Mapping = None):
+        function_name(function)
+        object.__setattr__(self, 'function', function)
+        object.__setattr__(self, 'call_args', tuple(args))
+        object.__setattr__(self, 'call_kwargs', dict(kwargs or ()))
+        object.__setattr__(self, 'args', tuple(_freeze(arg) for arg in self.call_args))
+        object.__setattr__(self, 'kwargs', FrozenMapping(self.call_kwargs))
+        object.__setattr__(self, '_digest', None)
+
+    def references(self) -> typing.Tuple[str, ...]:
+        """Get the arguments that are references to the results of other tasks."""
+        return tuple(value for value in self.args + tuple(self.kwargs.values())
+                     if parse_reference(value) is not None)
+
+    def __setattr__(self, key, value):
+        raise AttributeError('{} is immutable.'.format(self.__class__.__name__))
+
+    def __eq__(self, other):
+        if not isinstance(other, PyFunctionInput):
+            return NotImplemented
+        return (self.function, self.args, self.kwargs) == (other.function, other.args, other.kwargs)
+
+    def __hash__(self):
+        return hash((self.function, self.args, self.kwargs))
+
+    def __repr__(self):
+        return '{}(function={}, args={}, kwargs={})'.format(self.__class__.__name__, function_name(self.function),
+                                                            repr(self.args), repr(self.kwargs))
+
+    def __reduce__(self):
+        return self.__class__, (self.function, self.call_args, self.call_kwargs)
+
+
+def fingerprint(task_input: PyFunctionInput) -> str:
+    """Generate a content-addressed identifier for PyFunction input.
+
+    The function is identified by name, so the fingerprint does not change if
+    the function implementation changes.
+    """
+    if task_input._digest is None:
+        record = {
+            'type': list(PyFunctionResourceType.as_strings()),
+            'function': function_name(task_input.function),
+            'args': _canonical(task_input.args),
+            'kwargs': _canonical(task_input.kwargs)
+        }
+        object.__setattr__(task_input, '_digest', hashlib.sha256(_encode(record).encode('ascii')).hexdigest())
+    return task_input._digest
+
+
+class PyFunction:
+    __slots__ = ('_bound_input', '_uid')
+
+    @classmethod
+    def type(cls):
+        return PyFunctionResourceType
+
+    @classmethod
+    def input_type(cls):
+        return PyFunctionInput
+
+    def __init__(self, input: PyFunctionInput):
+        self._bound_input = input
+        self._uid = None
+
+    def input_collection(self) -> PyFunctionInput:
+        return self._bound_input
+
+    def dependencies(self) -> typing.Tuple[str, ...]:
+        """Get the uids of the tasks whose results are referenced by the function arguments."""
+        dependencies = []
+        for value in self._bound_input.references():
+            uid = parse_reference(value)[0]
+            if uid not in dependencies:
+                dependencies.append(uid)
+        return tuple(dependencies)
+
+    def uid(self) -> str:
+        if self._uid is None:
+            self._uid = fingerprint(self._bound_input)
+        return self._uid
+
+
+def _preload(modules: typing.Sequence[str]):
+    """Import modules in a new worker process."""
+    for module in modules:
+        importlib.import_module(module)
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+def call(function: typing.Callable, args: tuple, kwargs: dict):
+    """Call *function* (in a worker process)."""
+    return function(*args, **kwargs)
+
+
+class WorkerPool:
+    """Persistent pool of worker processes for Python function tasks.
+
+    Each worker process imports the *preload* modules when it starts. Worker
+    processes are reused for many tasks, and the pool may be shared by several
+    workflow contexts (in which case, the caller is responsible for calling
+    :py:meth:`shutdown`).
+
+    Arguments:
+        max_workers: number of worker processes (default: the number of CPUs).
+        preload: names of modules to import in each worker process.
+        mp_context: a :py:mod:`multiprocessing` context for the worker processes.
+    """
+    def __init__(self, max_workers: int = None, preload: typing.Iterable[str] = (), mp_context=None):
+        self.preload = tuple(preload)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers, mp_context=mp_context,
+                                                               initializer=_preload, initargs=(self.preload,))
+
+    def warm(self) -> typing.Set[int]:
+        """Start the worker processes (and import the preload modules) ahead of the first task.
+
+        Returns the process ids of the workers that responded.
+        """
+        futures = [self.executor.submit(_ready) for _ in range(self.max_workers)]
+        return set(future.result() for future in futures)
+
+    def submit(self, function: typing.Callable, args: tuple = (), kwargs: dict = None) -> concurrent.futures.Future:
+        """Call *function* in a worker process."""
+        return self.executor.submit(call, function, tuple(args), dict(kwargs or {}))
+
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait=wait)
+
+
+def function_call(function: typing.Callable, *args, context=None, **kwargs):
+    """Add a task to call *function* with the given arguments.
+
+    Arguments that are references to other tasks (such as the uid returned by
+    :py:func:`scalems.executable` or by another function_call) are replaced with
+    the referenced results.
+
+    Returns:
+        Reference to the new task. The task result is the function return value.
+    """
+    task = PyFunction(PyFunctionInput(function, args=args, kwargs=kwargs))
+    if context is None:
+        context = get_context()
+    return context.add_task(task)
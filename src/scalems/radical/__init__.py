@@ -45,11 +45,12 @@ import concurrent.futures
 import os
 import warnings
 import weakref
-from concurrent.futures import Future
-from types import TracebackType
-from typing import Any, Callable, Optional, Tuple
+from typing import Any, Callable, Sequence
 
 import scalems.context
+import scalems.subprocess
+from scalems.store import ResultStore
+from .config import PilotSelector, as_pilot_config, load_config
 
 
 class RPWorkflowContext(scalems.context.AbstractWorkflowContext):
@@ -66,39 +67,64 @@ class RPWorkflowContext(scalems.context.AbstractWorkflowContext):
     requirement groups).
     Further discussion is welcome.
 
+    If a *store* (a :py:class:`scalems.store.ResultStore` or a directory path) is
+    provided, tasks with a stored result are not submitted.
+
+    TODO: Record results in the store once result files are staged back from
+    the execution environment. (Until then, a stored RP result would lack the
+    output files that a local context expects to restore.)
+
+    Pilots are described by a sequence of *pilots* (PilotConfig instances or
+    mappings of PilotConfig fields) or by a JSON *config* file. By default, the
+    configuration file named by the SCALEMS_RP_CONFIG environment variable is
+    used, if set, and otherwise a single one-core pilot on ``local.localhost``.
+    See :py:mod:`scalems.radical.config`. Each task is assigned to the least
+    loaded pilot that satisfies its *resources* requirements.
+
+    Task descriptions are submitted to the UnitManager in batches of up to
+    *batch_size* units. A partial batch is submitted *flush_interval* seconds
+    after its first task is added, or when the workflow is run.
+
     TODO: Separate the WorkflowContext and its rp.Session management from the
           executor and its umgr management.
     """
-    def __init__(self):
+    def __init__(self, store=None, batch_size: int = 1024, flush_interval: float = 0.1,
+                 pilots: Sequence = None, config=None):
         import radical.pilot as rp
         self.rp = rp
         self.__rp_cfg = dict()
         if not 'RADICAL_PILOT_DBURL' in os.environ:
             raise RuntimeError('RADICAL Pilot environment is not available.')
 
-        resource = 'local.localhost'
+        if pilots is None:
+            pilots = load_config(config)
+        elif config is not None:
+            raise ValueError('Provide either *pilots* or *config*, but not both.')
+        self.pilots = [as_pilot_config(pilot) for pilot in pilots]
+        self.pilot_selector = PilotSelector(self.pilots)
+        # Pilot uids, in the order of self.pilots, once the pilots are submitted.
+        self.pilot_uids = []
         # TODO: Find default config?
-        resource_config = {resource: {}}
-        # TODO: Get from user or local config files.
-        resource_config[resource].update({
-            'project': None,
-            'queue': None,
-            'schema': None,
-            'cores': 1,
-            'gpus': 0
-        })
-        pilot_description = dict(resource=resource,
-                                 runtime=30,
-                                 exit_on_error=True,
-                                 project=resource_config[resource]['project'],
-                                 queue=resource_config[resource]['queue'],
-                                 cores=resource_config[resource]['cores'],
-                                 gpus=resource_config[resource]['gpus'])
+        resource_config = {}
+        for pilot in self.pilots:
+            resource_config.setdefault(pilot.resource, {}).update({
+                'project': pilot.project,
+                'queue': pilot.queue,
+                'schema': pilot.access_schema,
+                'cores': pilot.cores,
+                'gpus': pilot.gpus
+            })
+        pilot_description = self.pilots[0].description()
         self.resource_config = resource_config
         self.pilot_description = pilot_description
         self.session = None
         self._finalizer = None
         self.umgr = None
+        if store is not None and not isinstance(store, ResultStore):
+            store = ResultStore(store)
+        self.store = store
+        self.submission = SubmissionBatch(lambda descriptions: self.umgr.submit_units(descriptions),
+                                          batch_size=batch_size, flush_interval=flush_interval)
 
         # Basic Context implementation details
         self.task_map = dict()  # Map UIDs to task Futures.
@@ -121,17 +147,33 @@ class RPWorkflowContext(scalems.context.AbstractWorkflowContext):
         TODO: Dispatch task configuration according to registered implementations.
         TODO: Own a task instance and return a task view.
         TODO: Accept object types other than Subprocess (e.g. Data, PyFunc, or opaque dispatchable types).
+
+        An ensemble is submitted as its individual members.
+
+        Returns:
+            RPFuture for the task result (or a tuple of RPFutures for an ensemble).
         """
         from . import operations
         # TODO: more complete type hinting.
+        if isinstance(task_description, scalems.subprocess.SubprocessEnsemble):
+            # TODO: Submit ensemble members lazily.
+            futures = []
+            for member in task_description.members():
+                member_uid = member.uid()
+                futures.append(self.task_map[member_uid] if member_uid in self.task_map else self.add_task(member))
+            return tuple(futures)
         if not isinstance(task_description, scalems.subprocess.Subprocess):
             raise NotImplementedError('Operation not supported.')
         uid = task_description.uid()
         if uid in self.task_map:
-            # TODO: Consider decreasing error level to `warning`.
-            raise ValueError('Task already present in workflow.')
+            # The existing task represents the same work. See AbstractWorkflowContext.add_task
+            return self.task_map[uid]
 
-        task = operations.executable(self, task_description)
+        result = None if self.store is None else self.store.get(uid)
+        if result is not None:
+            task = operations.completed(result)
+        else:
+            task = operations.executable(self, task_description)
 
         self.task_map[uid] = task
         return task
@@ -151,9 +193,11 @@ class RPWorkflowContext(scalems.context.AbstractWorkflowContext):
         # if self.event_loop is None:
         #     raise RuntimeError('No event loop!')
         # loop = self.event_loop
-        return await asyncio.wait(self.task_map.values())
+        self.submission.flush()
+        return await asyncio.wait([asyncio.wrap_future(task) for task in self.task_map.values()])
 
     def shutdown(self):
+        self.submission.cancel()
         if self.active():
             self.session.close()
             assert self.session.closed
@@ -178,8 +222,10 @@ class RPWorkflowContext(scalems.context.AbstractWorkflowContext):
             context.session = context.rp.Session()
             pmgr = context.rp.PilotManager(session=context.session)
             context.umgr = context.rp.UnitManager(session=context.session)
-            pilot = pmgr.submit_pilots(context.rp.ComputePilotDescription(context.pilot_description))
-            context.umgr.add_pilots(pilot)
+            pilots = pmgr.submit_pilots([context.rp.ComputePilotDescription(pilot.description())
+                                         for pilot in context.pilots])
+            context.pilot_uids = [pilot.uid for pilot in pilots]
+            context.umgr.add_pilots(pilots)
             # Note: We should have an active session now, ready to receive tasks, but
             # no tasks have been submitted.
             return context
@@ -201,6 +247,61 @@ class RPWorkflowContext(scalems.context.AbstractWorkflowContext):
         return finalize(super().__exit__)
 
 
+class SubmissionBatch:
+    """Accumulate task descriptions for batched submission.
+
+    Each submission to the RP UnitManager is a round trip to the RP database, so
+    descriptions are collected and submitted as a list. A batch is submitted
+    when it reaches *batch_size* descriptions, when *flush_interval* seconds
+    have passed since its first description was added, or when *flush()* is
+    called.
+
+    *submit* is called with a list of descriptions and must return a sequence
+    of units of the same length.
+    """
+    def __init__(self, submit: Callable, batch_size: int = 1024, flush_interval: float = 0.1):
+        if batch_size < 1:
+            raise ValueError('Batch size must be a positive integer.')
+        self._submit = submit
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._descriptions = []
+        self._callbacks = []
+        self._timer = None
+
+    def __len__(self):
+        return len(self._descriptions)
+
+    def add(self, description, callback: Callable[[Any], Any]):
+        """Queue a task description.
+
+        *callback* is called with the unit once the description has been submitted.
+        """
+        self._descriptions.append(description)
+        self._callbacks.append(callback)
+        if len(self._descriptions) >= self.batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_event_loop().call_later(self.flush_interval, self.flush)
+
+    def cancel(self):
+        """Stop the flush timer, if any."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def flush(self):
+        """Submit the queued descriptions."""
+        self.cancel()
+        descriptions, self._descriptions = self._descriptions, []
+        callbacks, self._callbacks = self._callbacks, []
+        if not descriptions:
+            return
+        units = self._submit(descriptions)
+        for callback, unit in zip(callbacks, units):
+            callback(unit)
+
+
 class RPResult:
     """Basic result type for RADICAL Pilot tasks.
 
@@ -210,50 +311,72 @@ class RPResult:
 
 
 class RPFuture(concurrent.futures.Future):
-    """Future interface for RADICAL Pilot tasks."""
+    """Future interface for RADICAL Pilot tasks.
+
+    The Future is completed by :py:meth:`notify` from the RP unit state callback
+    when the unit reaches a final state, so waiting on the Future (e.g. with
+    *result()*) does not poll or block in the UnitManager. Done callbacks and
+    *timeout* arguments behave as for any :py:class:`concurrent.futures.Future`.
+
+    Cancelling the Future cancels the unit through its UnitManager, whether or
+    not the unit is already executing.
+
+    An RPFuture may be awaited from a coroutine.
+
+    The result is a :py:class:`scalems.subprocess.SubprocessResult`.
+    """
 
     def __init__(self, task) -> None:
         super().__init__()
         if not callable(task):
             raise ValueError('Provide a callable that produces the rp ComputeUnit.')
+        # Produces the unit, or None if the unit has not yet been submitted.
         self.task = task
 
-    def cancel(self) -> bool:
-        raise NotImplementedError()
+    def __await__(self):
+        return asyncio.wrap_future(self).__await__()
 
-    def cancelled(self) -> bool:
-        return super().cancelled()
+    def cancel(self) -> bool:
+        if self.done():
+            return self.cancelled()
+        unit = self.task()
+        if unit is not None:
+            import radical.pilot as rp
+            if unit.state not in rp.FINAL:
+                unit.umgr.cancel_units(uids=unit.uid)
+        # A unit that has not yet been submitted is cancelled when it is bound to the Future.
+        return super().cancel()
 
     def running(self) -> bool:
-        raise NotImplementedError()
-
-    def add_done_callback(self, fn: Callable[[Future], Any]) -> None:
-        # TODO: more complete type hinting.
-        raise NotImplementedError()
-
-    def result(self, timeout: Optional[float] = ...) -> RPResult:
-        if not self.done():
-            # Note that task.wait() seems not to work reliably.
-            # TODO: task.umgr.wait_units(uids=taskid)
-            # Warning: Waiting on all units will deadlock in non-trivial cases.
-            task = self.task()
-            task.umgr.wait_units(uids=task.uid, timeout=timeout)
-        return super().result()
-
-    def set_running_or_notify_cancel(self) -> bool:
-        raise NotImplementedError()
-
-    def exception(self, timeout: Optional[float] = ...) -> Optional[BaseException]:
-        raise NotImplementedError()
+        if self.done():
+            return False
+        unit = self.task()
+        if unit is None:
+            return False
+        import radical.pilot as rp
+        return unit.state == rp.AGENT_EXECUTING
 
-    def set_exception(self, exception: Optional[BaseException]) -> None:
-        super().set_exception(exception)
+    def notify(self, unit, state) -> None:
+        """Update the Future for a new unit state.
 
-    def exception_info(self, timeout: Optional[float] = ...) -> Tuple[Any, Optional[TracebackType]]:
-        return super().exception_info(timeout)
+        Called from an RP callback thread.
+        """
+        import radical.pilot as rp
+        if state not in rp.FINAL or self.done():
+            return
+        try:
+            if state == rp.CANCELED:
+                super().cancel()
+            elif unit.exit_code is None:
+                self.set_exception(RuntimeError('Unit {} failed: {}'.format(unit.uid, state)))
+            else:
+                self.set_result(scalems.subprocess.SubprocessResult(
+                    exitcode=unit.exit_code, stdout=None, stderr=None, file={}))
+        except Exception:
+            # The Future may have been cancelled concurrently.
+            if not self.done():
+                raise
 
-    def set_exception_info(self, exception: Any, traceback: Optional[TracebackType]) -> None:
-        super().set_exception_info(exception, traceback)
 
 #
 # class RPExecutor(concurrent.futures.Executor):
@@ -0,0 +1,122 @@
+"""Resource configuration for RADICAL Pilot workflow contexts.
+
+A workflow context may acquire one or more pilots. Each pilot is described by a
+PilotConfig. Pilot configurations can be provided directly to the
+RPWorkflowContext or read from a JSON configuration file, such as::
+
+    {
+        "pilots": [
+            {"resource": "xsede.comet", "cores": 256, "queue": "compute",
+             "project": "abc123", "runtime": 120},
+            {"resource": "xsede.comet", "cores": 48, "gpus": 4, "queue": "gpu",
+             "project": "abc123", "runtime": 120}
+        ]
+    }
+
+The configuration file may be named by the SCALEMS_RP_CONFIG environment variable.
+"""
+
+import json
+import os
+import typing
+from dataclasses import dataclass, fields
+
+# Environment variable naming the default configuration file.
+config_environment_variable = 'SCALEMS_RP_CONFIG'
+
+
+@dataclass
+class PilotConfig:
+    """Resource requirements for a pilot.
+
+    *runtime* is in minutes.
+    """
+    resource: str = 'local.localhost'
+    cores: int = 1
+    gpus: int = 0
+    runtime: int = 30
+    queue: typing.Optional[str] = None
+    project: typing.Optional[str] = None
+    access_schema: typing.Optional[str] = None
+
+    def description(self) -> dict:
+        """Get the keyword arguments for a radical.pilot.ComputePilotDescription."""
+        description = dict(resource=self.resource,
+                           runtime=self.runtime,
+                           exit_on_error=True,
+                           project=self.project,
+                           queue=self.queue,
+                           cores=self.cores,
+                           gpus=self.gpus)
+        if self.access_schema is not None:
+            description['access_schema'] = self.access_schema
+        return description
+
+
+def load_config(path=None) -> typing.List[PilotConfig]:
+    """Read pilot configurations from a JSON file.
+
+    If *path* is not provided, the file named by the SCALEMS_RP_CONFIG
+    environment variable is read. If no file is named, a single default
+    PilotConfig is returned.
+    """
+    if path is None:
+        path = os.environ.get(config_environment_variable, None)
+    if path is None:
+        return [PilotConfig()]
+    with open(path, 'r') as fh:
+        config = json.load(fh)
+    return [as_pilot_config(pilot) for pilot in config['pilots']]
+
+
+def as_pilot_config(pilot) -> PilotConfig:
+    """Get a PilotConfig from a PilotConfig or a mapping of PilotConfig fields."""
+    if isinstance(pilot, PilotConfig):
+        return pilot
+    names = set(field.name for field in fields(PilotConfig))
+    unknown = set(pilot) - names
+    if unknown:
+        raise ValueError('Unknown pilot configuration keys: {}'.format(', '.join(sorted(unknown))))
+    return PilotConfig(**pilot)
+
+
+def task_requirements(resources: typing.Mapping) -> typing.Tuple[int, int]:
+    """Get the (cores, gpus) required by a task with the given *resources*."""
+    cores = int(resources.get('procs_per_task', 1)) * int(resources.get('threads_per_proc', 1))
+    gpus = int(resources.get('gpus_per_task', 0))
+    return cores, gpus
+
+
+class PilotSelector:
+    """Assign tasks to pilots according to task resource requirements.
+
+    A task is assigned to the pilot that can accommodate it with the smallest
+    fraction of its cores committed to outstanding tasks. Tasks are only
+    assigned to pilots with enough cores and GPUs for a single task instance.
+    Among equally loaded pilots, tasks that do not need GPUs prefer pilots with
+    fewer GPUs.
+
+    Not thread-safe.
+    """
+    def __init__(self, pilots: typing.Sequence[PilotConfig]):
+        if len(pilots) < 1:
+            raise ValueError('At least one pilot is required.')
+        self.pilots = tuple(pilots)
+        self._committed = [0] * len(self.pilots)
+
+    def select(self, cores: int, gpus: int = 0) -> int:
+        """Reserve capacity for a task and return the index of the chosen pilot."""
+        candidates = [index for index, pilot in enumerate(self.pilots)
+                      if pilot.cores >= cores and pilot.gpus >= gpus]
+        if not candidates:
+            raise ValueError('No pilot provides {} cores and {} GPUs.'.format(cores, gpus))
+
+        def load(i):
+            return (self._committed[i] + cores) / self.pilots[i].cores, 0 if gpus else self.pilots[i].gpus
+        index = min(candidates, key=load)
+        self._committed[index] += cores
+        return index
+
+    def release(self, index: int, cores: int):
+        """Release the capacity reserved for a finished task."""
+        self._committed[index] -= cores
@@ -2,10 +2,12 @@
 Specialize implementations of ScaleMS operations.
 
 """
+import asyncio
 import weakref
 
 import scalems.subprocess
-from . import RPFuture, RPResult
+from . import RPFuture
+from .config import task_requirements
 
 
 def executable(context, task: scalems.subprocess.Subprocess):
@@ -13,10 +15,10 @@ def executable(context, task: scalems.subprocess.Subprocess):
 
     Provide the awaitable result for the Subprocess Future behavior.
 
-    TODO: Tie return value to SubprocessResult.
+    The returned RPFuture produces a SubprocessResult as soon as the unit reaches a
+    final state, as reported through the RP unit state callback.
+
     TODO: Manage the state of the Subprocess instance.
-    TODO: Finish implementing Future.
-    TODO: Move Future base to asyncio.Future.
     """
     if not isinstance(context, scalems.radical.RPWorkflowContext):
         raise ValueError('This resource factory is only valid for RADICAL Pilot workflow contexts.')
@@ -33,26 +35,47 @@ def executable(context, task: scalems.subprocess.Subprocess):
 
     # Construct the RP executable task description.
     # Ref: https://radicalpilot.readthedocs.io/en/stable/apidoc.html#radical.pilot.ComputeUnit
+    resources = task_input.resources
+    cores, gpus = task_requirements(resources)
+    pilot = context.pilot_selector.select(cores, gpus)
     task_description = {'executable': args[0],
-                        'cpu_processes': 1}
-    task = context.umgr.submit_units(context.rp.ComputeUnitDescription(task_description))
-    task_ref = weakref.ref(task)
+                        'arguments': [str(arg) for arg in args[1:]],
+                        'cpu_processes': int(resources.get('procs_per_task', 1)),
+                        'cpu_threads': int(resources.get('threads_per_proc', 1)),
+                        'gpu_processes': gpus,
+                        'pilot': context.pilot_uids[pilot]}
+    # The unit is created when the description is submitted with the next batch.
+    task_ref = None
     # TODO: The Context should be in charge of creating the Future.
-    future = RPFuture(task_ref)
+    future = RPFuture(lambda: None if task_ref is None else task_ref())
+    loop = asyncio.get_event_loop()
+
+    # Results are not recorded in context.store: the result files are not staged back
+    # from the execution environment, so the store entry would be incomplete.
+    # TODO: Stage result files back from the execution environment and record the result.
+    future.add_done_callback(
+        lambda completed: loop.call_soon_threadsafe(context.pilot_selector.release, pilot, cores))
 
     def cb(obj, state):
-        # Where is the state enumeration?
-        # TODO: assert state in [...]
-        if task_ref().exit_code is not None:
-            future.set_result(RPResult())
-
-    task.register_callback(cb)
-
-    async def coroutine():
-        # task.wait() just hangs. Using umgr.wait_units() instead...
-        # task.wait()
-        # TODO: Why does task.wait() not work?
-        # TODO: Can we at least wait on a specific task ID?
-        context.umgr.wait_units()
-        return future
-    return coroutine()
+        # Called in an RP thread.
+        future.notify(obj, state)
+
+    def bind(unit):
+        nonlocal task_ref
+        task_ref = weakref.ref(unit)
+        if future.cancelled():
+            unit.umgr.cancel_units(uids=unit.uid)
+            return
+        unit.register_callback(cb)
+        # The unit may have reached its final state before the callback was registered.
+        future.notify(unit, unit.state)
+
+    context.submission.add(context.rp.ComputeUnitDescription(task_description), bind)
+    return future
+
+
+def completed(result):
+    """Provide the Future for a task whose result is already available."""
+    future = RPFuture(lambda: None)
+    future.set_result(result)
+    return future
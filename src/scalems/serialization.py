@@ -0,0 +1,865 @@
+"""Serialization of the work graph.
+
+Read and write the ``scalems_workflow_1`` JSON document described in
+docs/serialization.rst::
+
+    {
+        "version": "scalems_workflow_1",
+        "types": {},
+        "referents": []
+    }
+
+Documents are processed as streams. A WorkflowWriter writes one referent at a
+time, and a WorkflowReader parses referents incrementally from a file, so that
+neither side holds the whole document in memory. Apart from the set of uids
+already encountered (needed to validate the topological order of the
+``referents`` sequence), memory use does not grow with the size of the graph.
+
+Member values follow the type dispatching rules of the specification: a string
+is a :token:`reference` and an array is raw data. Scalars (such as a single
+String or Mapping) are arrays of shape ``[1]``. Within raw data, the values of
+Mapping objects follow the same rules as member values, so that a Mapping value
+may be a reference to the output of another task (``{"-i": "aaaa....file.outfile"}``)
+or raw data (``{"-i": ["infile"]}``). Numbers, booleans and null are
+represented directly.
+
+A Subprocess task is written as two referents: the SubprocessInput record,
+followed by the Subprocess record that references it.
+
+The same work graph may also be written in a compact binary format
+(dump_binary()) with interned strings and field values and 32-byte uids. A
+BinaryWorkflow memory-maps the file and decodes only the nodes that are looked up.
+
+.. todo:: Resolve references to Mapping referents when deserializing SubprocessInput.
+"""
+
+import codecs
+import functools
+import hashlib
+import json
+import mmap
+import re
+import struct
+import typing
+from pathlib import PurePath
+
+import scalems.subprocess
+from .subprocess import parse_reference
+
+version = 'scalems_workflow_1'
+
+# Type descriptions for the built-in types written by WorkflowWriter.
+default_types = {
+    'scalems.SubprocessInput': {
+        'argv': {'type': ['scalems', 'String'], 'shape': ['constraints.OneOrMore']},
+        'inputs': {'type': ['scalems', 'Mapping'], 'shape': [1]},
+        'outputs': {'type': ['scalems', 'Mapping'], 'shape': [1]},
+        'stdin': {'type': ['scalems', 'File'], 'shape': [1]},
+        'environment': {'type': ['scalems', 'Mapping'], 'shape': [1]},
+        'resources': {'type': ['scalems', 'Mapping'], 'shape': [1]}
+    },
+    'scalems.SubprocessResult': {
+        'exitcode': {'type': ['scalems', 'Integer'], 'shape': [1]},
+        'stdout': {'type': ['scalems', 'File'], 'shape': [1]},
+        'stderr': {'type': ['scalems', 'File'], 'shape': [1]},
+        'file': {'type': ['scalems', 'Mapping'], 'shape': [1]}
+    },
+    'scalems.Subprocess': {
+        'input': {'type': ['scalems', 'SubprocessInput'], 'shape': [1]},
+        'result': {'type': ['scalems', 'SubprocessResult'], 'shape': [1]}
+    }
+}
+
+_input_type = ['scalems', 'SubprocessInput']
+_task_type = ['scalems', 'Subprocess']
+# Referent members that are not data.
+_reserved = ('uid', 'type', 'label')
+
+
+def encode_value(value):
+    """Encode a Python object as a member value."""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str) and parse_reference(value) is not None:
+        return value
+    return [_raw(value)]
+
+
+def _raw(value):
+    if isinstance(value, typing.Mapping):
+        return {str(key): encode_value(member) for key, member in value.items()}
+    if isinstance(value, (str, PurePath)):
+        return str(value)
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (typing.Sequence, typing.AbstractSet)) and not isinstance(value, (bytes, bytearray)):
+        return [_raw(element) for element in value]
+    raise TypeError('Cannot serialize object of type {}.'.format(type(value)))
+
+
+def decode_value(value):
+    """Decode a member value to a Python object.
+
+    References are returned as (unresolved) reference strings.
+    """
+    if isinstance(value, list):
+        if len(value) != 1:
+            raise ValueError('Expected an array of shape [1]. Got {}.'.format(repr(value)))
+        return _native(value[0])
+    return value
+
+
+def _native(raw):
+    if isinstance(raw, dict):
+        return {key: decode_value(member) for key, member in raw.items()}
+    if isinstance(raw, list):
+        return [_native(element) for element in raw]
+    return raw
+
+
+def references(referent: dict) -> typing.Iterator[str]:
+    """Get the uids referenced by the members of a referent record."""
+    for key, value in referent.items():
+        if key not in _reserved:
+            yield from _member_references(value)
+
+
+def _member_references(value):
+    if isinstance(value, str):
+        reference = parse_reference(value)
+        if reference is None:
+            raise ValueError('Member value {} is not a reference.'.format(repr(value)))
+        yield reference[0]
+    elif isinstance(value, list):
+        for element in value:
+            yield from _raw_references(element)
+
+
+def _raw_references(raw):
+    if isinstance(raw, dict):
+        for value in raw.values():
+            yield from _member_references(value)
+    elif isinstance(raw, list):
+        for element in raw:
+            yield from _raw_references(element)
+
+
+def input_record(task_input: scalems.subprocess.SubprocessInput) -> dict:
+    """Get the referent record for Subprocess input.
+
+    The uid of the record is the SHA-256 hash of its (canonically encoded) members.
+    """
+    record = {
+        'type': _input_type,
+        'argv': [_raw(arg) for arg in task_input.argv],
+        'inputs': encode_value(task_input.inputs),
+        'outputs': encode_value(task_input.outputs),
+        'stdin': encode_value(list(task_input.stdin)) if task_input.stdin else None,
+        'environment': encode_value(task_input.environment),
+        'resources': encode_value(task_input.resources)
+    }
+    encoded = json.dumps(record, sort_keys=True, separators=(',', ':'), ensure_ascii=True)
+    uid = hashlib.sha256(encoded.encode('ascii')).hexdigest()
+    return dict(uid=uid, **record)
+
+
+def task_records(task: scalems.subprocess.Subprocess) -> typing.Tuple[dict, dict]:
+    """Get the SubprocessInput and Subprocess referent records for a task."""
+    bound_input = input_record(task.input_collection())
+    # TODO: Serialize bound results.
+    record = {
+        'uid': task.uid(),
+        'type': _task_type,
+        'input': bound_input['uid'],
+        'result': None
+    }
+    return bound_input, record
+
+
+def subprocess_input(record: dict) -> scalems.subprocess.SubprocessInput:
+    """Get the SubprocessInput described by a referent record."""
+    if record.get('type') != _input_type:
+        raise ValueError('Not a SubprocessInput record: {}'.format(record.get('type')))
+    stdin = record.get('stdin', None)
+    return scalems.subprocess.SubprocessInput(
+        argv=[_native(arg) for arg in record['argv']],
+        inputs=decode_value(record.get('inputs', [{}])),
+        outputs=decode_value(record.get('outputs', [{}])),
+        stdin=() if stdin is None else decode_value(stdin),
+        environment=decode_value(record.get('environment', [{}])),
+        resources=decode_value(record.get('resources', [{}])))
+
+
+class MemberReferences:
+    """Expand ensembles into their members for writing, and rewrite references to ensemble members.
+
+    The serialized work graph has no ensemble nodes, so a subscripted reference to
+    an ensemble output (such as ``'{uid}.file.outfile[3]'``) is rewritten as a
+    reference to the output of the member task (``'{member_uid}.file.outfile'``).
+    The rewritten task has a new uid, so references to the tasks with rewritten
+    input are rewritten as well.
+
+    Tasks must be expanded in a topologically valid sequence.
+    """
+    def __init__(self):
+        # Map the uids of the expanded ensembles to the ensembles.
+        self._ensembles = dict()
+        # Map the original uids of the tasks with rewritten input to their new uids.
+        self._renamed = dict()
+
+    def expand(self, task) -> typing.Iterator[scalems.subprocess.Subprocess]:
+        """Generate the task, or its ensemble members, with rewritten references."""
+        if isinstance(task, scalems.subprocess.SubprocessEnsemble):
+            self._ensembles[task.uid()] = task
+            for member in task.members():
+                yield self._rewrite(member)
+        else:
+            yield self._rewrite(task)
+
+    def _reference(self, value):
+        reference = parse_reference(value)
+        if reference is None:
+            return value
+        uid, label = reference
+        if uid in self._ensembles:
+            unsubscripted, index = (None, None) if label is None else scalems.subprocess.split_subscript(label)
+            if index is None:
+                raise ValueError('Cannot serialize a reference to a whole ensemble: {}'.format(value))
+            uid, label = self._ensembles[uid].member(index).uid(), unsubscripted
+        elif uid in self._renamed:
+            uid = self._renamed[uid]
+        else:
+            return value
+        return uid if label is None else '{}.{}'.format(uid, label)
+
+    def _rewrite(self, task):
+        if not task.dependencies() or not (self._ensembles or self._renamed):
+            return task
+        task_input = task.input_collection()
+        inputs = {key: self._reference(value) for key, value in task_input.inputs.items()}
+        if inputs == dict(task_input.inputs):
+            return task
+        # Arguments that are input references are resolved to the same inputs.
+        replaced = {original: inputs[key] for key, original in task_input.inputs.items()}
+        argv = [replaced.get(arg, arg) if isinstance(arg, str) else arg for arg in task_input.argv]
+        rewritten = scalems.subprocess.Subprocess(scalems.subprocess.SubprocessInput(
+            argv=argv, inputs=inputs, outputs=task_input.outputs, stdin=task_input.stdin,
+            environment=task_input.environment, resources=task_input.resources))
+        self._renamed[task.uid()] = rewritten.uid()
+        return rewritten
+
+
+class WorkflowWriter:
+    """Write a workflow document, one referent at a time.
+
+    Referents must be written in a topologically valid sequence. If *validate*
+    is True (default), a ValueError is raised for a referent that references a
+    uid that has not yet been written.
+
+    The document is completed by close() (or on normal exit from a ``with`` block).
+
+    Example::
+
+        with open('workflow.json', 'w') as fh, WorkflowWriter(fh) as writer:
+            for task in tasks:
+                writer.write_task(task)
+
+    """
+    def __init__(self, fh: typing.TextIO, types: dict = None, validate: bool = True):
+        if types is None:
+            types = default_types
+        self._fh = fh
+        self._validate = validate
+        self._seen = set()
+        self._count = 0
+        self._closed = False
+        self._members = MemberReferences()
+        fh.write('{{"version": {}, "types": {}, "referents": ['.format(json.dumps(version), json.dumps(types)))
+
+    def __len__(self):
+        """Number of referents written."""
+        return self._count
+
+    def write(self, referent: dict):
+        """Append a referent record to the document."""
+        if self._closed:
+            raise RuntimeError('Workflow document is already closed.')
+        uid = referent['uid']
+        if self._validate:
+            _check_uid(uid)
+            key = bytes.fromhex(uid)
+            if key in self._seen:
+                raise ValueError('Duplicate referent {}.'.format(uid))
+            _check_references(referent, self._seen)
+            self._seen.add(key)
+        self._fh.write(',\n' if self._count else '\n')
+        self._fh.write(json.dumps(referent, separators=(',', ':')))
+        self._count += 1
+
+    def write_task(self, task: scalems.subprocess.Subprocess) -> int:
+        """Append the records for a Subprocess task.
+
+        Ensembles are written as their individual members. See :py:class:`MemberReferences`
+
+        Returns:
+            Number of tasks written.
+        """
+        count = 0
+        for member in self._members.expand(task):
+            bound_input, record = task_records(member)
+            self.write(bound_input)
+            self.write(record)
+            count += 1
+        return count
+
+    def close(self):
+        if not self._closed:
+            self._fh.write('\n]}\n')
+            self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # Leave the document incomplete (and invalid) if an error occurred.
+        if exc_type is None:
+            self.close()
+        return False
+
+
+def _check_uid(uid):
+    reference = parse_reference(uid)
+    if reference is None or reference[1] is not None:
+        raise ValueError('Invalid uid: {}'.format(repr(uid)))
+
+
+def _check_references(referent: dict, seen: set):
+    for uid in references(referent):
+        if bytes.fromhex(uid) not in seen:
+            raise ValueError('Referent {} references {} before its definition.'.format(referent['uid'], uid))
+
+
+_whitespace = re.compile(r'[ \t\n\r]*')
+
+
+class _Scanner:
+    """Incrementally decode JSON values from a file."""
+    def __init__(self, fh, chunk_size: int):
+        self._fh = fh
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        # Binary files are decoded incrementally, so that multi-byte characters may span reads.
+        self._unicode = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _read(self) -> bool:
+        if self._eof:
+            return False
+        while True:
+            raw = self._fh.read(self._chunk_size)
+            if not raw:
+                self._eof = True
+            chunk = self._unicode.decode(raw, final=self._eof) if isinstance(raw, bytes) else raw
+            # A read may end in the middle of a multi-byte character, which decodes to nothing yet.
+            if chunk or self._eof:
+                break
+        if not chunk:
+            return False
+        # Discard the consumed part of the buffer.
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and get the next character, or '' at the end of the file."""
+        while True:
+            self._pos = _whitespace.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read():
+                return ''
+
+    def expect(self, characters: str) -> str:
+        """Consume the next character, which must be one of *characters*."""
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError('Invalid workflow document: expected one of {} but found {}.'.format(
+                repr(characters), repr(character)))
+        self._pos += 1
+        return character
+
+    def value(self):
+        """Decode the next JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as e:
+                if self._read():
+                    continue
+                raise ValueError('Invalid workflow document: {}'.format(e)) from e
+            # A number may continue in the next chunk.
+            if end == len(self._buffer) and isinstance(value, (int, float)) and not isinstance(value, bool):
+                if self._read():
+                    continue
+            self._pos = end
+            return value
+
+
+class WorkflowReader:
+    """Iterate over the referents of a workflow document.
+
+    The file (opened in text or binary mode) is parsed incrementally. The
+    *version* and *types* members are available as attributes once iteration has
+    started. If *validate* is True (default), a ValueError is raised for a
+    referent that references a uid that has not yet occurred in the sequence.
+
+    The *version* member must precede the *referents* member.
+    """
+    def __init__(self, fh, validate: bool = True, chunk_size: int = 1 << 16):
+        self._fh = fh
+        self._validate = validate
+        self._chunk_size = chunk_size
+        self.version = None
+        self.types = {}
+
+    def __iter__(self) -> typing.Iterator[dict]:
+        scanner = _Scanner(self._fh, self._chunk_size)
+        seen = set()
+        scanner.expect('{')
+        if scanner.peek() == '}':
+            scanner.expect('}')
+            raise ValueError('Invalid workflow document: no version.')
+        while True:
+            key = scanner.value()
+            scanner.expect(':')
+            if key == 'referents':
+                if self.version != version:
+                    raise ValueError('Unsupported workflow document version: {}'.format(self.version))
+                scanner.expect('[')
+                if scanner.peek() == ']':
+                    scanner.expect(']')
+                else:
+                    while True:
+                        referent = scanner.value()
+                        if self._validate:
+                            self._check(referent, seen)
+                        yield referent
+                        if scanner.expect(',]') == ']':
+                            break
+            elif key == 'version':
+                self.version = scanner.value()
+            elif key == 'types':
+                self.types = scanner.value()
+            else:
+                # Ignore unknown members.
+                scanner.value()
+            if scanner.expect(',}') == '}':
+                break
+        if scanner.peek():
+            raise ValueError('Invalid workflow document: unexpected data after document.')
+
+    @staticmethod
+    def _check(referent, seen: set):
+        if not isinstance(referent, dict) or 'uid' not in referent or 'type' not in referent:
+            raise ValueError('Referents must be objects with "uid" and "type" members.')
+        uid = referent['uid']
+        _check_uid(uid)
+        key = bytes.fromhex(uid)
+        if key in seen:
+            raise ValueError('Duplicate referent {}.'.format(uid))
+        _check_references(referent, seen)
+        seen.add(key)
+
+    def tasks(self) -> typing.Iterator[scalems.subprocess.Subprocess]:
+        """Iterate over the Subprocess tasks in the document.
+
+        SubprocessInput records are held only until the referencing Subprocess
+        record is read.
+        """
+        inputs = {}
+        for referent in self:
+            if referent['type'] == _input_type:
+                inputs[referent['uid']] = referent
+            elif referent['type'] == _task_type:
+                task = scalems.subprocess.Subprocess.deserialize(referent, referents=inputs)
+                inputs.pop(referent['input'], None)
+                yield task
+            else:
+                raise ValueError('Unsupported referent type: {}'.format('.'.join(referent['type'])))
+
+
+def dump(tasks: typing.Iterable[scalems.subprocess.Subprocess], fh: typing.TextIO, types: dict = None) -> int:
+    """Write a workflow document for a sequence of Subprocess tasks.
+
+    Tasks must occur after the tasks that they reference, such as in the
+    insertion order of a workflow context *task_map*.
+
+    Returns:
+        Number of tasks written.
+    """
+    count = 0
+    with WorkflowWriter(fh, types=types) as writer:
+        for task in tasks:
+            count += writer.write_task(task)
+    return count
+
+
+def load(fh, context=None) -> list:
+    """Add the tasks from a workflow document to a workflow context.
+
+    If *context* is not provided, the current context is used.
+
+    Returns:
+        List of the task handles returned by ``context.add_task()``.
+    """
+    if context is None:
+        context = scalems.subprocess.get_context()
+    return [context.add_task(task) for task in WorkflowReader(fh).tasks()]
+
+
+# Binary work graph format.
+#
+# The binary format holds the same Subprocess work graph as the JSON document, in
+# a form that can be memory-mapped and searched without decoding the whole file.
+# All integers are little-endian.
+#
+#     header
+#     string offsets      (nstrings + 1) x uint64: absolute offsets into the string data
+#     string data         utf-8 encoded, concatenated
+#     structure offsets   (nstructures + 1) x uint64: absolute offsets into the structure data
+#     structure data      tagged encoding of argv, mappings, etc. (see _StructureEncoder)
+#     node table          nnodes fixed size node records, sorted by uid
+#     order table         nnodes x uint32: node table indices in topological (insertion) order
+#     adjacency offsets   (nnodes + 1) x uint64: start of the dependencies of each node (CSR)
+#     adjacency data      uint32 node table indices of the dependencies of each node
+#
+# The node table is the uid index. The adjacency index lists the tasks referenced
+# by the inputs of each node, so that a worker can locate the upstream nodes of its
+# assigned tasks without reading the rest of the graph.
+#
+# Identical strings and identical field values (such as the *environment* or
+# *resources* shared by all members of an ensemble) are stored once.
+
+_magic = b'SCALEMSB'
+_binary_version = 2
+# magic, format version, reserved, nnodes, nstrings, nstructures,
+# string offsets, structure offsets, node table, order table, adjacency offsets, adjacency data
+_header = struct.Struct('<8sIIQQQQQQQQQ')
+# uid, type (string id), argv, inputs, outputs, stdin, environment, resources (structure ids),
+# position in the order table
+_node = struct.Struct('<32sIIIIIIII')
+_offset = struct.Struct('<Q')
+_index = struct.Struct('<I')
+
+# Structure tags.
+_NONE, _FALSE, _TRUE, _INT, _FLOAT, _STRING, _LIST, _MAPPING = range(8)
+_tag = struct.Struct('<B')
+_tag_int = struct.Struct('<Bq')
+_tag_float = struct.Struct('<Bd')
+_tag_index = struct.Struct('<BI')
+
+_input_fields = ('argv', 'inputs', 'outputs', 'stdin', 'environment', 'resources')
+
+
+class _StructureEncoder:
+    """Intern strings and field values for the binary format."""
+    def __init__(self):
+        self.strings = {}
+        self.structures = {}
+
+    def string(self, value: str) -> int:
+        index = self.strings.get(value, None)
+        if index is None:
+            index = self.strings[value] = len(self.strings)
+        return index
+
+    def structure(self, value) -> int:
+        data = bytearray()
+        self._encode(value, data)
+        data = bytes(data)
+        index = self.structures.get(data, None)
+        if index is None:
+            index = self.structures[data] = len(self.structures)
+        return index
+
+    def _encode(self, value, data: bytearray):
+        if value is None:
+            data += _tag.pack(_NONE)
+        elif isinstance(value, bool):
+            data += _tag.pack(_TRUE if value else _FALSE)
+        elif isinstance(value, int):
+            data += _tag_int.pack(_INT, value)
+        elif isinstance(value, float):
+            data += _tag_float.pack(_FLOAT, value)
+        elif isinstance(value, (str, PurePath)):
+            data += _tag_index.pack(_STRING, self.string(str(value)))
+        elif isinstance(value, typing.Mapping):
+            data += _tag_index.pack(_MAPPING, len(value))
+            for key, member in value.items():
+                data += _index.pack(self.string(str(key)))
+                self._encode(member, data)
+        elif isinstance(value, (typing.Sequence, typing.AbstractSet)) and not isinstance(value, (bytes, bytearray)):
+            data += _tag_index.pack(_LIST, len(value))
+            for element in value:
+                self._encode(element, data)
+        else:
+            raise TypeError('Cannot serialize object of type {}.'.format(type(value)))
+
+
+def _members(tasks):
+    members = MemberReferences()
+    for task in tasks:
+        yield from members.expand(task)
+
+
+def dump_binary(tasks: typing.Iterable[scalems.subprocess.Subprocess], fh: typing.BinaryIO) -> int:
+    """Write Subprocess tasks in the binary work graph format.
+
+    Tasks must occur after the tasks that they reference (ValueError).
+    Ensembles are written as their individual members.
+    The (interned) tables are assembled in memory before the file is written.
+
+    Returns:
+        Number of tasks written.
+    """
+    encoder = _StructureEncoder()
+    task_type = encoder.string('.'.join(_task_type))
+    nodes = []
+    # Dependencies of each node, by insertion index.
+    adjacency = []
+    seen = dict()
+    for task in _members(tasks):
+        uid = bytes.fromhex(task.uid())
+        if uid in seen:
+            raise ValueError('Duplicate task {}.'.format(task.uid()))
+        dependencies = []
+        for dependency in task.dependencies():
+            if bytes.fromhex(dependency) not in seen:
+                raise ValueError('Task {} references {} before its definition.'.format(task.uid(), dependency))
+            dependencies.append(seen[bytes.fromhex(dependency)])
+        adjacency.append(dependencies)
+        task_input = task.input_collection()
+        fields = [encoder.structure(getattr(task_input, name)) for name in _input_fields]
+        nodes.append(_node.pack(uid, task_type, *fields, len(seen)))
+        seen[uid] = len(seen)
+    del seen
+    # Sort the node table by uid, remembering the insertion order.
+    order = sorted(range(len(nodes)), key=nodes.__getitem__)
+    position = [0] * len(nodes)
+    for sorted_index, node_index in enumerate(order):
+        position[node_index] = sorted_index
+
+    strings = [string.encode('utf-8') for string in encoder.strings]
+    structures = list(encoder.structures)
+    offset = _header.size
+
+    def table(blobs, start):
+        offsets = bytearray()
+        end = start + _offset.size * (len(blobs) + 1)
+        for blob in blobs:
+            offsets += _offset.pack(end)
+            end += len(blob)
+        offsets += _offset.pack(end)
+        return offsets, end
+
+    string_offsets, offset = table(strings, offset)
+    structures_start = offset
+    structure_offsets, offset = table(structures, offset)
+    padding = -offset % 8
+    nodes_start = offset + padding
+    order_start = nodes_start + _node.size * len(nodes)
+    order_end = order_start + _index.size * len(nodes)
+    adjacency_padding = -order_end % 8
+    adjacency_start = order_end + adjacency_padding
+    edges_start = adjacency_start + _offset.size * (len(nodes) + 1)
+
+    fh.write(_header.pack(_magic, _binary_version, 0, len(nodes), len(strings), len(structures),
+                          _header.size, structures_start, nodes_start, order_start, adjacency_start, edges_start))
+    fh.write(string_offsets)
+    for blob in strings:
+        fh.write(blob)
+    fh.write(structure_offsets)
+    for blob in structures:
+        fh.write(blob)
+    fh.write(bytes(padding))
+    for node_index in order:
+        fh.write(nodes[node_index])
+    for sorted_index in position:
+        fh.write(_index.pack(sorted_index))
+    fh.write(bytes(adjacency_padding))
+    edges = 0
+    for node_index in order:
+        fh.write(_offset.pack(edges))
+        edges += len(adjacency[node_index])
+    fh.write(_offset.pack(edges))
+    for node_index in order:
+        for dependency in adjacency[node_index]:
+            fh.write(_index.pack(position[dependency]))
+    return len(nodes)
+
+
+class BinaryWorkflow:
+    """Read-only view of a binary work graph file.
+
+    The file is memory-mapped. Nodes are located by binary search over the
+    uid-sorted node table, and only the fields of requested nodes are decoded,
+    so opening a large graph costs (nearly) nothing.
+
+    A worker can load just its assigned tasks, along with the upstream tasks
+    whose outputs they reference, with subgraph().
+
+    Example::
+
+        with BinaryWorkflow('workflow.bin') as workflow:
+            tasks = workflow.subgraph(assigned_uids)
+
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as fh:
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, format_version, _, self._nnodes, self._nstrings, self._nstructures,
+         self._strings, self._structures, self._nodes, self._order,
+         self._adjacency, self._edges) = _header.unpack_from(self._map, 0)
+        if magic != _magic:
+            self.close()
+            raise ValueError('{} is not a binary scalems work graph.'.format(path))
+        if format_version != _binary_version:
+            self.close()
+            raise ValueError('Unsupported binary work graph version: {}'.format(format_version))
+        self._string = functools.lru_cache(maxsize=1 << 16)(self._read_string)
+        self._structure = functools.lru_cache(maxsize=1 << 12)(self._read_structure)
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def __len__(self):
+        return self._nnodes
+
+    def __contains__(self, uid: str) -> bool:
+        return self.find(uid) is not None
+
+    def _uid(self, index: int) -> bytes:
+        start = self._nodes + index * _node.size
+        return self._map[start:start + 32]
+
+    def find(self, uid: str) -> typing.Optional[int]:
+        """Get the node table index for *uid*, or None if it is not in the graph."""
+        key = bytes.fromhex(uid)
+        low, high = 0, self._nnodes
+        while low < high:
+            middle = (low + high) // 2
+            if self._uid(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._nnodes and self._uid(low) == key:
+            return low
+        return None
+
+    def uids(self) -> typing.Iterator[str]:
+        """Iterate over the node uids in topological order."""
+        for position in range(self._nnodes):
+            yield self._uid(self._position(position)).hex()
+
+    def _position(self, position: int) -> int:
+        return _index.unpack_from(self._map, self._order + position * _index.size)[0]
+
+    def _read_string(self, index: int) -> str:
+        start, end = struct.unpack_from('<QQ', self._map, self._strings + index * _offset.size)
+        return self._map[start:end].decode('utf-8')
+
+    def _read_structure(self, index: int):
+        start, = _offset.unpack_from(self._map, self._structures + index * _offset.size)
+        value, _ = self._decode(start)
+        return value
+
+    def _decode(self, offset: int):
+        tag = self._map[offset]
+        if tag == _NONE:
+            return None, offset + 1
+        if tag in (_FALSE, _TRUE):
+            return tag == _TRUE, offset + 1
+        if tag == _INT:
+            return _tag_int.unpack_from(self._map, offset)[1], offset + _tag_int.size
+        if tag == _FLOAT:
+            return _tag_float.unpack_from(self._map, offset)[1], offset + _tag_float.size
+        _, count = _tag_index.unpack_from(self._map, offset)
+        offset += _tag_index.size
+        if tag == _STRING:
+            return self._string(count), offset
+        if tag == _LIST:
+            value = []
+            for _ in range(count):
+                element, offset = self._decode(offset)
+                value.append(element)
+            return value, offset
+        if tag == _MAPPING:
+            value = {}
+            for _ in range(count):
+                key = self._string(_index.unpack_from(self._map, offset)[0])
+                value[key], offset = self._decode(offset + _index.size)
+            return value, offset
+        raise ValueError('Invalid structure tag {} at offset {}.'.format(tag, offset))
+
+    def _task(self, index: int) -> scalems.subprocess.Subprocess:
+        uid, task_type, *fields = _node.unpack_from(self._map, self._nodes + index * _node.size)[:-1]
+        if self._string(task_type) != '.'.join(_task_type):
+            raise ValueError('Unsupported node type: {}'.format(self._string(task_type)))
+        values = {name: self._structure(field) for name, field in zip(_input_fields, fields)}
+        task = scalems.subprocess.Subprocess(scalems.subprocess.SubprocessInput(**values))
+        task._uid = uid.hex()
+        return task
+
+    def task(self, uid: str) -> scalems.subprocess.Subprocess:
+        """Get the task with the given *uid* (KeyError if not present)."""
+        index = self.find(uid)
+        if index is None:
+            raise KeyError('No task {} in work graph.'.format(uid))
+        return self._task(index)
+
+    def tasks(self) -> typing.Iterator[scalems.subprocess.Subprocess]:
+        """Iterate over the tasks in topological order."""
+        for position in range(self._nnodes):
+            yield self._task(self._position(position))
+
+    def _dependencies(self, index: int) -> typing.List[int]:
+        start, end = struct.unpack_from('<QQ', self._map, self._adjacency + index * _offset.size)
+        return [_index.unpack_from(self._map, self._edges + edge * _index.size)[0] for edge in range(start, end)]
+
+    def _rank(self, index: int) -> int:
+        return _index.unpack_from(self._map, self._nodes + (index + 1) * _node.size - _index.size)[0]
+
+    def dependencies(self, uid: str) -> typing.Tuple[str, ...]:
+        """Get the uids of the tasks referenced by the inputs of task *uid*, without decoding the task."""
+        index = self.find(uid)
+        if index is None:
+            raise KeyError('No task {} in work graph.'.format(uid))
+        return tuple(self._uid(dependency).hex() for dependency in self._dependencies(index))
+
+    def subgraph(self, uids: typing.Iterable[str]) -> typing.Dict[str, scalems.subprocess.Subprocess]:
+        """Load the tasks *uids* and the tasks that they directly reference.
+
+        Upstream tasks are included so that a worker can identify the outputs of
+        tasks that it is not responsible for executing. Other nodes are not read.
+
+        Returns:
+            Map of uids to tasks, in topological order.
+        """
+        indices = set()
+        for uid in uids:
+            index = self.find(uid)
+            if index is None:
+                raise KeyError('No task {} in work graph.'.format(uid))
+            indices.add(index)
+            indices.update(self._dependencies(index))
+        return {self._uid(index).hex(): self._task(index) for index in sorted(indices, key=self._rank)}
@@ -0,0 +1,184 @@
+"""Local persistent storage of task results.
+
+Completed work is recorded in a directory keyed by task uid, so that a
+workflow context can skip tasks whose results are already final (such as when
+a workflow is run again after an interruption).
+
+Each entry is a subdirectory holding a JSON record of the task result, along
+with copies (or hard links, where possible) of the result files::
+
+    <store>/<uid>/result.json
+    <store>/<uid>/files/<name>
+
+Files are copied by default. Hard links avoid the copies, but then a result
+file that is later modified in place also modifies the stored result.
+
+The store may be limited in total size and/or number of entries. When a limit
+is exceeded, the least recently used entries are removed.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import typing
+from pathlib import Path
+
+from .subprocess import SubprocessResult
+
+_RECORD = 'result.json'
+_FILES = 'files'
+
+
+def _link_or_copy(source, destination, hardlink=True):
+    if hardlink:
+        try:
+            os.link(source, destination)
+            return
+        except OSError:
+            pass
+    shutil.copy2(source, destination)
+
+
+def _entry_size(path: Path) -> int:
+    size = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            size += os.stat(os.path.join(root, name)).st_size
+    return size
+
+
+class ResultStore:
+    """Directory of results of completed tasks, keyed by task uid.
+
+    Only successful results (exit code 0) are stored.
+
+    Arguments:
+        path: store directory (created if necessary).
+        max_bytes: evict entries when the total size of stored files exceeds this many bytes.
+        max_entries: evict entries when there are more than this many results.
+        hardlink: store and restore files as hard links, where possible.
+
+    The usage index is kept in memory. If several processes share a store
+    directory, eviction in one process is not reflected in the limits applied by
+    another.
+    """
+    def __init__(self, path, max_bytes: int = None, max_entries: int = None, hardlink: bool = False):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hardlink = hardlink
+        # Map uids to (last use timestamp, size in bytes).
+        self._index = None
+
+    def _entry(self, uid: str) -> Path:
+        return self.path / uid
+
+    def _usage(self) -> dict:
+        if self._index is None:
+            self._index = {}
+            for entry in self.path.iterdir():
+                record = entry / _RECORD
+                if record.exists():
+                    self._index[entry.name] = (record.stat().st_mtime, _entry_size(entry))
+        return self._index
+
+    def __contains__(self, uid: str) -> bool:
+        return (self._entry(uid) / _RECORD).exists()
+
+    def __len__(self) -> int:
+        return len(self._usage())
+
+    @property
+    def size(self) -> int:
+        """Total size in bytes of the stored entries."""
+        return sum(size for _, size in self._usage().values())
+
+    def get(self, uid: str) -> typing.Optional[SubprocessResult]:
+        """Retrieve a stored result, or None if *uid* has no stored result.
+
+        Result files are restored to their original locations if they are missing.
+        """
+        entry = self._entry(uid)
+        try:
+            with open(entry / _RECORD, 'r') as fh:
+                record = json.load(fh)
+        except FileNotFoundError:
+            return None
+        paths = {}
+        for key, (name, destination) in record['files'].items():
+            destination = Path(destination)
+            if not destination.exists():
+                if destination.parent != Path(''):
+                    destination.parent.mkdir(parents=True, exist_ok=True)
+                _link_or_copy(entry / _FILES / name, destination, hardlink=self.hardlink)
+            paths[key] = destination
+        # Mark the entry as recently used.
+        now = time.time()
+        os.utime(entry / _RECORD, (now, now))
+        usage = self._usage()
+        if uid in usage:
+            usage[uid] = (now, usage[uid][1])
+        return SubprocessResult(exitcode=record['exitcode'],
+                                stdout=paths.get('stdout', None),
+                                stderr=paths.get('stderr', None),
+                                file={label[len('file.'):]: path for label, path in paths.items()
+                                      if label.startswith('file.')})
+
+    def put(self, uid: str, result: SubprocessResult) -> bool:
+        """Store a result.
+
+        Returns True if the result was stored. Results with a nonzero exit code
+        or with missing result files are not stored.
+        """
+        if result.exitcode != 0 or uid in self:
+            return False
+        sources = {'file.' + label: path for label, path in result.file.items()}
+        for key in ('stdout', 'stderr'):
+            if getattr(result, key, None) is not None:
+                sources[key] = getattr(result, key)
+        # Assemble the entry in a temporary directory, then move it into place.
+        staging = Path(tempfile.mkdtemp(prefix='.' + uid, dir=self.path))
+        try:
+            (staging / _FILES).mkdir()
+            files = {}
+            for index, (key, source) in enumerate(sorted(sources.items())):
+                name = str(index)
+                try:
+                    _link_or_copy(source, staging / _FILES / name, hardlink=self.hardlink)
+                except FileNotFoundError:
+                    return False
+                files[key] = (name, str(source))
+            with open(staging / _RECORD, 'w') as fh:
+                json.dump({'uid': uid, 'exitcode': result.exitcode, 'files': files}, fh)
+            size = _entry_size(staging)
+            try:
+                os.rename(staging, self._entry(uid))
+            except OSError:
+                # Another writer stored the same result first.
+                return False
+        finally:
+            if staging.exists():
+                shutil.rmtree(staging)
+        self._usage()[uid] = (time.time(), size)
+        self.evict()
+        return True
+
+    def remove(self, uid: str):
+        """Remove a stored result."""
+        shutil.rmtree(self._entry(uid), ignore_errors=True)
+        self._usage().pop(uid, None)
+
+    def evict(self):
+        """Remove least recently used entries until the store is within its limits."""
+        usage = self._usage()
+        total = sum(size for _, size in usage.values())
+        for uid in sorted(usage, key=lambda key: usage[key][0]):
+            over_size = self.max_bytes is not None and total > self.max_bytes
+            over_count = self.max_entries is not None and len(usage) > self.max_entries
+            if not (over_size or over_count):
+                break
+            total -= usage[uid][1]
+            self.remove(uid)
@@ -4,43 +4,278 @@ scalems.subprocess() is used to execute a program in one (or more) subprocesses.
 It is an alternative to the built-in Python subprocess.Popen or asyncio.create_subprocess_exec
 with extensions to better support ScaleMS execution dispatching and ensemble data flow.
 
-In the first iteration, we can use dataclasses.dataclass to define input/output data structures
-in terms of standard types. In a follow-up, we can use a scalems metaclass to define them
-in terms of Data Descriptors that support mixed scalems.Future and native constant data types.
+Input and result records are immutable and are defined in terms of standard types.
+In a follow-up, we can use a scalems metaclass to define them in terms of Data Descriptors that support mixed scalems.Future and native constant data types.
 """
 
+import collections.abc
+import functools
+import hashlib
+import json
+import os
+import re
+import sys
 import typing
-from dataclasses import dataclass, field
-from pathlib import Path # We probably need a scalems abstraction for Path.
+import weakref
+from pathlib import Path, PurePath # We probably need a scalems abstraction for Path.
 
 from .context import get_context
 
 # TODO: what is the mechanism for registering a command implementation in a new Context?
 # TODO: What is the relationship between the command factory and the command type? Which parts need to be importable?
 
-@dataclass
+
+def _freeze(value):
+    """Get an immutable (and, where possible, shared) equivalent of *value*.
+
+    Mappings become FrozenMapping and other non-string sequences become tuples.
+    Strings are interned. Binary data (bytes or bytearray) becomes bytes.
+    """
+    if value is None or isinstance(value, (bool, int, float, bytes, PurePath, FrozenMapping, frozenset)):
+        return value
+    if isinstance(value, str):
+        return sys.intern(str(value))
+    if isinstance(value, bytearray):
+        return bytes(value)
+    if isinstance(value, collections.abc.Mapping):
+        return FrozenMapping(value)
+    if isinstance(value, collections.abc.Sequence):
+        return tuple(_freeze(element) for element in value)
+    if isinstance(value, collections.abc.Set):
+        return frozenset(_freeze(element) for element in value)
+    return value
+
+
+def _intern_key(value):
+    """Get a key for interning frozen *value* that distinguishes values of different types.
+
+    Frozen values compare equal across types (e.g. ``True == 1 == 1.0``), but must
+    not share an interned instance, so each element is tagged with its type.
+    """
+    if isinstance(value, FrozenMapping):
+        return FrozenMapping, tuple((_intern_key(key), _intern_key(item)) for key, item in value._items)
+    if isinstance(value, Column):
+        return Column, _intern_key(value.values)
+    if isinstance(value, tuple):
+        return tuple, tuple(_intern_key(element) for element in value)
+    if isinstance(value, frozenset):
+        return frozenset, frozenset(_intern_key(element) for element in value)
+    return type(value), value
+
+
+class FrozenMapping(collections.abc.Mapping):
+    """Immutable, hashable Mapping backed by a tuple of (key, value) pairs.
+
+    Values are frozen recursively. Equal mappings constructed while an existing
+    instance is alive share the existing instance, so that the members of an
+    ensemble with identical *environment* or *resources* share storage.
+
+    Lookup is a linear search, which is appropriate for the small mappings in
+    task input.
+    """
+    __slots__ = ('_items', '_hash', '__weakref__')
+    _interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, mapping=()):
+        if type(mapping) is cls:
+            return mapping
+        items = tuple((_freeze(key), _freeze(value)) for key, value in dict(mapping).items())
+        try:
+            key = _intern_key(items)
+            instance = cls._interned.get(key, None)
+            hashable = True
+        except TypeError:
+            # Unhashable values are not interned.
+            instance, hashable = None, False
+        if instance is None:
+            instance = object.__new__(cls)
+            object.__setattr__(instance, '_items', items)
+            object.__setattr__(instance, '_hash', None)
+            if hashable:
+                cls._interned[key] = instance
+        return instance
+
+    def __setattr__(self, key, value):
+        raise AttributeError('{} is immutable.'.format(self.__class__.__name__))
+
+    def __getitem__(self, key):
+        for item, value in self._items:
+            if item == key:
+                return value
+        raise KeyError(key)
+
+    def __iter__(self):
+        return (key for key, _ in self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        return super().__eq__(other)
+
+    def __hash__(self):
+        if self._hash is None:
+            object.__setattr__(self, '_hash', hash(frozenset(self._items)))
+        return self._hash
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__, repr(dict(self._items)))
+
+    def __reduce__(self):
+        return self.__class__, (dict(self._items),)
+
+
+class Column:
+    """Per-member values of an ensemble input.
+
+    A Column may be used in place of an element of *argv* or of a value in the
+    *inputs*, *outputs*, *environment* or *resources* mappings of a Subprocess.
+    The input for ensemble member *i* uses the *i*-th value of each Column.
+
+    Example::
+
+        scalems.executable(('gmx', 'mdrun', '-seed', Column(seeds)), ...)
+
+    """
+    __slots__ = ('values', '_hash')
+
+    def __init__(self, values: typing.Iterable):
+        object.__setattr__(self, 'values', tuple(_freeze(value) for value in values))
+        object.__setattr__(self, '_hash', None)
+
+    def __setattr__(self, key, value):
+        raise AttributeError('{} is immutable.'.format(self.__class__.__name__))
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __eq__(self, other):
+        if not isinstance(other, Column):
+            return NotImplemented
+        return self.values == other.values
+
+    def __hash__(self):
+        if self._hash is None:
+            object.__setattr__(self, '_hash', hash(self.values))
+        return self._hash
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__, repr(self.values))
+
+    def __reduce__(self):
+        return self.__class__, (self.values,)
+
+
 class SubprocessInput:
+    """Immutable input for a Subprocess.
+
+    Field values are frozen on construction (see FrozenMapping). Constructing
+    input equal to an existing (live) SubprocessInput returns the existing
+    instance, and the static part of its fingerprint is computed once.
+    """
     # TODO: Move input documentation to Input class docs.
-    argv: typing.Sequence[str]
-    inputs: typing.Mapping[str, Path] = field(default_factory=dict)
-    outputs: typing.Mapping[str, Path] = field(default_factory=dict)
-    stdin: typing.Iterable[str] = ()
-    environment: typing.Mapping[str, typing.Union[str, None]] = field(default_factory=dict)
+    # argv: typing.Sequence[str]
+    # inputs: typing.Mapping[str, Path]
+    # outputs: typing.Mapping[str, Path]
+    # stdin: typing.Iterable[str]
+    # environment: typing.Mapping[str, typing.Union[str, None]]
     # For now, let's just always enable stdout/stderr
     # stdout: Optional[Path]
     # stderr: Optional[Path]
-    resources: typing.Mapping[str, typing.Any] = field(default_factory=dict)
+    # resources: typing.Mapping[str, typing.Any]
+    __slots__ = ('argv', 'inputs', 'outputs', 'stdin', 'environment', 'resources', '_digest', '__weakref__')
+    _fields = ('argv', 'inputs', 'outputs', 'stdin', 'environment', 'resources')
+    _interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, argv: typing.Sequence[str], inputs: typing.Mapping[str, Path] = None,
+                outputs: typing.Mapping[str, Path] = None, stdin: typing.Iterable[str] = (),
+                environment: typing.Mapping[str, typing.Union[str, None]] = None,
+                resources: typing.Mapping[str, typing.Any] = None):
+        if isinstance(argv, str):
+            raise ValueError('argv must be a sequence of arguments, not a string.')
+        values = (tuple(_freeze(arg) for arg in argv),
+                  FrozenMapping(inputs or ()),
+                  FrozenMapping(outputs or ()),
+                  tuple(_freeze(line) for line in stdin),
+                  FrozenMapping(environment or ()),
+                  FrozenMapping(resources or ()))
+        try:
+            key = _intern_key(values)
+            instance = cls._interned.get(key, None)
+            hashable = True
+        except TypeError:
+            instance, hashable = None, False
+        if instance is None:
+            instance = object.__new__(cls)
+            for name, value in zip(cls._fields, values):
+                object.__setattr__(instance, name, value)
+            object.__setattr__(instance, '_digest', None)
+            if hashable:
+                cls._interned[key] = instance
+        return instance
+
+    def _values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self._fields)
+
+    def __setattr__(self, key, value):
+        raise AttributeError('{} is immutable.'.format(self.__class__.__name__))
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, SubprocessInput):
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __hash__(self):
+        return hash(self._values())
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__,
+                               ', '.join('{}={}'.format(name, repr(getattr(self, name))) for name in self._fields))
+
+    def __reduce__(self):
+        return self.__class__, self._values()
 
 
-@dataclass
 class SubprocessResult:
+    """Immutable result of a Subprocess."""
     # file: Field(Path)
     # exitcode: Field(int)
     # TODO: Can we use None instead of os.devnull to indicate non-presence of stdout/stderr?
-    exitcode: int
-    stdout: Path
-    stderr: Path
-    file: typing.Mapping[str, Path]
+    __slots__ = ('exitcode', 'stdout', 'stderr', 'file')
+
+    def __init__(self, exitcode: int, stdout: Path, stderr: Path, file: typing.Mapping[str, Path]):
+        object.__setattr__(self, 'exitcode', exitcode)
+        object.__setattr__(self, 'stdout', stdout)
+        object.__setattr__(self, 'stderr', stderr)
+        object.__setattr__(self, 'file', FrozenMapping(file))
+
+    def __setattr__(self, key, value):
+        raise AttributeError('{} is immutable.'.format(self.__class__.__name__))
+
+    def __eq__(self, other):
+        if not isinstance(other, SubprocessResult):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __hash__(self):
+        return hash(tuple(getattr(self, name) for name in self.__slots__))
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__,
+                               ', '.join('{}={}'.format(name, repr(getattr(self, name))) for name in self.__slots__))
+
+    def __reduce__(self):
+        return self.__class__, (self.exitcode, self.stdout, self.stderr, dict(self.file))
 
 
 class SubprocessResourceType:
@@ -54,7 +289,176 @@ class SubprocessResourceType:
         return '.'.join(cls.as_strings())
 
 
+# Reference grammar from docs/serialization.rst: uid ["." nestedlabel]
+_label = r'[-_a-zA-Z0-9]+(?:\[[0-9]+\])?'
+_reference = re.compile(r'(?P<uid>[0-9a-fA-F]{{64}})(?:\.(?P<label>{label}(?:\.{label})*))?'.format(label=_label))
+
+
+def parse_reference(value) -> typing.Optional[typing.Tuple[str, typing.Optional[str]]]:
+    """Split a reference string into its *uid* and *nestedlabel* parts.
+
+    Returns None if *value* is not a reference.
+    """
+    if not isinstance(value, str):
+        return None
+    match = _reference.fullmatch(value)
+    if match is None:
+        return None
+    return match.group('uid').lower(), match.group('label')
+
+
+_subscript = re.compile(r'\[([0-9]+)\]')
+
+
+def split_subscript(label: str) -> typing.Tuple[str, typing.Optional[int]]:
+    """Remove the subscript from a nested label.
+
+    Returns the label without its subscript, and the subscript index (or None).
+    For example, ``'file.outfile[3]'`` becomes ``('file.outfile', 3)``.
+    """
+    matches = list(_subscript.finditer(label))
+    if not matches:
+        return label, None
+    if len(matches) > 1:
+        raise ValueError('Nested subscripts are not supported: {}'.format(label))
+    match = matches[0]
+    return label[:match.start()] + label[match.end():], int(match.group(1))
+
+
+def resolve_reference(result: 'SubprocessResult', label: str):
+    """Get the named member of a Subprocess result.
+
+    *label* may name an output file (``outfile`` or ``file.outfile``) or another
+    result field (such as ``exitcode``).
+
+    For the result of an ensemble (a tuple of member results), the named member
+    of each member result is returned as a tuple.
+    """
+    if label is None:
+        return result
+    if isinstance(result, tuple):
+        return tuple(resolve_reference(member, label) for member in result)
+    key, _, nested = label.partition('.')
+    if key == 'file' and nested:
+        return result.file[nested]
+    if key in ('exitcode', 'stdout', 'stderr') and not nested:
+        return getattr(result, key)
+    if key in result.file and not nested:
+        return result.file[key]
+    raise KeyError('Cannot resolve {} in Subprocess result.'.format(label))
+
+
+def _canonical(obj):
+    """Normalize input data to a JSON-compatible structure for fingerprinting.
+
+    Mappings become JSON objects (with keys sorted at encoding time) and all other
+    non-string sequences become arrays, so that equivalent inputs expressed with
+    different container types (e.g. tuple versus list) produce the same record.
+    """
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    if isinstance(obj, PurePath):
+        return str(obj)
+    if isinstance(obj, (bytes, bytearray)):
+        # Binary data is not a sequence of integers.
+        return {'bytes': obj.hex()}
+    if isinstance(obj, Column):
+        return {'column': [_canonical(value) for value in obj]}
+    if isinstance(obj, typing.Mapping):
+        return {str(key): _canonical(value) for key, value in obj.items()}
+    if isinstance(obj, (typing.Sequence, typing.AbstractSet)):
+        # Sets have no intrinsic order, so sort the normalized members.
+        members = [_canonical(value) for value in obj]
+        if not isinstance(obj, typing.Sequence):
+            members.sort(key=_encode)
+        return members
+    raise TypeError('Cannot fingerprint object of type {}.'.format(type(obj)))
+
+
+def _encode(record) -> str:
+    """Get the canonical serialization of a normalized record."""
+    return json.dumps(record, sort_keys=True, separators=(',', ':'), ensure_ascii=True)
+
+
+@functools.lru_cache(maxsize=4096)
+def _file_digest(path: str, size: int, mtime_ns: int, inode: int) -> str:
+    """Get the SHA-256 digest of the contents of a file.
+
+    File metadata is part of the cache key, so modified files are hashed again.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(functools.partial(fh.read, 1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_digest(path) -> typing.Optional[str]:
+    """Get the content hash of a local file, if it exists.
+
+    Returns None if *path* does not name an existing regular file (such as when
+    the file will be produced by another task).
+    """
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError, ValueError):
+        return None
+    if not os.path.isfile(path):
+        return None
+    return _file_digest(os.path.abspath(path), stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+def fingerprint(task_input: SubprocessInput) -> str:
+    """Generate a content-addressed identifier for Subprocess input.
+
+    The fingerprint is the SHA-256 hash (as 64 hexadecimal digits) of the
+    hash of the canonically encoded input fields, plus the content hashes of
+    existing input files. Identical work gets the same fingerprint in any process.
+
+    Literal input paths that do not (yet) exist are fingerprinted by path only,
+    so the fingerprint changes once the file exists. Files produced by other
+    tasks should be bound by :token:`reference` (e.g. ``'{uid}.outfile'``),
+    which is fingerprinted by the referenced uid, so that the task has the same
+    fingerprint when the workflow is run again (and its result can be found in a
+    :py:class:`scalems.store.ResultStore`).
+    """
+    # The hash of the (immutable) input fields is computed once per SubprocessInput.
+    digest = task_input._digest
+    if digest is None:
+        record = {
+            'type': list(SubprocessResourceType.as_strings()),
+            'argv': _canonical(task_input.argv),
+            'inputs': _canonical(task_input.inputs),
+            'outputs': _canonical(task_input.outputs),
+            'stdin': _canonical(task_input.stdin),
+            'environment': _canonical(task_input.environment),
+            'resources': _canonical(task_input.resources)
+        }
+        digest = hashlib.sha256(_encode(record).encode('ascii')).hexdigest()
+        object.__setattr__(task_input, '_digest', digest)
+    # Input files may change, so their content hashes are checked each time.
+    record = {
+        'input': digest,
+        # References are fingerprinted by the referenced uid, instead.
+        'files': {str(label): None if parse_reference(path) else file_digest(path)
+                  for label, path in task_input.inputs.items()}
+    }
+    return hashlib.sha256(_encode(record).encode('ascii')).hexdigest()
+
+
+def _dependencies(values: typing.Iterable) -> typing.Tuple[str, ...]:
+    dependencies = []
+    for value in values:
+        for element in (value if isinstance(value, Column) else (value,)):
+            reference = parse_reference(element)
+            if reference is not None and reference[0] not in dependencies:
+                dependencies.append(reference[0])
+    return tuple(dependencies)
+
+
 class Subprocess:
+    __slots__ = ('_bound_input', '_result', '_uid')
+
     @classmethod
     def type(self):
         return SubprocessResourceType
@@ -70,6 +474,7 @@ class Subprocess:
     def __init__(self, input: SubprocessInput):
         self._bound_input = input
         self._result = None
+        self._uid = None
 
     def input_collection(self):
         return self._bound_input
@@ -77,11 +482,22 @@ class Subprocess:
     def result(self):
         return self._result
 
-    def dependencies(self):
-        ...
+    def dependencies(self) -> typing.Tuple[str, ...]:
+        """Get the uids of the tasks whose results are referenced by the task inputs.
+
+        Input values may be :token:`reference` strings to the outputs of another
+        task in the same workflow, such as ``'{uid}.outfile'``.
+        """
+        return _dependencies(self._bound_input.inputs.values())
 
     def uid(self):
-        return '0'*64
+        """Get the fingerprint of the task.
+
+        The fingerprint is computed once, when first requested.
+        """
+        if self._uid is None:
+            self._uid = fingerprint(self._bound_input)
+        return self._uid
 
     def serialize(self) -> str:
         """Encode the task as a JSON record.
@@ -89,26 +505,44 @@ class Subprocess:
         Input and Result will be serialized as references.
         The caller is responsible for serializing existing records
         for bound objects, if they exist.
+
+        See :py:mod:`scalems.serialization` for the SubprocessInput record and
+        for writing complete workflow documents.
         """
-        record = {}
-        record['uid'] = self.uid()
+        from .serialization import task_records
         # "label" not yet supported.
-        record['input'] = self._bound_input # reference
-        record['result'] = self._result # reference
-        raise NotImplementedError('To do...')
+        _, record = task_records(self)
+        return json.dumps(record, separators=(',', ':'))
 
     @classmethod
-    def deserialize(cls, record: str, context = None):
+    def deserialize(cls, record: typing.Union[str, dict], context=None, referents: typing.Mapping = None):
         """Instantiate a Subprocess Task from a serialized record.
 
         In general, records should only be deserialized into a WorkflowContext
         that manages a valid work graph, but for early testing, at least,
         we have some standalone use cases.
-        """
 
+        *referents* maps uids to decoded records, and must contain the
+        SubprocessInput record referenced by *record*.
+
+        The task keeps the uid from the record, which identifies the same work
+        even if the input files are not present where the record is deserialized.
+
+        TODO: Resolve *referents* through the work graph of *context*.
+        """
+        from .serialization import subprocess_input
+        if isinstance(record, str):
+            record = json.loads(record)
+        if record.get('type') != ['scalems', 'Subprocess']:
+            raise ValueError('Not a Subprocess record: {}'.format(record.get('type')))
+        if referents is None or record['input'] not in referents:
+            raise ValueError('Subprocess input {} is not available.'.format(record['input']))
         # The record may or may not have a bound result.
         # If there is a bound result, it should be added to the workgraph first.
-        return cls()
+        # TODO: Bind serialized results.
+        task = cls(subprocess_input(referents[record['input']]))
+        task._uid = record['uid']
+        return task
 
     # def __await__(self) -> typing.Generator[typing.Any, None, SubprocessResult]:
     #     """Implements the asyncio protocol for a coroutine object.
@@ -154,6 +588,128 @@ class Subprocess:
     #         raise RuntimeError('Result was not delivered!')
     #     return self._result
 
+class SubprocessEnsemble:
+    """An array of Subprocess tasks declared with a single input template.
+
+    The template is a SubprocessInput containing Column values. The ensemble
+    has shape ``(N,)`` for Columns of length *N*. Member tasks are not created
+    until they are requested (such as when a workflow context dispatches the
+    ensemble), so declaring a large ensemble costs a single fingerprint.
+
+    The ensemble uid is the fingerprint of the template. Input files named in
+    Columns contribute to the member uids, but not to the ensemble uid.
+    """
+    __slots__ = ('_template', '_shape', '_uid', '_varying')
+
+    @classmethod
+    def type(cls):
+        return SubprocessResourceType
+
+    def __init__(self, template: SubprocessInput):
+        self._template = template
+        self._uid = None
+        # Map the names of the fields with Column values to their Column positions or keys.
+        self._varying = {}
+        sizes = set()
+        for name in SubprocessInput._fields:
+            value = getattr(template, name)
+            if isinstance(value, collections.abc.Mapping):
+                keys = [key for key, member in value.items() if isinstance(member, Column)]
+            else:
+                keys = [index for index, member in enumerate(value) if isinstance(member, Column)]
+            if keys:
+                self._varying[name] = keys
+                sizes.update(len(value[key]) for key in keys)
+        if len(sizes) != 1:
+            raise ValueError('An ensemble requires Columns of a single length. Got lengths {}.'.format(sorted(sizes)))
+        self._shape = (sizes.pop(),)
+
+    @property
+    def shape(self) -> typing.Tuple[int]:
+        return self._shape
+
+    def __len__(self):
+        return self._shape[0]
+
+    def input_collection(self) -> SubprocessInput:
+        """Get the input template."""
+        return self._template
+
+    def uid(self) -> str:
+        if self._uid is None:
+            self._uid = fingerprint(self._template)
+        return self._uid
+
+    def dependencies(self) -> typing.Tuple[str, ...]:
+        """Get the uids of the tasks whose results are referenced by the inputs of any member."""
+        return _dependencies(self._template.inputs.values())
+
+    def member_input(self, index: int) -> SubprocessInput:
+        """Get the input for ensemble member *index*."""
+        if not 0 <= index < self._shape[0]:
+            raise IndexError('Ensemble member {} is out of range for shape {}.'.format(index, self._shape))
+        values = {}
+        for name, keys in self._varying.items():
+            value = getattr(self._template, name)
+            if isinstance(value, collections.abc.Mapping):
+                value = dict(value)
+            else:
+                value = list(value)
+            for key in keys:
+                value[key] = value[key][index]
+            values[name] = value
+        # Fields without Columns are shared (not copied) by all members.
+        return SubprocessInput(**{name: values.get(name, getattr(self._template, name))
+                                  for name in SubprocessInput._fields})
+
+    def member(self, index: int) -> Subprocess:
+        """Get the task for ensemble member *index*."""
+        return Subprocess(self.member_input(index))
+
+    def members(self) -> typing.Iterator[Subprocess]:
+        """Generate the member tasks in order."""
+        for index in range(self._shape[0]):
+            yield self.member(index)
+
+
+class EnsembleReference(str):
+    """The uid of an ensemble in a workflow context, with access to its members.
+
+    Indexing the reference gets the uid of a member task, and slicing (such as
+    ``reference[:]``) gets a tuple of member uids. Otherwise, the reference
+    behaves as a (uid) string. Only the indexed members are added to the work graph
+    of the context, so consuming a few members of a large ensemble does not
+    create (or execute) the others.
+    """
+    def __new__(cls, uid: str, context, shape: typing.Tuple[int]):
+        reference = super().__new__(cls, uid)
+        reference._context = context
+        reference.shape = tuple(shape)
+        return reference
+
+    def __getitem__(self, index):
+        size = self.shape[0]
+        if isinstance(index, slice):
+            return tuple(self._context.member(str(self), i) for i in range(*index.indices(size)))
+        index = int(index)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError('Ensemble member {} is out of range for shape {}.'.format(index, self.shape))
+        return self._context.member(str(self), index)
+
+    def __reduce__(self):
+        return str, (str(self),)
+
+
+def _has_columns(task_input: SubprocessInput) -> bool:
+    for name in SubprocessInput._fields:
+        value = getattr(task_input, name)
+        if isinstance(value, collections.abc.Mapping):
+            value = value.values()
+        if any(isinstance(member, Column) for member in value):
+            return True
+    return False
 
 
 def executable(*args, context=None, **kwargs):
@@ -212,6 +768,11 @@ def executable(*args, context=None, **kwargs):
 
     The *file* output has the same keys as the *outputs* key word argument.
 
+    An ensemble of commands is declared by using :py:class:`Column` values for
+    per-member arguments. For example, ``executable(('exe', '-seed', Column(seeds)))``
+    declares a single SubprocessEnsemble of shape ``(len(seeds),)``, whose members
+    are created when the ensemble is dispatched.
+
     Example:
         Execute a command named ``exe`` that takes a flagged option for file name
         (stored in a local Python variable ``my_filename``) and an ``origin`` flag
@@ -234,6 +795,9 @@ def executable(*args, context=None, **kwargs):
         context = get_context()
     # TODO: The returned value should be a TaskView provided by the Context with
     #       minimal state or ownership semantics.
-    task = context.add_task(Subprocess(bound_input))
+    if _has_columns(bound_input):
+        task = context.add_task(SubprocessEnsemble(bound_input))
+    else:
+        task = context.add_task(Subprocess(bound_input))
 
     return task
@@ -1,3 +1,5 @@
+import pytest
+
 # Import radical.pilot early because of interaction with the built-in logging module.
 # TODO: Did this work?
 try:
@@ -6,3 +8,10 @@ except ImportError:
     # It is not an error to run tests without RP, but when RP is available, we
     # need to import it before pytest imports the logging module.
     ...
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Run each test in a temporary working directory to collect task output files."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,260 @@
+"""Test the dynamic and data shaping functions."""
+
+import asyncio
+import concurrent.futures
+import threading
+
+import pytest
+import scalems
+import scalems.local
+from scalems.subprocess import Column
+
+
+async def delayed(value, delay):
+    await asyncio.sleep(delay)
+    return value
+
+
+@pytest.mark.asyncio
+async def test_as_completed_batches():
+    delays = [0.05, 0.01, 0.03, 0.02, 0.04]
+    batches = []
+    async for batch in scalems.as_completed([delayed(i, delay) for i, delay in enumerate(delays)], batch_size=2):
+        batches.append(batch)
+    assert batches == [[1, 3], [2, 4], [0]]
+
+
+@pytest.mark.asyncio
+async def test_as_completed_timeout():
+    # A partial batch is flushed when the rest of the batch is slow.
+    awaitables = [delayed('fast', 0.01), delayed('slow', 0.5)]
+    loop = asyncio.get_event_loop()
+    start = loop.time()
+    iterator = scalems.as_completed(awaitables, batch_size=2, timeout=0.05)
+    assert await iterator.__anext__() == ['fast']
+    assert loop.time() - start < 0.4
+    assert await iterator.__anext__() == ['slow']
+
+
+@pytest.mark.asyncio
+async def test_as_completed_backpressure():
+    started = []
+
+    def generate():
+        for i in range(6):
+            started.append(i)
+            yield delayed(i, 0.01)
+
+    consumed = []
+    async for batch in scalems.as_completed(generate(), batch_size=1, max_pending=2):
+        # No more than max_pending items are taken ahead of the consumer.
+        assert len(started) <= len(consumed) + 2
+        consumed.extend(batch)
+    assert sorted(consumed) == list(range(6))
+
+
+@pytest.mark.asyncio
+async def test_desequence_tasks(tmp_path):
+    context = scalems.local.AsyncWorkflowContext()
+    with context:
+        ensemble = scalems.executable(('/bin/sh', '-c', Column(['exit 1', 'exit 2', 'exit 3'])))
+        exitcodes = [result.exitcode async for result in scalems.desequence(ensemble[:])]
+    assert sorted(exitcodes) == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_as_completed_order():
+    # Results that become available together are yielded in input order.
+    loop = asyncio.get_event_loop()
+    for _ in range(20):
+        first = loop.create_future()
+        first.set_result(-1)
+        futures = [loop.create_future() for _ in range(4)]
+        iterator = scalems.as_completed([first] + futures, max_pending=4)
+        assert await iterator.__anext__() == [-1]
+        for i, future in enumerate(futures):
+            future.set_result(i)
+        assert [result async for batch in iterator for result in batch] == [0, 1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_as_completed_context():
+    # Task uids are resolved in the given context, outside of its scope.
+    context = scalems.local.AsyncWorkflowContext()
+    with context:
+        ensemble = scalems.executable(('/bin/sh', '-c', Column(['exit 4', 'exit 5'])))
+    exitcodes = []
+    async for batch in scalems.as_completed(ensemble[:], context=context):
+        exitcodes.extend(result.exitcode for result in batch)
+    assert sorted(exitcodes) == [4, 5]
+
+
+@pytest.mark.asyncio
+async def test_reduce_ordered():
+    depth = {}
+
+    async def concatenate(a, b):
+        depth[a + b] = max(depth.get(a, 0), depth.get(b, 0)) + 1
+        await asyncio.sleep(0)
+        return a + b
+
+    letters = 'abcdefghijklmnop'
+    result = await scalems.reduce(concatenate, [delayed(letter, 0.001 * (i % 3)) for i, letter in enumerate(letters)])
+    # Order is preserved, and the tree is balanced.
+    assert result == letters
+    assert depth[letters] == 4
+    assert len(depth) == len(letters) - 1
+
+
+@pytest.mark.asyncio
+async def test_reduce_unordered():
+    finished = []
+    combined = []
+
+    def add(a, b):
+        combined.append((a, b, len(finished)))
+        return a + b
+
+    async def value(i, delay):
+        await asyncio.sleep(delay)
+        finished.append(i)
+        return i
+
+    awaitables = [value(i, 0.5 if i == 0 else 0.01) for i in range(8)]
+    assert await scalems.reduce(add, scalems.desequence(awaitables)) == sum(range(8))
+    assert len(combined) == 7
+    # Combination starts before the slow input is available.
+    assert combined[0][2] < 8
+    assert scalems.extend_sequence([1], (2, 3)) == (1, 2, 3)
+
+
+class CountingExecutor(concurrent.futures.ThreadPoolExecutor):
+    def __init__(self):
+        super().__init__(max_workers=2)
+        self.submitted = 0
+
+    def submit(self, *args, **kwargs):
+        self.submitted += 1
+        return super().submit(*args, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_map_chunks():
+    with CountingExecutor() as executor:
+        assert await scalems.map(lambda x: x * x, range(10), chunksize=4, executor=executor) == [
+            x * x for x in range(10)]
+        assert executor.submitted == 3
+    with CountingExecutor() as executor:
+        assert await scalems.map(str, list(range(10)), shape=(2,), executor=executor) == [str(x) for x in range(10)]
+        assert executor.submitted == 2
+    with pytest.raises(TypeError):
+        scalems.map(str, [], shape=(1,), chunksize=1)
+
+
+@pytest.mark.asyncio
+async def test_map_nonblocking():
+    # By default, chunks are dispatched to threads, so a blocking function does not block the event loop.
+    released = threading.Event()
+
+    def wait_for_loop(value):
+        return value if released.wait(timeout=5) else None
+
+    async def release():
+        await asyncio.sleep(0.01)
+        released.set()
+
+    releaser = asyncio.ensure_future(release())
+    assert await scalems.map(wait_for_loop, [1, 2], chunksize=1) == [1, 2]
+    await releaser
+
+
+@pytest.mark.asyncio
+async def test_map_unordered():
+    awaitables = [delayed(i, 0.01 * (4 - i)) for i in range(4)]
+    mapping = scalems.map(lambda x: -x, scalems.desequence(awaitables), chunksize=2)
+    assert not mapping.ordered
+    assert [result async for result in mapping] == [-3, -2, -1, 0]
+
+
+@pytest.mark.asyncio
+async def test_map_lazy():
+    consumed = []
+
+    def generate():
+        for i in range(100):
+            consumed.append(i)
+            yield i
+
+    mapping = scalems.map(lambda x: x + 1, generate(), chunksize=5, max_pending=2)
+    results = []
+    async for result in mapping:
+        results.append(result)
+        if len(results) == 3:
+            break
+    assert results == [1, 2, 3]
+    assert len(consumed) <= 15
+
+
+@pytest.mark.asyncio
+async def test_map_tasks():
+    context = scalems.local.AsyncWorkflowContext()
+    with context:
+        results = await scalems.map(lambda command: scalems.executable(('/bin/sh', '-c', command)),
+                                    ['exit 1', 'exit 2', 'exit 3'], chunksize=2)
+    assert [result.exitcode for result in results] == [1, 2, 3]
+
+
+def counter_loop(tmp_path, log):
+    """Get a WhileLoop that increments a counter file in each iteration, until it reaches 3."""
+    state = {'previous': None}
+
+    def iteration():
+        # Loop-invariant task.
+        scalems.executable(('/bin/echo', 'setup'))
+        index = len(iterations)
+        output = tmp_path / 'count{}'.format(index)
+        if state['previous'] is None:
+            argv, inputs = ('echo 1 > {}'.format(output),), {}
+        else:
+            reference = state['previous'] + '.file.count'
+            argv, inputs = ('expr $(cat "$1") + 1 > {}'.format(output), 'sh', reference), {'count': reference}
+        argv = ('/bin/sh', '-c', 'echo run >> {}; {}'.format(log, argv[0])) + argv[1:]
+        state['previous'] = scalems.executable(argv, inputs=inputs, outputs={'count': output})
+        iterations.append(state['previous'])
+        return state['previous']
+
+    def condition(result):
+        return int(result.file['count'].read_text()) >= 3
+
+    iterations = []
+    return scalems.while_loop(function=iteration, condition=condition, max_iteration=5)
+
+
+@pytest.mark.asyncio
+async def test_while_loop(tmp_path):
+    log = tmp_path / 'log'
+    store = tmp_path / 'store'
+    context = scalems.local.AsyncWorkflowContext(store=store, output_dir=tmp_path)
+    with context:
+        loop = counter_loop(tmp_path, log)
+        last = await loop
+    assert loop.satisfied
+    assert len(loop.iterations) == 3
+    assert last == loop.iterations[-1]
+    assert context.result(last).file['count'].read_text().strip() == '3'
+    # The loop-invariant task is only added once.
+    assert len(context.task_map) == 4
+    assert len(log.read_text().split()) == 3
+
+    # Stored iterations are not executed again.
+    context = scalems.local.AsyncWorkflowContext(store=store, output_dir=tmp_path)
+    with context:
+        loop = counter_loop(tmp_path, log)
+        await loop()
+    assert len(loop.iterations) == 3
+    assert len(log.read_text().split()) == 3
+
+    limited = scalems.while_loop(function=lambda: 1, condition=lambda result: False, max_iteration=2)
+    assert await limited == 1
+    assert not limited.satisfied
+    assert len(limited.iterations) == 2
@@ -0,0 +1,165 @@
+"""Test local task admission and resource management."""
+
+import asyncio
+import os
+import sys
+
+import pytest
+import scalems.local
+import scalems.local.scheduler
+from scalems.local.scheduler import AdmissionQueue, CoreSlots, available_cpus
+from scalems.subprocess import executable
+
+
+@pytest.mark.asyncio
+async def test_admission_limit():
+    admission = AdmissionQueue(2)
+    running = []
+    peak = 0
+
+    async def work(i):
+        nonlocal peak
+        async with admission.slot():
+            running.append(i)
+            peak = max(peak, len(running))
+            await asyncio.sleep(0.01)
+            running.remove(i)
+
+    await asyncio.gather(*(work(i) for i in range(8)))
+    assert peak == 2
+    assert admission.active == 0
+
+
+@pytest.mark.asyncio
+async def test_admission_priority():
+    admission = AdmissionQueue(1, policy='priority')
+    order = []
+    await admission.acquire()
+
+    async def work(priority):
+        async with admission.slot(priority):
+            order.append(priority)
+
+    waiters = [asyncio.ensure_future(work(priority)) for priority in (1, 3, 2, 3)]
+    await asyncio.sleep(0)
+    assert admission.waiting == 4
+    admission.release()
+    await asyncio.gather(*waiters)
+    assert order == [3, 3, 2, 1]
+
+
+@pytest.mark.asyncio
+async def test_admission_cancel():
+    admission = AdmissionQueue(1)
+    await admission.acquire()
+    waiter = asyncio.ensure_future(admission.acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    admission.release()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert admission.active == 0
+    await asyncio.wait_for(admission.acquire(), timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_bounded_local_context():
+    context = scalems.local.AsyncWorkflowContext(max_concurrent=2)
+    with context as session:
+        for i in range(5):
+            executable(('/bin/echo', str(i)))
+        done, pending = await session.run()
+    assert len(done) == 5
+    assert not pending
+    assert all(task.result().exitcode == 0 for task in done)
+
+
+@pytest.mark.asyncio
+async def test_core_slots_packing(monkeypatch):
+    # CPU ids are not checked against the test host.
+    monkeypatch.setattr(scalems.local.scheduler, 'available_cpus', lambda: tuple(range(8)))
+    cores = CoreSlots(cpus=range(8))
+    wide = await cores.acquire(6)
+    assert wide == (0, 1, 2, 3, 4, 5)
+    narrow = await cores.acquire(2)
+    assert cores.free == 0
+    # A wide request that does not fit does not block a narrow request that does.
+    waiting_wide = asyncio.ensure_future(cores.acquire(4))
+    waiting_narrow = asyncio.ensure_future(cores.acquire(2))
+    await asyncio.sleep(0)
+    cores.release(narrow)
+    await asyncio.sleep(0)
+    assert not waiting_wide.done()
+    assert await waiting_narrow == narrow
+    cores.release(wide)
+    assert len(await waiting_wide) == 4
+    assert cores.free == 2
+    with pytest.raises(ValueError):
+        await cores.acquire(9)
+
+
+@pytest.mark.asyncio
+async def test_core_slots_no_starvation(monkeypatch):
+    # CPU ids are not checked against the test host.
+    monkeypatch.setattr(scalems.local.scheduler, 'available_cpus', lambda: tuple(range(4)))
+    cores = CoreSlots(cpus=range(4), max_backfill=2)
+    held = [await cores.acquire(2), await cores.acquire(2)]
+    wide = asyncio.ensure_future(cores.acquire(4))
+    await asyncio.sleep(0)
+    # A stream of narrow requests may pass over the wide request only max_backfill times.
+    for _ in range(2):
+        narrow = asyncio.ensure_future(cores.acquire(2))
+        await asyncio.sleep(0)
+        cores.release(held.pop(0))
+        held.append(await narrow)
+    narrow = asyncio.ensure_future(cores.acquire(2))
+    await asyncio.sleep(0)
+    cores.release(held.pop(0))
+    await asyncio.sleep(0)
+    assert not narrow.done()
+    assert not wide.done()
+    cores.release(held.pop(0))
+    assert await wide == (0, 1, 2, 3)
+    cores.release((0, 1, 2, 3))
+    assert len(await narrow) == 2
+
+
+@pytest.mark.asyncio
+async def test_core_slots_priority(monkeypatch):
+    monkeypatch.setattr(scalems.local.scheduler, 'available_cpus', lambda: tuple(range(2)))
+    with pytest.raises(ValueError):
+        CoreSlots(cpus=range(3))
+    cores = CoreSlots(cpus=range(2))
+    held = await cores.acquire(2)
+    waiters = [asyncio.ensure_future(cores.acquire(1, priority)) for priority in (1, 3, 2)]
+    await asyncio.sleep(0)
+    cores.release(held)
+    await asyncio.sleep(0)
+    assert [waiter.done() for waiter in waiters] == [False, True, True]
+
+
+@pytest.mark.parametrize('max_concurrent', [1, None])
+def test_priority_launch_order(tmp_path, max_concurrent):
+    # High priority tasks launch first, whether they wait for admission or for cores.
+    log = tmp_path / 'log'
+    context = scalems.local.AsyncWorkflowContext(max_concurrent=max_concurrent, admission='priority',
+                                                 cpus=available_cpus()[:1], output_dir=tmp_path)
+    with context:
+        for name, priority in (('first', 0), ('low', 0), ('middle', 5), ('high', 10)):
+            executable(('/bin/sh', '-c', 'echo {} >> {}'.format(name, log)), resources={'priority': priority})
+        context.wait(context.run())
+    assert log.read_text().split() == ['first', 'high', 'middle', 'low']
+
+
+@pytest.mark.skipif(not hasattr(os, 'sched_setaffinity'), reason='Requires sched_setaffinity.')
+@pytest.mark.asyncio
+async def test_pinned_launch(tmp_path):
+    cpus = available_cpus()
+    context = scalems.local.AsyncWorkflowContext(cpus=cpus[:1])
+    code = 'import os, sys; open(sys.argv[1], "w").write("%s %s" % (sorted(os.sched_getaffinity(0)), os.environ["OMP_NUM_THREADS"]))'
+    with context as session:
+        executable((sys.executable, '-c', code, str(tmp_path / 'out')))
+        with pytest.raises(ValueError):
+            executable(('/bin/echo',), resources={'threads_per_proc': 2})
+        await session.run()
+    assert (tmp_path / 'out').read_text() == '[{}] 1'.format(cpus[0])
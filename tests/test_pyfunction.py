@@ -0,0 +1,87 @@
+"""Test Python function tasks."""
+
+import os
+import sys
+
+import pytest
+import scalems
+import scalems.local
+from scalems.pyfunction import WorkerPool, function_call
+from scalems.subprocess import executable
+
+
+def add(a, b):
+    return a + b
+
+
+def worker_state(module):
+    return os.getpid(), module in sys.modules
+
+
+def extend(items, options):
+    items.append(options['extra'])
+    return type(items).__name__, type(options).__name__, items
+
+
+def read_stdout(result):
+    return result.stdout.read_text()
+
+
+def test_worker_pool():
+    pool = WorkerPool(max_workers=2, preload=('colorsys',))
+    try:
+        assert pool.max_workers == 2
+        assert len(pool.warm()) <= 2
+        states = [pool.submit(worker_state, ('colorsys',)).result() for _ in range(8)]
+        # Workers are reused, and preloaded modules are already imported.
+        assert len(set(pid for pid, _ in states)) <= 2
+        assert os.getpid() not in set(pid for pid, _ in states)
+        assert all(preloaded for _, preloaded in states)
+    finally:
+        pool.shutdown()
+    with pytest.raises(ValueError):
+        function_call(lambda: None)
+
+
+@pytest.mark.asyncio
+async def test_function_tasks(tmp_path):
+    pool = WorkerPool(max_workers=2)
+    context = scalems.local.AsyncWorkflowContext(output_dir=tmp_path, worker_pool=pool)
+    with context as session:
+        first = function_call(add, 1, 2)
+        second = function_call(add, first, b=10)
+        command = executable(('/bin/echo', 'hello'))
+        output = function_call(read_stdout, command)
+        assert session.task_map[second].dependencies() == (first,)
+        await session.run()
+    assert session.result(second) == 13
+    assert session.result(output) == 'hello\n'
+    # The pool provided by the caller is not shut down with the context.
+    assert pool.submit(add, (1, 1)).result() == 2
+    pool.shutdown()
+
+    with scalems.local.ImmediateExecutionContext(output_dir=tmp_path) as session:
+        first = function_call(add, 'a', 'b')
+        assert session.run(function_call(add, first, 'c')) == 'abc'
+        assert session.worker_pool is not None
+    assert session.worker_pool is None
+
+
+def test_function_container_arguments(tmp_path):
+    # The function receives lists and dicts, not the frozen copies that identify the task.
+    with scalems.local.ImmediateExecutionContext(output_dir=tmp_path) as session:
+        items = [1, 2]
+        uid = function_call(extend, items, options={'extra': 3})
+        assert session.run(uid) == ('list', 'dict', [1, 2, 3])
+        assert function_call(extend, [1, 2], options={'extra': 3}) == uid
+    assert items == [1, 2]
+
+
+def test_long_chain(tmp_path):
+    # Scheduling a long chain of dependent tasks does not recurse once per task.
+    context = scalems.local.AsyncWorkflowContext(output_dir=tmp_path)
+    with context:
+        uid = function_call(add, 0, 1)
+        for _ in range(1499):
+            uid = function_call(add, uid, 1)
+        assert scalems.wait(uid) == 1500
@@ -8,6 +8,7 @@ encapsulate the details of the RP-enabled environment, such as the required
 MongoDB instance and RADICAL_PILOT_DBURL environment variable.
 """
 
+import asyncio
 import os
 import warnings
 
@@ -153,3 +154,81 @@ async def test_exec_rp():
         await session.run()
     # Test active context scoping.
     assert scalems.context.get_context() is original_context
+
+
+@pytest.mark.asyncio
+async def test_submission_batch():
+    # Descriptions are submitted in batches by size or after a delay.
+    submitted = []
+
+    def submit(descriptions):
+        submitted.append(list(descriptions))
+        return ['unit-' + description for description in descriptions]
+
+    units = []
+    batch = scalems.radical.SubmissionBatch(submit, batch_size=3, flush_interval=0.01)
+    for i in range(4):
+        batch.add(str(i), units.append)
+    assert submitted == [['0', '1', '2']]
+    assert len(batch) == 1
+    await asyncio.sleep(0.05)
+    assert submitted == [['0', '1', '2'], ['3']]
+    assert units == ['unit-0', 'unit-1', 'unit-2', 'unit-3']
+    batch.flush()
+    assert len(submitted) == 2
+
+
+@pytest.mark.filterwarnings('ignore::DeprecationWarning')
+@pytest.mark.asyncio
+@with_radical_only
+async def test_rp_task_wait():
+    # Awaiting a task does not wait for unrelated tasks.
+    context = scalems.radical.RPWorkflowContext()
+    async with context as session:
+        slow = asyncio.ensure_future(scalems.executable(('/bin/sleep', '30')))
+        fast = scalems.executable(('/bin/echo',))
+        result = await fast
+        assert result.exitcode == 0
+        assert not slow.done()
+        await slow
+
+
+@pytest.mark.asyncio
+async def test_rp_future():
+    # The Future interface does not depend on RP until a unit is bound.
+    callbacks = []
+    future = scalems.radical.RPFuture(lambda: None)
+    future.add_done_callback(callbacks.append)
+    assert not future.running()
+    assert future.cancel()
+    assert future.cancelled()
+    assert callbacks == [future]
+
+    future = scalems.radical.RPFuture(lambda: None)
+    asyncio.get_event_loop().call_later(0.01, future.set_result, 42)
+    assert await future == 42
+    assert future.result(timeout=0) == 42
+    assert future.exception(timeout=0) is None
+
+
+def test_pilot_config(tmp_path, monkeypatch):
+    from scalems.radical.config import PilotConfig, PilotSelector, load_config
+    monkeypatch.delenv('SCALEMS_RP_CONFIG', raising=False)
+    assert load_config() == [PilotConfig()]
+    config_file = tmp_path / 'pilots.json'
+    config_file.write_text('{"pilots": [{"cores": 16}, {"cores": 8, "gpus": 2, "queue": "gpu"}]}')
+    monkeypatch.setenv('SCALEMS_RP_CONFIG', str(config_file))
+    pilots = load_config()
+    assert pilots[1] == PilotConfig(cores=8, gpus=2, queue='gpu')
+    assert pilots[1].description()['queue'] == 'gpu'
+
+    selector = PilotSelector(pilots)
+    # GPU tasks go to the GPU pilot.
+    assert selector.select(4, gpus=1) == 1
+    # CPU tasks go to the least loaded pilot, preferring pilots without GPUs.
+    assert [selector.select(4) for _ in range(4)] == [0, 0, 0, 0]
+    assert selector.select(4) == 1
+    with pytest.raises(ValueError):
+        selector.select(32)
+    selector.release(0, 8)
+    assert selector.select(4) == 0
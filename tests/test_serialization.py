@@ -0,0 +1,166 @@
+"""Test the streaming workflow document codec."""
+
+import io
+import json
+
+import pytest
+import scalems.local
+
+from scalems.serialization import BinaryWorkflow, WorkflowReader, WorkflowWriter, dump, dump_binary, load
+from scalems.subprocess import Column, Subprocess, SubprocessEnsemble, SubprocessInput
+
+
+def make_tasks():
+    first = Subprocess(SubprocessInput(argv=('/bin/echo', 'hello'), outputs={'outfile': 'out.txt'},
+                                       environment={'A': '1', 'B': None},
+                                       resources={'threads_per_proc': 2, 'launcher': 'exec', 'tags': ['a']}))
+    reference = first.uid() + '.file.outfile'
+    second = Subprocess(SubprocessInput(argv=('/bin/cat', reference), inputs={'infile': reference},
+                                        stdin=('line',)))
+    return [first, second]
+
+
+def test_roundtrip():
+    tasks = make_tasks()
+    document = io.StringIO()
+    assert dump(tasks, document) == 2
+    record = json.loads(document.getvalue())
+    assert record['version'] == 'scalems_workflow_1'
+    assert len(record['referents']) == 4
+
+    # Read incrementally, with chunks smaller than a record.
+    reader = WorkflowReader(io.BytesIO(document.getvalue().encode('utf-8')), chunk_size=7)
+    loaded = list(reader.tasks())
+    assert reader.types['scalems.Subprocess']
+    for original, task in zip(tasks, loaded):
+        assert task.uid() == original.uid()
+        assert task.serialize() == original.serialize()
+        assert Subprocess(task.input_collection()).uid() == original.uid()
+    assert loaded[1].dependencies() == (tasks[0].uid(),)
+    assert loaded[0].input_collection().resources == {'threads_per_proc': 2, 'launcher': 'exec', 'tags': ('a',)}
+    assert loaded[0].input_collection().environment == {'A': '1', 'B': None}
+
+
+def test_read_multibyte_characters():
+    task = Subprocess(SubprocessInput(argv=('/bin/echo', 'h\u00e9llo \u2713'), environment={'LABEL': '\u6e29\u5ea6'}))
+    document = io.StringIO()
+    dump([task], document)
+    # Multi-byte characters are split across reads of a single byte.
+    encoded = json.dumps(json.loads(document.getvalue()), ensure_ascii=False).encode('utf-8')
+    loaded = list(WorkflowReader(io.BytesIO(encoded), chunk_size=1).tasks())
+    assert loaded[0].uid() == task.uid()
+    assert loaded[0].input_collection().argv == ('/bin/echo', 'h\u00e9llo \u2713')
+
+
+def test_ensemble_member_references(tmp_path):
+    # References to ensemble members are written as references to the member tasks.
+    outputs = Column([tmp_path / 'out{}'.format(i) for i in range(3)])
+    ensemble = SubprocessEnsemble(SubprocessInput(argv=('/bin/sh', '-c', 'echo $0 > $1', Column(['a', 'b', 'c']),
+                                                        outputs), outputs={'outfile': outputs}))
+    reference = ensemble.uid() + '.file.outfile[1]'
+    consumer = Subprocess(SubprocessInput(argv=('/bin/cp', reference, str(tmp_path / 'copy')),
+                                          inputs={'infile': reference}, outputs={'copy': tmp_path / 'copy'}))
+    downstream = Subprocess(SubprocessInput(argv=('/bin/cat', consumer.uid() + '.file.copy'),
+                                            inputs={'infile': consumer.uid() + '.file.copy'}))
+    tasks = [ensemble, consumer, downstream]
+    document = io.StringIO()
+    assert dump(tasks, document) == 5
+    loaded = list(WorkflowReader(io.StringIO(document.getvalue())).tasks())
+    member = ensemble.member(1).uid()
+    assert loaded[1].uid() == member
+    assert loaded[3].input_collection().inputs['infile'] == member + '.file.outfile'
+    assert loaded[3].input_collection().argv[1] == member + '.file.outfile'
+    assert loaded[4].dependencies() == (loaded[3].uid(),)
+
+    path = tmp_path / 'workflow.bin'
+    with open(path, 'wb') as fh:
+        assert dump_binary(tasks, fh) == 5
+    with BinaryWorkflow(path) as workflow:
+        assert [task.uid() for task in workflow.tasks()] == [task.uid() for task in loaded]
+
+    context = scalems.local.AsyncWorkflowContext(output_dir=tmp_path)
+    with context:
+        uids = load(io.StringIO(document.getvalue()), context)
+        assert context.wait(uids[-1]).exitcode == 0
+    assert (tmp_path / (uids[-1] + '.stdout')).read_text() == 'b\n'
+
+    with pytest.raises(ValueError):
+        whole = Subprocess(SubprocessInput(argv=('/bin/true',), inputs={'infile': ensemble.uid() + '.file.outfile'}))
+        dump([ensemble, whole], io.StringIO())
+
+
+def test_topological_order():
+    first, second = make_tasks()
+    with pytest.raises(ValueError):
+        with WorkflowWriter(io.StringIO()) as writer:
+            writer.write_task(second)
+
+    document = io.StringIO()
+    dump([first, second], document)
+    record = json.loads(document.getvalue())
+    record['referents'] = record['referents'][2:] + record['referents'][:2]
+    with pytest.raises(ValueError):
+        list(WorkflowReader(io.StringIO(json.dumps(record))))
+
+
+def test_load(tmp_path):
+    class Context:
+        def __init__(self):
+            self.task_map = {}
+
+        def add_task(self, task):
+            self.task_map[task.uid()] = task
+            return task.uid()
+
+    path = tmp_path / 'workflow.json'
+    tasks = make_tasks()
+    with open(path, 'w') as fh:
+        dump(tasks, fh)
+    context = Context()
+    with open(path, 'rb') as fh:
+        assert load(fh, context) == [task.uid() for task in tasks]
+
+
+def test_binary(tmp_path):
+    tasks = make_tasks()
+    ensemble = [Subprocess(SubprocessInput(argv=('/bin/echo', str(i)), environment={'A': '1'},
+                                           resources={'threads_per_proc': 2}))
+                for i in range(100)]
+    path = tmp_path / 'workflow.bin'
+    with open(path, 'wb') as fh:
+        assert dump_binary(tasks + ensemble, fh) == 102
+    text = io.StringIO()
+    dump(tasks + ensemble, text)
+    assert path.stat().st_size < len(text.getvalue()) / 2
+
+    with BinaryWorkflow(path) as workflow:
+        assert len(workflow) == 102
+        assert list(workflow.uids()) == [task.uid() for task in tasks + ensemble]
+        task = workflow.task(tasks[1].uid())
+        assert task.uid() == tasks[1].uid()
+        assert task.dependencies() == (tasks[0].uid(),)
+        assert workflow.task(tasks[0].uid()).input_collection().environment == {'A': '1', 'B': None}
+        assert Subprocess(workflow.task(ensemble[7].uid()).input_collection()).uid() == ensemble[7].uid()
+        assert '0' * 64 not in workflow
+        assert [task.uid() for task in workflow.tasks()] == [task.uid() for task in tasks + ensemble]
+
+    with pytest.raises(ValueError):
+        dump_binary(reversed(tasks), io.BytesIO())
+
+
+def test_binary_subgraph(tmp_path):
+    first, second = make_tasks()
+    third = Subprocess(SubprocessInput(argv=('/bin/cat', second.uid() + '.stdout'),
+                                       inputs={'infile': second.uid() + '.stdout'}))
+    other = Subprocess(SubprocessInput(argv=('/bin/true',)))
+    path = tmp_path / 'workflow.bin'
+    with open(path, 'wb') as fh:
+        dump_binary([first, other, second, third], fh)
+    with BinaryWorkflow(path) as workflow:
+        assert workflow.dependencies(third.uid()) == (second.uid(),)
+        assert workflow.dependencies(first.uid()) == ()
+        # Only the assigned task and its immediate upstream task are loaded.
+        subgraph = workflow.subgraph([third.uid()])
+        assert list(subgraph) == [second.uid(), third.uid()]
+        assert subgraph[second.uid()].input_collection().inputs == second.input_collection().inputs
+        assert list(workflow.subgraph([third.uid(), first.uid()])) == [first.uid(), second.uid(), third.uid()]
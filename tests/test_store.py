@@ -0,0 +1,61 @@
+"""Test the persistent result store."""
+
+import pytest
+import scalems.local
+from scalems.store import ResultStore
+from scalems.subprocess import SubprocessResult, executable
+
+
+def test_store_roundtrip(tmp_path):
+    store = ResultStore(tmp_path / 'store')
+    output = tmp_path / 'output'
+    output.write_text('spam')
+    uid = 'a' * 64
+    assert store.get(uid) is None
+    assert not store.put('b' * 64, SubprocessResult(exitcode=1, stdout=None, stderr=None, file={}))
+    assert store.put(uid, SubprocessResult(exitcode=0, stdout=None, stderr=None, file={'out': output}))
+    assert uid in store
+    output.unlink()
+    result = store.get(uid)
+    assert result.exitcode == 0
+    assert result.file['out'] == output
+    assert output.read_text() == 'spam'
+    # A new instance discovers existing entries.
+    assert len(ResultStore(tmp_path / 'store')) == 1
+
+
+def test_store_eviction(tmp_path):
+    store = ResultStore(tmp_path / 'store', max_entries=2)
+    uids = [str(i) * 64 for i in range(3)]
+    for uid in uids[:2]:
+        store.put(uid, SubprocessResult(exitcode=0, stdout=None, stderr=None, file={}))
+    # Use the oldest entry so that the other one is least recently used.
+    store.get(uids[0])
+    store.put(uids[2], SubprocessResult(exitcode=0, stdout=None, stderr=None, file={}))
+    assert uids[0] in store
+    assert uids[1] not in store
+    assert uids[2] in store
+
+    output = tmp_path / 'output'
+    output.write_bytes(b'0' * 100)
+    store = ResultStore(tmp_path / 'sized')
+    store.put(uids[0], SubprocessResult(exitcode=0, stdout=None, stderr=None, file={'out': output}))
+    store.max_bytes = 2 * store.size + 1
+    for uid in uids[1:]:
+        store.put(uid, SubprocessResult(exitcode=0, stdout=None, stderr=None, file={'out': output}))
+    assert store.size <= store.max_bytes
+    assert uids[0] not in store
+    assert uids[2] in store
+
+
+@pytest.mark.asyncio
+async def test_skip_stored(tmp_path):
+    log = tmp_path / 'log'
+    argv = ('/bin/sh', '-c', 'echo run >> {}'.format(log))
+    for _ in range(2):
+        context = scalems.local.AsyncWorkflowContext(store=tmp_path / 'store')
+        with context as session:
+            uid = executable(argv)
+            await session.run()
+            assert session.result(uid).exitcode == 0
+    assert log.read_text() == 'run\n'
@@ -0,0 +1,96 @@
+"""Test the scalems.subprocess object model."""
+
+import io
+import pickle
+import subprocess
+import sys
+
+import pytest
+import scalems.serialization
+
+from scalems.subprocess import Subprocess, SubprocessInput
+
+
+def test_uid_content_addressed(tmp_path):
+    task = Subprocess(SubprocessInput(argv=('/bin/echo', 'hello')))
+    uid = task.uid()
+    assert len(uid) == 64
+    int(uid, 16)
+    # Container types do not change the fingerprint.
+    assert Subprocess(SubprocessInput(argv=['/bin/echo', 'hello'])).uid() == uid
+    # Distinct work has distinct fingerprints.
+    assert Subprocess(SubprocessInput(argv=('/bin/echo', 'world'))).uid() != uid
+    assert Subprocess(SubprocessInput(argv=('/bin/echo', 'hello'),
+                                      resources={'threads_per_proc': 2})).uid() != uid
+    assert Subprocess(SubprocessInput(argv=('/bin/echo', 'hello'),
+                                      environment={'A': '1'})).uid() != uid
+
+    # The fingerprint is stable across processes.
+    code = 'from scalems.subprocess import *; print(Subprocess(SubprocessInput(argv=("/bin/echo", "hello"))).uid())'
+    output = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, check=True).stdout
+    assert output.decode().strip() == uid
+
+
+def test_uid_input_file_content(tmp_path):
+    infile = tmp_path / 'infile'
+    infile.write_text('spam')
+    task_input = dict(argv=('/bin/cat', str(infile)), inputs={'infile': infile})
+    uid = Subprocess(SubprocessInput(**task_input)).uid()
+    assert Subprocess(SubprocessInput(**task_input)).uid() == uid
+    infile.write_text('eggs and spam')
+    assert Subprocess(SubprocessInput(**task_input)).uid() != uid
+
+
+def test_uid_missing_input_file(tmp_path):
+    # A literal input path is fingerprinted by content once it exists.
+    infile = tmp_path / 'infile'
+    task_input = dict(argv=('/bin/cat', str(infile)), inputs={'infile': infile})
+    missing = Subprocess(SubprocessInput(**task_input)).uid()
+    infile.write_text('spam')
+    assert Subprocess(SubprocessInput(**task_input)).uid() != missing
+    # A reference to the output of another task is fingerprinted by the referenced uid.
+    reference = '0' * 64 + '.outfile'
+    task_input = dict(argv=('/bin/cat', reference), inputs={'infile': reference})
+    uid = Subprocess(SubprocessInput(**task_input)).uid()
+    (tmp_path / reference).write_text('spam')
+    assert Subprocess(SubprocessInput(**task_input)).uid() == uid
+
+
+def test_input_immutable():
+    environment = {'A': '1'}
+    task_input = SubprocessInput(argv=['/bin/echo', 'hello'], environment=environment)
+    environment['A'] = '2'
+    assert task_input.environment['A'] == '1'
+    with pytest.raises(AttributeError):
+        task_input.argv = ('/bin/true',)
+    with pytest.raises(AttributeError):
+        task_input.environment.foo = 1
+    assert task_input.argv == ('/bin/echo', 'hello')
+    # Identical input is shared.
+    assert SubprocessInput(argv=('/bin/echo', 'hello'), environment={'A': '1'}) is task_input
+    members = [SubprocessInput(argv=('/bin/echo', str(i)), environment={'A': '1'}) for i in range(3)]
+    assert all(member.environment is task_input.environment for member in members)
+    assert pickle.loads(pickle.dumps(task_input)) is task_input
+
+
+def test_intern_distinguishes_types():
+    resources = [{'threads_per_proc': value} for value in (True, 1, 1.0, '1')]
+    inputs = [SubprocessInput(argv=('/bin/echo', 'hello'), resources=value) for value in resources]
+    assert len(set(map(id, inputs))) == 4
+    assert len(set(Subprocess(task_input).uid() for task_input in inputs)) == 4
+    for task_input, value in zip(inputs, resources):
+        assert type(task_input.resources['threads_per_proc']) is type(value['threads_per_proc'])
+    arguments = [SubprocessInput(argv=('/bin/echo', value)) for value in (True, 1, 1.0, '1')]
+    assert [type(task_input.argv[1]) for task_input in arguments] == [bool, int, float, str]
+
+
+def test_binary_data():
+    task_input = SubprocessInput(argv=('/bin/echo',), resources={'data': b'ab'})
+    assert task_input.resources['data'] == b'ab'
+    uid = Subprocess(task_input).uid()
+    assert Subprocess(SubprocessInput(argv=('/bin/echo',), resources={'data': bytearray(b'ab')})).uid() == uid
+    assert Subprocess(SubprocessInput(argv=('/bin/echo',), resources={'data': (97, 98)})).uid() != uid
+    assert Subprocess(SubprocessInput(argv=('/bin/echo',), resources={'data': 'ab'})).uid() != uid
+    # Binary data is not written as a sequence of integers.
+    with pytest.raises(TypeError):
+        scalems.serialization.dump([Subprocess(task_input)], io.StringIO())
@@ -4,11 +4,16 @@ TODO: Consider whether we can reimplement as a parameterized test over the
       various executors.
 """
 
+import ast
 import asyncio
+import os
+import subprocess
+import sys
 
 import pytest
 import scalems.context
 import scalems.local
+import scalems.subprocess
 from scalems.subprocess import executable
 
 
@@ -41,6 +46,50 @@ def test_exec_immediate():
         session.run(cmd)
 
 
+def test_exec_immediate_pool(tmp_path):
+    # Independent commands run concurrently, and dependent commands wait for their inputs.
+    context = scalems.local.ImmediateExecutionContext(output_dir=tmp_path, max_workers=4)
+    # Each command of the pair finishes only if the other command has started,
+    # which also requires that adding a command does not wait for it to finish.
+    handshake = 'touch {0}/$1; for i in $(seq 100); do [ -e {0}/$2 ] && exit 0; sleep 0.05; done; exit 1'.format(
+        tmp_path)
+    with context as session:
+        pair = [executable(('/bin/sh', '-c', handshake, 'sh', *names)) for names in (('a', 'b'), ('b', 'a'))]
+        producer = executable(('/bin/sh', '-c', 'sleep 0.1; echo hello > {}'.format(tmp_path / 'out')),
+                              outputs={'out': tmp_path / 'out'})
+        consumer = executable(('/bin/cp', producer + '.out', str(tmp_path / 'copy')),
+                              inputs={'out': producer + '.out'})
+        failure = executable(('/bin/false',), outputs={'nothing': tmp_path / 'nothing'})
+        skipped = executable(('/bin/cat', failure + '.nothing'), inputs={'nothing': failure + '.nothing'})
+        assert session.run(consumer).exitcode == 0
+        assert (tmp_path / 'copy').read_text() == 'hello\n'
+        assert [session.run(uid).exitcode for uid in pair] == [0, 0]
+        with pytest.raises(RuntimeError):
+            session.run(skipped)
+
+    # Exceptions from tasks whose results were not retrieved are raised at exit.
+    with pytest.raises(RuntimeError) as excinfo:
+        with scalems.local.ImmediateExecutionContext(output_dir=tmp_path) as session:
+            failure = executable(('/bin/false',), outputs={'nothing': tmp_path / 'nothing'})
+            skipped = executable(('/bin/cat', failure + '.nothing'), inputs={'nothing': failure + '.nothing'})
+    assert skipped in str(excinfo.value)
+    assert isinstance(excinfo.value.__cause__, RuntimeError)
+
+
+def test_exec_duplicate(tmp_path):
+    # Declaring a task again refers to the existing task, which runs once.
+    for context_type in (scalems.local.ImmediateExecutionContext, scalems.local.AsyncWorkflowContext):
+        log = tmp_path / context_type.__name__
+        argv = ('/bin/sh', '-c', 'echo run >> {}'.format(log))
+        with context_type(output_dir=tmp_path) as context:
+            uid = executable(argv)
+            assert executable(argv) == uid
+            ensemble = executable(('/bin/echo', scalems.subprocess.Column(['a', 'b'])))
+            assert executable(('/bin/echo', scalems.subprocess.Column(['a', 'b']))) == ensemble
+            assert context.wait(uid).exitcode == 0
+        assert log.read_text() == 'run\n'
+
+
 @pytest.mark.asyncio
 async def test_exec_local():
     # Test local execution with standard deferred launch.
@@ -60,4 +109,186 @@ async def test_exec_local():
 #     cmd = executable(('/bin/echo',))
 #     context = sms_context.RPDispatcher()
 #     with context as session:
-#         session.run(cmd)
\ No newline at end of file
+#         session.run(cmd)
+
+@pytest.mark.asyncio
+async def test_exec_dependencies(tmp_path):
+    # Tasks are launched as their inputs become available.
+    first = tmp_path / 'first'
+    second = tmp_path / 'second'
+    context = scalems.local.AsyncWorkflowContext()
+    with context as session:
+        producer = executable(('/bin/cp', '/etc/hostname', str(first)), outputs={'copy': first})
+        reference = producer + '.copy'
+        consumer = executable(('/bin/cp', reference, str(second)), inputs={'original': reference},
+                              outputs={'copy': second})
+        assert session.task_map[consumer].dependencies() == (producer,)
+        failure = executable(('/bin/false',), outputs={'nothing': tmp_path / 'nothing'})
+        skipped = executable(('/bin/cat', failure + '.nothing'), inputs={'nothing': failure + '.nothing'})
+        with pytest.raises(ValueError):
+            executable(('/bin/cat', '0' * 64 + '.file'), inputs={'file': '0' * 64 + '.file'})
+        await session.run()
+        assert session.result(consumer).exitcode == 0
+        assert session.result(consumer).file['copy'] == second
+        assert second.read_text() == first.read_text()
+        assert session.result(failure).exitcode != 0
+        with pytest.raises(RuntimeError):
+            session.result(skipped)
+
+
+@pytest.mark.asyncio
+async def test_exec_output(tmp_path):
+    # Standard output and error are captured per task.
+    context = scalems.local.AsyncWorkflowContext(output_dir=tmp_path)
+    with context as session:
+        tasks = [executable(('/bin/sh', '-c', 'echo out{0}; echo err{0} >&2'.format(i))) for i in range(4)]
+        large = executable(('/usr/bin/head', '-c', str(1 << 24), '/dev/zero'))
+        await session.run()
+    for i, uid in enumerate(tasks):
+        result = session.result(uid)
+        assert result.stdout == tmp_path / (uid + '.stdout')
+        assert result.stdout.read_text() == 'out{}\n'.format(i)
+        assert result.stderr.read_text() == 'err{}\n'.format(i)
+    assert session.result(large).stdout.stat().st_size == 1 << 24
+
+    context = scalems.local.ImmediateExecutionContext(output_dir=tmp_path)
+    with context as session:
+        cmd = scalems.executable(('/bin/echo', 'immediate'))
+    assert (tmp_path / (cmd + '.stdout')).read_text() == 'immediate\n'
+
+
+@pytest.mark.asyncio
+async def test_exec_ensemble(tmp_path):
+    # An ensemble is declared as one node and expanded at dispatch.
+    context = scalems.local.AsyncWorkflowContext()
+    with context as session:
+        outputs = scalems.subprocess.Column([tmp_path / 'out{}'.format(i) for i in range(4)])
+        words = scalems.subprocess.Column(['word{}'.format(i) for i in range(4)])
+        ensemble = executable(('/bin/cp', '/etc/hostname', outputs), outputs={'copy': outputs},
+                              environment={'WORD': words})
+        assert list(session.task_map) == [ensemble]
+        assert session.task_map[ensemble].shape == (4,)
+        await session.run()
+        assert len(session.task_map) == 5
+        results = session.result(ensemble)
+        assert len(results) == 4
+        for i, result in enumerate(results):
+            assert result.exitcode == 0
+            assert result.file['copy'] == tmp_path / 'out{}'.format(i)
+            assert result.file['copy'].exists()
+        member = session.task_map[ensemble].member(2)
+        assert member.input_collection().environment['WORD'] == 'word2'
+        assert session.result(member.uid()) == results[2]
+
+
+@pytest.mark.asyncio
+async def test_exec_ensemble_slice(tmp_path):
+    # Only the consumed members of an ensemble are executed.
+    context = scalems.local.AsyncWorkflowContext()
+    with context as session:
+        outputs = scalems.subprocess.Column([tmp_path / 'out{}'.format(i) for i in range(100)])
+        ensemble = executable(('/bin/cp', '/etc/hostname', outputs), outputs={'copy': outputs})
+        reference = ensemble + '.file.copy[3]'
+        consumer = executable(('/bin/cat', reference), inputs={'infile': reference})
+        member = ensemble[3]
+        assert session.task_map[consumer].dependencies() == (ensemble,)
+        assert set(session.task_map) == {ensemble, member, consumer}
+        assert len(ensemble[5:7]) == 2
+        done, _ = await session.run(consumer)
+        assert session.result(consumer).exitcode == 0
+        assert session.result(member).file['copy'].exists()
+        assert not (tmp_path / 'out5').exists()
+        with pytest.raises(RuntimeError):
+            session.result(ensemble)
+
+
+def test_exec_wait(tmp_path):
+    # Blocking calls reuse one event loop and only execute the referenced work.
+    context = scalems.local.AsyncWorkflowContext(output_dir=tmp_path)
+    with context:
+        unrelated = executable(('/bin/touch', str(tmp_path / 'unrelated')))
+        producer = executable(('/bin/sh', '-c', 'echo hello > {}'.format(tmp_path / 'out')),
+                              outputs={'out': tmp_path / 'out'})
+        consumer = executable(('/bin/cat', producer + '.out'), inputs={'out': producer + '.out'})
+        assert scalems.wait(consumer).exitcode == 0
+        loop = context.event_loop
+        assert scalems.wait(producer + '.file.out').read_text() == 'hello\n'
+        assert scalems.wait(consumer + '.exitcode') == 0
+        ensemble = executable(('/bin/echo', scalems.subprocess.Column(['a', 'b'])))
+        assert [result.exitcode for result in scalems.wait(ensemble)] == [0, 0]
+        assert scalems.run(asyncio.sleep(0, result=1)) == 1
+        assert context.event_loop is loop
+        assert unrelated not in context._futures
+        assert not (tmp_path / 'unrelated').exists()
+    assert context.event_loop is None and loop.is_closed()
+
+    with scalems.local.ImmediateExecutionContext(output_dir=tmp_path) as context:
+        uid = executable(('/bin/true',))
+        assert scalems.wait(uid + '.exitcode') == 0
+        assert scalems.run(asyncio.sleep(0, result=1)) == 1
+
+
+def test_run_default_wait():
+    # Contexts that do not implement wait() run coroutines in the context's event loop.
+    class Context(scalems.context.AbstractWorkflowContext):
+        def add_task(self, task_description):
+            raise NotImplementedError()
+
+    context = Context()
+    token = scalems.context.current.set(context)
+    try:
+        assert scalems.run(asyncio.sleep(0, result=1), debug=True) == 1
+        assert context.event_loop.get_debug()
+    finally:
+        scalems.context.current.reset(token)
+        scalems.context.close_event_loop(context)
+
+
+def test_exec_module(tmp_path):
+    # Tasks are launched while the script is running, and completed at exit.
+    script = tmp_path / 'workflow.py'
+    script.write_text('''
+import pathlib, sys, time
+import scalems
+out = pathlib.Path(sys.argv[1])
+first = scalems.executable(('/bin/touch', str(out / 'first')))
+deadline = time.time() + 10
+while not (out / 'first').exists() and time.time() < deadline:
+    time.sleep(0.01)
+assert (out / 'first').exists()
+scalems.executable(('/bin/sh', '-c', 'sleep 0.1; touch {}'.format(out / 'last')))
+assert scalems.wait(first + '.exitcode') == 0
+''')
+    subprocess.run([sys.executable, '-m', 'scalems.local', str(script), str(tmp_path)], check=True, cwd=tmp_path)
+    assert (tmp_path / 'last').exists()
+
+
+@pytest.mark.skipif(not hasattr(os, 'posix_spawnp'), reason='Requires posix_spawn.')
+@pytest.mark.asyncio
+async def test_exec_spawn(tmp_path, monkeypatch):
+    context = scalems.local.AsyncWorkflowContext(output_dir=tmp_path, spawn=True)
+    with context as session:
+        echo = executable(('/bin/sh', '-c', 'echo $VALUE; echo err >&2'), environment={'VALUE': 'out'})
+        killed = executable(('/bin/sh', '-c', 'kill -9 $$'))
+        code = 'import os; print(sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else [0])'
+        pinned = executable((sys.executable, '-c', code))
+        await session.run()
+    assert session.result(echo).stdout.read_text() == 'out\n'
+    assert session.result(echo).stderr.read_text() == 'err\n'
+    assert session.result(killed).exitcode == -9
+    assert len(ast.literal_eval(session.result(pinned).stdout.read_text())) == 1
+    # Tasks with the same variables share a process environment.
+    task_input = session.task_map[echo].input_collection()
+    assert session.environments.get(task_input) is session.environments.get(task_input)
+
+    # Variables set after the context is created are inherited.
+    context = scalems.local.AsyncWorkflowContext(output_dir=tmp_path, spawn=True)
+    monkeypatch.setenv('SCALEMS_TEST_LATE', 'late')
+    with context as session:
+        late = executable(('/bin/sh', '-c', 'echo $SCALEMS_TEST_LATE $VALUE'), environment={'VALUE': 'out'})
+        await session.run()
+    assert session.result(late).stdout.read_text() == 'late out\n'
+
+    with scalems.local.ImmediateExecutionContext(output_dir=tmp_path, spawn=True) as session:
+        uid = executable(('/bin/sh', '-c', 'exit 3'))
+        assert session.run(uid).exitcode == 3